@@ -1,5 +1,5 @@
 # Third party imports
-from flask import Blueprint, abort, jsonify
+from flask import Blueprint, abort, jsonify, request
 
 # Local application imports
 from backend.managers import action_management
@@ -31,6 +31,12 @@ def getUserActions(user_id):
     if user_management.getUser(user_id) is None:
         return abort(404, f'user id {user_id} does not exist')
 
+    # Index user actions after the cursor if cursor pagination is requested
+    cursor = request.args.get('cursor', default=None, type=str)
+    if cursor is not None:
+        page_size = request.args.get('page_size', default=15, type=int)
+        return indexActionsByCursor(page_size, cursor, user_id=user_id)
+
     # Get user actions from database
     actions = action_management.getUserActions(user_id)
 
@@ -38,10 +44,44 @@ def getUserActions(user_id):
     return jsonify(actions=[a.id for a in actions])
 
 
+@ActionBlueprint.route('/get-derivative-actions/<derivative_id>')
+def getDerivativeActions(derivative_id):
+    # Index derivative actions after the cursor if cursor pagination is requested
+    cursor = request.args.get('cursor', default=None, type=str)
+    if cursor is not None:
+        page_size = request.args.get('page_size', default=15, type=int)
+        return indexActionsByCursor(page_size, cursor, derivative_id=derivative_id)
+
+    # Get derivative actions from database
+    actions = action_management.getDerivativeActions(derivative_id)
+
+    # Make response
+    return jsonify(actions=[a.id for a in actions])
+
+
 @ActionBlueprint.route('/get-recent-actions/<count>')
 def getRecentActions(count):
+    # Index recent actions after the cursor if cursor pagination is requested
+    cursor = request.args.get('cursor', default=None, type=str)
+    if cursor is not None:
+        if not count.isdigit():
+            return abort(400, f'{count} is not a valid count')
+        return indexActionsByCursor(max(int(count), 1), cursor)
+
     # Get recent actions from database
     actions = action_management.getRecentActions(count)
 
     # Make response
     return jsonify(actions=[a.id for a in actions])
+
+
+def indexActionsByCursor(page_size, cursor, user_id=None, derivative_id=None):
+    # Index actions after the cursor
+    try:
+        actions, next_cursor, total_count = action_management.indexActionsByCursor(
+            page_size, cursor, user_id, derivative_id)
+    except ValueError as e:
+        return abort(400, str(e))
+
+    # Make response
+    return jsonify(next_cursor=next_cursor, total_count=total_count, actions=[a.id for a in actions])
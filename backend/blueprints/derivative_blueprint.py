@@ -30,6 +30,31 @@ def getDerivative(derivative_id):
     return jsonify(derivative=derivative)
 
 
+@DerivativeBlueprint.route('/get-derivatives', methods=['POST'])
+def getDerivatives():
+    # Verify request
+    if not request.data or not request.is_json:
+        return abort(400, 'empty request body')
+
+    # Retreive json body from request
+    body = request.get_json()
+    derivative_ids = body.get('ids')
+
+    # Validate derivative ids
+    if not isinstance(derivative_ids, list) or not all(isDerivativeId(i) for i in derivative_ids):
+        return abort(400, 'ids must be a list of derivative ids')
+
+    # Get derivatives from database
+    derivatives = derivative_management.getDerivatives(derivative_ids)
+
+    # Determine which derivatives were not found
+    found_ids = {d.id for d in derivatives}
+    missing_ids = [i for i in derivative_ids if i not in found_ids]
+
+    # Make response
+    return jsonify(derivatives=derivatives, missing=missing_ids)
+
+
 @DerivativeBlueprint.route('/add-derivative', methods=['POST'])
 def addDerivative():
     # Verify request
@@ -137,6 +162,155 @@ def updateDerivative(derivative_id):
     return jsonify(update_log=update_log)
 
 
+@DerivativeBlueprint.route('/add-derivatives', methods=['POST'])
+def addDerivatives():
+    # Verify request
+    if not request.data or not request.is_json:
+        return abort(400, 'empty request body')
+
+    # Retreive json body from request
+    body = request.get_json()
+    user_id = body.get('user_id')
+
+    # Validate user id
+    if user_management.getUser(user_id) is None:
+        return abort(404, f'user id {user_id} does not exist')
+
+    # Validate each derivative, recording a result for each
+    results = []
+    derivatives = []
+    for data in list(body.get('derivatives') or []):
+        try:
+            derivative = derivative_management.validateDerivative(data)
+        except ValueError as e:
+            results.append({'error': f'invalid derivative data: {e}'})
+            continue
+
+        derivatives.append(derivative)
+        results.append(derivative)
+
+    # Add the valid derivatives to database
+    try:
+        derivative_management.addDerivatives(derivatives, user_id)
+    except IntegrityError as e:
+        return abort(400, f'invalid derivative data: {e.orig}')
+
+    # Commit additions to database
+    db.session.commit()
+
+    # Make response
+    results = [result if isinstance(result, dict) else {'id': result.id} for result in results]
+    return jsonify(results=results)
+
+
+@DerivativeBlueprint.route('/delete-derivatives', methods=['DELETE'])
+def deleteDerivatives():
+    # Verify request
+    if not request.data or not request.is_json:
+        return abort(400, 'empty request body')
+
+    # Retreive json body from request
+    body = request.get_json()
+    user_id = body.get('user_id')
+    derivative_ids = body.get('ids')
+
+    # Verify user exists
+    if user_management.getUser(user_id) is None:
+        return abort(404, f'user id {user_id} does not exist')
+
+    # Validate derivative ids
+    if not isinstance(derivative_ids, list) or not all(isDerivativeId(i) for i in derivative_ids):
+        return abort(400, 'ids must be a list of derivative ids')
+
+    # Retreive derivatives from database
+    derivatives = {d.id: d for d in derivative_management.getDerivatives(derivative_ids)}
+
+    # Verify each derivative can be deleted, recording a result for each
+    results = []
+    deletions = []
+    for derivative_id in derivative_ids:
+        derivative = derivatives.get(derivative_id)
+        if derivative is None:
+            results.append({'id': derivative_id, 'error': f'derivative id {derivative_id} does not exist'})
+        elif derivative.absolute:
+            results.append({'id': derivative_id, 'error': 'derivative is absolute, deletion denied'})
+        else:
+            deletions.append(derivative)
+            results.append({'id': derivative_id})
+
+    # Delete the derivatives
+    derivative_management.deleteDerivatives(deletions, user_id)
+
+    # Commit the deletions
+    db.session.commit()
+
+    # Make response
+    return jsonify(results=results)
+
+
+@DerivativeBlueprint.route('/update-derivatives', methods=['POST'])
+def updateDerivatives():
+    # Verify request
+    if not request.data or not request.is_json:
+        return abort(400, 'empty request body')
+
+    # Retreive json body from request
+    body = request.get_json()
+    user_id = body.get('user_id')
+    tree_id = body.get('tree_id')
+    items = body.get('updates')
+
+    # Verify user exists
+    if user_management.getUser(user_id) is None:
+        return abort(404, f'user id {user_id} does not exist')
+
+    # Validate updates
+    if not isinstance(items, list) or not all(isinstance(i, dict) and isDerivativeId(i.get('id')) for i in items):
+        return abort(400, 'updates must be a list of derivative ids and updates')
+
+    # Retreive the specified derivatives
+    derivative_ids = [item.get('id') for item in items]
+    derivatives = {d.id: d for d in derivative_management.getDerivatives(derivative_ids)}
+
+    # Validate each update, recording a result for each
+    results = []
+    updates = []
+    for item in items:
+        derivative_id = item.get('id')
+        derivative = derivatives.get(derivative_id)
+
+        if derivative is None:
+            results.append({'id': derivative_id, 'error': f'derivative id {derivative_id} does not exist'})
+            continue
+        if derivative.absolute:
+            results.append({'id': derivative_id, 'error': 'derivative is absolute, update denied'})
+            continue
+
+        try:
+            derivative_updates = derivative_management.validateUpdates(item.get('updates') or {})
+        except ValueError as e:
+            results.append({'id': derivative_id, 'error': f'invalid update: {e}'})
+            continue
+
+        updates.append((derivative, derivative_updates))
+        results.append({'id': derivative_id})
+
+    # Update the derivatives
+    update_logs = derivative_management.updateDerivatives(updates, user_id, tree_id)
+
+    # Commit the derivative updates to the database
+    db.session.commit()
+
+    # Attach the update logs to the results of the valid updates, updates
+    # that changed nothing are errors as with a single update
+    valid_results = [result for result in results if 'error' not in result]
+    for result, update_log in zip(valid_results, update_logs):
+        result.update({'update_log': update_log} if update_log else {'error': 'no valid updates'})
+
+    # Make response
+    return jsonify(results=results)
+
+
 @DerivativeBlueprint.route('/index-derivatives')
 def indexDerivatives():
     # Determine index page parameters
@@ -163,6 +337,21 @@ def indexDerivatives():
     show_deleted = request.args.get('show_deleted', default=False, type=bool)
     hide_not_deleted = request.args.get('hide_not_deleted', default=False, type=bool)
 
+    # Index derivatives after the cursor if cursor pagination is requested
+    cursor = request.args.get('cursor', default=None, type=str)
+    if cursor is not None:
+        try:
+            derivatives, next_cursor, total_count = derivative_management.indexDerivativesByCursor(
+                page_size, cursor, order_key, reverse_order, search_term,
+                min_notional, max_notional, min_strike, max_strike, min_maturity,
+                max_maturity, min_trade_date, max_trade_date, buyers, sellers, assets,
+                show_deleted, hide_not_deleted)
+        except ValueError as e:
+            return abort(400, str(e))
+
+        # Make response
+        return jsonify(next_cursor=next_cursor, total_count=total_count, derivatives=[d.id for d in derivatives])
+
     # Index derivatives
     derivatives, page_count = derivative_management.indexDerivatives(
         page_size, page_number, order_key, reverse_order, search_term,
@@ -172,3 +361,8 @@ def indexDerivatives():
 
     # Make response
     return jsonify(page_count=page_count, derivatives=[d.id for d in derivatives])
+
+
+def isDerivativeId(value):
+    # Booleans are integers, but are not derivative ids
+    return isinstance(value, int) and not isinstance(value, bool)
@@ -1,5 +1,5 @@
 # Third party imports
-from flask import Blueprint, jsonify, request, abort
+from flask import Blueprint, jsonify, request, abort, current_app
 
 # Local application imports
 from backend.db import db
@@ -19,8 +19,9 @@ def growTrees():
     # Remove any unapproved trees
     learned_behaviour_management.removeUnapprovedTrees()
 
-    # Grow some trees
-    result = learned_behaviour_management.growTrees()
+    # Grow some trees, rebuilding the training samples from the action history if requested
+    rebuild = request.args.get('rebuild', '').lower() in ('1', 'true', 'yes')
+    result = learned_behaviour_management.growTrees(current_app.config['TREE_TRAINING_WORKERS'], rebuild)
 
     # Return the result
     return jsonify(result=result)
@@ -39,13 +40,12 @@ def indexTrees():
 
 @LearnedBehaviourBlueprint.route('/get-flags/<tree_id>')
 def getFlags(tree_id):
-    # Get flags
-    flags = learned_behaviour_management.getFlags(tree_id)
+    # Verify tree exists
+    if learned_behaviour_management.getNode(tree_id) is None:
+        return abort(404, f'tree id {tree_id} does not exist')
 
-    # Jsonify the flags
-    if len(flags) > 100:
-        flags = flags[:100]
-    flags = [{'derivative': flag['derivative']} for flag in flags]
+    # Get the first 100 flags
+    flags = learned_behaviour_management.getFlags(tree_id, limit=100)
 
     # Return the result
     return {'flags': flags}
@@ -2,10 +2,13 @@
 import os
 
 # Third party imports
-from flask import Blueprint, abort, jsonify, request, send_file, after_this_request
+from flask import Blueprint, abort, jsonify, request, send_file
 
 # Local application imports
 from backend.managers import report_management
+from backend.managers import job_management
+from backend.derivatex_models import ReportJobType
+from backend.db import db
 from backend import utils
 
 # Instantiate new blueprint
@@ -28,6 +31,20 @@ def indexReports():
     page_size = max(body.get('page_size') or 15, 1)
     page_number = request.args.get('page_number', default=0, type=int)
 
+    # Index reports after the cursor if cursor pagination is requested
+    cursor = request.args.get('cursor', default=None, type=str)
+    if cursor is not None:
+        try:
+            reports, next_cursor, total_count = report_management.indexReportsByCursor(from_date,
+                                                                                       to_date,
+                                                                                       page_size,
+                                                                                       cursor)
+        except ValueError as e:
+            return abort(400, str(e))
+
+        # Make response
+        return jsonify(next_cursor=next_cursor, total_count=total_count, reports=reports)
+
     # Index reports
     reports, page_count = report_management.indexReports(from_date,
                                                          to_date,
@@ -52,15 +69,33 @@ def getReportHead(report_id):
 
 @ReportBlueprint.route('/get-report-data/<report_id>')
 def getReportData(report_id):
+    # Determine page parameters
+    offset = max(request.args.get('offset', default=0, type=int), 0)
+    limit = request.args.get('limit', default=None, type=int)
+    if limit is not None:
+        limit = max(limit, 0)
+
+    # Obtain the fields to include and the filters of the rows
+    fields = request.args.get('fields', default=None, type=lambda f: f.split(','))
+    filters = {f: request.args.getlist(f) for f in report_management.REPORT_INDEXED_FIELDS}
+
     # Get report data from report file
-    data = report_management.getReportData(report_id)
+    try:
+        data = report_management.getReportData(report_id, offset, limit, fields, filters)
+    except ValueError as e:
+        return abort(400, str(e))
 
     # Verify report exists
     if data is None:
         return abort(404, f'report with id {report_id} not found')
 
+    # Count all the matching rows when only a page of them is requested
+    total_count = len(data)
+    if offset or limit is not None:
+        total_count = report_management.countReportData(report_id, filters)
+
     # Make response
-    return jsonify(report=data)
+    return jsonify(report=data, total_count=total_count)
 
 
 @ReportBlueprint.route('/download-report/<format>/<report_id>')
@@ -70,20 +105,14 @@ def downloadReport(format, report_id):
         return abort(404, f'report with id {report_id} not found')
 
     if format.upper() == 'PDF':
-        # Generate PDF file and return path
-        file_path = report_management.createPDF(report_id)
-
-        # Delete the pdf after it is sent
-        @after_this_request
-        def deleteFile(response):
-            os.remove(file_path)
-            return response
+        # Retrieve the cached PDF file, rendering it if required
+        file_path = report_management.getReportPDF(report_id)
     else:
         # Default to the report CSV
         file_path = os.path.realpath(f'res/reports/{report_id}.csv')
 
-    # Return the file
-    return send_file(file_path)
+    # Return the file, answering conditional and range requests
+    return send_file(file_path, conditional=True)
 
 
 @ReportBlueprint.route('/index-pending-reports')
@@ -94,15 +123,68 @@ def indexPendingReports():
 
 @ReportBlueprint.route('/generate-report/<target_date>')
 def generateReport(target_date):
-    id = report_management.generateReport(target_date)
+    # Verify the target date
+    try:
+        target_date = utils.to_date(target_date)
+    except ValueError as e:
+        return abort(400, str(e))
 
-    if id is None:
-        abort(400, f'failed to generate report for: {target_date}')
+    # Queue the generation of the report, patching the previous report if a delta report is requested
+    delta = request.args.get('delta', default=False, type=bool)
+    job = job_management.enqueueReportJob(ReportJobType.GENERATE_REPORT, target_date, delta)
+    db.session.commit()
 
-    return jsonify(id=id)
+    # Make response
+    return jsonify(job=job), 202
 
 
 @ReportBlueprint.route('/generate-all-reports')
 def generateReports():
-    report_management.generateAllReports()
-    return '', 204
+    # Queue the generation of all pending reports
+    delta = request.args.get('delta', default=False, type=bool)
+    job = job_management.enqueueReportJob(ReportJobType.GENERATE_ALL_REPORTS, delta=delta)
+    db.session.commit()
+
+    # Make response
+    return jsonify(job=job), 202
+
+
+@ReportBlueprint.route('/enqueue-report-job', methods=['POST'])
+def enqueueReportJob():
+    # Verify request
+    if not request.data or not request.is_json:
+        return abort(400, 'empty request body')
+
+    # Retreive json body from request
+    body = request.get_json()
+
+    # Verify the job parameters
+    try:
+        job_type = ReportJobType(body.get('type'))
+        target_date = body.get('target_date')
+        if job_type == ReportJobType.GENERATE_REPORT:
+            target_date = utils.to_date(target_date or '')
+        elif target_date is not None:
+            raise ValueError('target_date is only valid for GENERATE_REPORT jobs')
+    except (TypeError, ValueError) as e:
+        return abort(400, str(e))
+
+    # Queue the job
+    job = job_management.enqueueReportJob(job_type, target_date, bool(body.get('delta')))
+    db.session.commit()
+
+    # Make response
+    return jsonify(job=job), 202
+
+
+@ReportBlueprint.route('/get-report-job/<job_id>')
+def getReportJob(job_id):
+    # Get job from the database
+    job = job_management.getReportJob(job_id)
+
+    # Verify job exists
+    if job is None:
+        return abort(404, f'report job with id {job_id} not found')
+
+    # Make response
+    return jsonify(job=job)
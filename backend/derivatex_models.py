@@ -22,6 +22,47 @@ class Derivative(db.Model):
     maturity_date = db.Column(db.Date, nullable=False)
     reported = db.Column(db.Boolean, nullable=False, default=False)
     deleted = db.Column(db.Boolean, nullable=False, default=False)
+    # The chunk of a trade file the derivative was ingested in, by which the
+    # ids of ingested derivatives are read back
+    ingest_batch = db.Column(db.String(80), index=True)
+
+    # Properties that query the database per derivative
+    __expensive_properties__ = ['associated_actions']
+
+    @classmethod
+    def prefetchProperties(cls, derivatives):
+        """ Derive the valuations and associated actions of many derivatives at once.
+
+        Args:
+            derivatives (list of Derivative): The derivatives to derive the properties of.
+
+        Returns:
+            dict: A dictionary mapping each derivative to a dictionary of property values.
+        """
+        # Value all the derivatives in one pass
+        snapshot = external_management.getMarketSnapshot()
+        notional_values, underlying_prices, underlying_curr_codes = snapshot.valueTrades(
+            [d.asset for d in derivatives],
+            [d.selling_party for d in derivatives],
+            [d.quantity for d in derivatives],
+            [d.notional_curr_code for d in derivatives])
+
+        # Gather the associated actions of all the derivatives with one query
+        actions = {d.id: [] for d in derivatives}
+        query = Action.query.filter(Action.derivative_id.in_(actions.keys()))
+        query = query.with_entities(Action.derivative_id, Action.id)
+        for derivative_id, action_id in query.order_by(Action.timestamp.desc()).all():
+            actions[derivative_id].append(action_id)
+
+        return {d: {'notional_value': nv,
+                    'underlying_price': up,
+                    'underlying_curr_code': ucc,
+                    'underlying_curr_symbol': utils.getCurrencySymbol(ucc),
+                    'associated_actions': actions[d.id]}
+                for d, nv, up, ucc in zip(derivatives,
+                                          notional_values.tolist(),
+                                          underlying_prices.tolist(),
+                                          underlying_curr_codes)}
 
     @property
     def absolute(self):
@@ -115,6 +156,80 @@ class ReportHead(db.Model):
         return f'<ReportHead : {self.id}>'
 
 
+class ReportJobType(str, enum.Enum):
+    GENERATE_REPORT = 'GENERATE_REPORT'
+    GENERATE_ALL_REPORTS = 'GENERATE_ALL_REPORTS'
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    COMPLETE = 'COMPLETE'
+    FAILED = 'FAILED'
+
+
+class ReportJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.Enum(ReportJobType), nullable=False)
+    target_date = db.Column(db.Date)
+    delta = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.Enum(JobStatus), nullable=False, default=JobStatus.QUEUED, index=True)
+    progress = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer)
+    report_ids = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    started = db.Column(db.DateTime)
+    finished = db.Column(db.DateTime)
+
+    def __str__(self):
+        return f'<ReportJob : {self.id}>'
+
+
+class SearchTermType(str, enum.Enum):
+    CODE = 'CODE'
+    ASSET = 'ASSET'
+    COMPANY = 'COMPANY'
+
+
+class SearchGram(db.Model):
+    id = db.Column(db.BigInteger, primary_key=True)
+    gram = db.Column(db.String(3), nullable=False, index=True)
+    term_type = db.Column(db.Enum(SearchTermType), nullable=False)
+    term = db.Column(db.String(128), nullable=False)
+    text = db.Column(db.String(128), nullable=False)
+
+    def __str__(self):
+        return f'<SearchGram : {self.gram}, {self.term_type}: {self.term}>'
+
+
+class IngestedFile(db.Model):
+    digest = db.Column(db.CHAR(64), primary_key=True)
+    path = db.Column(db.String(255), nullable=False)
+    rows_read = db.Column(db.Integer, nullable=False, default=0)
+    complete = db.Column(db.Boolean, nullable=False, default=False)
+
+    def __str__(self):
+        return f'<IngestedFile : {self.path}>'
+
+
+class SchedulerLease(db.Model):
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(128), nullable=False)
+    expires = db.Column(db.DateTime, nullable=False)
+
+    def __str__(self):
+        return f'<SchedulerLease : {self.name}, {self.holder}>'
+
+
+class IdSequence(db.Model):
+    name = db.Column(db.String(64), primary_key=True)
+    next_id = db.Column(db.BigInteger, nullable=False)
+
+    def __str__(self):
+        return f'<IdSequence : {self.name}, {self.next_id}>'
+
+
 class Features(str, enum.Enum):
     BUYING_PARTY = 'BUYING_PARTY'
     SELLING_PARTY = 'SELLING_PARTY'
@@ -145,6 +260,37 @@ class DecisionTreeNode(db.Model):
     suggested_feature = db.Column(db.String(100))
     suggested_value = db.Column(db.String(100))
 
+    # Properties that query the database per node
+    __expensive_properties__ = ['true_node', 'false_node']
+
+    @classmethod
+    def prefetchProperties(cls, nodes):
+        """ Derive the child nodes of many trees at once.
+
+        Args:
+            nodes (list of DecisionTreeNode): The nodes whose subtrees are required.
+
+        Returns:
+            dict: A dictionary mapping each node in the subtrees to a dictionary
+            of its child nodes.
+        """
+        # Walk the subtrees of the given nodes a level at a time, loading
+        # the children of every node on a level with one query
+        prefetched = {}
+        level = list(nodes)
+        while level:
+            level = [node for node in set(level) if node not in prefetched]
+            child_ids = {child_id for node in level for child_id in (node.true_node_id, node.false_node_id)}
+            child_ids.discard(None)
+            children = {node.id: node for node in cls.query.filter(cls.id.in_(child_ids))} if child_ids else {}
+
+            for node in level:
+                prefetched[node] = {'true_node': children.get(node.true_node_id),
+                                    'false_node': children.get(node.false_node_id)}
+            level = list(children.values())
+
+        return prefetched
+
     @property
     def true_node(self):
         return self.query.get(self.true_node_id)
@@ -308,3 +454,18 @@ class DecisionTreeNode(db.Model):
 
     def __str__(self):
         return f'<DecisionTreeNode : {self.id}, {self.feature}: {self.criteria}>'
+
+
+class TrainingSample(db.Model):
+    id = db.Column(db.BigInteger, primary_key=True)
+    derivative_id = db.Column(db.BigInteger, db.ForeignKey('derivative.id'), nullable=False, index=True)
+    buying_party = db.Column(db.String(6), nullable=False)
+    selling_party = db.Column(db.String(6), nullable=False)
+    asset = db.Column(db.String(128), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    strike_price = db.Column(db.Float, nullable=False)
+    erroneous_field = db.Column(db.String(32), nullable=False)
+    correction = db.Column(db.JSON)
+
+    def __str__(self):
+        return f'<TrainingSample : {self.id}, {self.derivative_id}>'
@@ -0,0 +1,37 @@
+# Standard library imports
+import argparse
+
+# Local application imports
+from backend.app import Application
+from backend.managers import ingestion_management
+
+
+def main(argv=None):
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Load derivative trade files into the derivatex database.')
+    parser.add_argument('paths', nargs='+',
+                        help='trade files, or directories of trade files, to load')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='number of files loaded at once')
+    parser.add_argument('--chunk-size', type=int, default=ingestion_management.DEFAULT_CHUNK_SIZE,
+                        help='number of trades committed per transaction')
+    parser.add_argument('--user-id', dest='user_ids', type=int, action='append', default=[],
+                        help='user that loaded trades are attributed to, may be repeated')
+    parser.add_argument('--exclude', dest='excluded_parties', action='append', default=[],
+                        help='company whose trades are skipped, may be repeated')
+    args = parser.parse_args(argv)
+
+    # Setup app to bind the database
+    Application.getCliApp()
+
+    # Ingest the trade files
+    summaries = ingestion_management.ingestTradeFiles(args.paths, args.workers, args.chunk_size,
+                                                      args.user_ids, set(args.excluded_parties))
+
+    # Report the rows loaded from each file
+    for summary in summaries:
+        print(f"{summary['file']}: loaded {summary['loaded']}, skipped {summary['skipped']}")
+
+
+if __name__ == '__main__':
+    main()
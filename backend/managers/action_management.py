@@ -1,5 +1,6 @@
 # Local application imports
 from backend.derivatex_models import Action
+from backend import utils
 
 
 def getAction(action_id):
@@ -17,3 +18,39 @@ def getDerivativeActions(derivative_id):
 
 def getRecentActions(count):
     return Action.query.order_by(Action.timestamp.desc()).limit(count).all()
+
+
+def indexActionsByCursor(page_size, cursor, user_id=None, derivative_id=None):
+    """ Enumerates a page of the most recent actions after the page identified
+    by a cursor, optionally restricted to a user or derivative.
+
+    Args:
+        page_size (int): The number of actions that form a page.
+        cursor (str): The cursor of the page, or an empty string for the first page.
+        user_id (int): The ID of the user whose actions to index.
+        derivative_id (int): The ID of the derivative whose actions to index.
+
+    Returns:
+        (tuple): tuple containing:
+            actions (list): The list of actions that make up the page
+            next_cursor (str): The cursor of the next page, None on the last page
+            total_count (int): The approximate number of actions across all pages
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    # Create base query
+    query = Action.query
+
+    # Filter query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+
+    if derivative_id is not None:
+        query = query.filter_by(derivative_id=derivative_id)
+
+    # Retrieve the page after the cursor, most recent first
+    actions, next_cursor = utils.paginateByKeyset(query, Action.timestamp, Action.id,
+                                                  page_size, cursor, reverse=True)
+
+    return actions, next_cursor, utils.approximateCount(query)
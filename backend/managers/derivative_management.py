@@ -2,13 +2,17 @@
 import datetime
 
 # Third party imports
-from sqlalchemy import asc, desc, or_
+from sqlalchemy import and_, asc, desc, false, func, literal, or_
+from sqlalchemy.orm import Query
 
 # Local application imports
-from backend.derivatex_models import Derivative, Action, ActionType
+from backend.derivatex_models import Derivative, Action, ActionType, SearchTermType
+from backend.external_models import Currency, CompanyStock, Product
 from backend.db import db
 from backend import utils
 from backend.managers import external_management
+from backend.managers import learned_behaviour_management
+from backend.managers import search_management
 from backend.utils import clamp, AbsoluteDerivativeException
 
 
@@ -24,6 +28,105 @@ def getDerivative(derivative_id):
     return Derivative.query.filter_by(id=derivative_id).first()
 
 
+def getDerivatives(derivative_ids):
+    """ Retrieve the derivatives from the database that have the given IDs
+    with a single query.
+
+    Args:
+        derivative_ids (list): The IDs of the desired derivatives.
+
+    Returns:
+        list: The derivatives with the corrosponding IDs, in the order of the
+        given IDs. IDs that do not exist are skipped.
+    """
+    derivatives = {d.id: d for d in Derivative.query.filter(Derivative.id.in_(derivative_ids)).all()}
+    return [derivatives[i] for i in derivative_ids if i in derivatives]
+
+
+def valueDerivatives(derivatives, valuation_date=None):
+    """ Value many derivatives in one pass against a single market data snapshot.
+
+    Args:
+        derivatives (list or Query): The derivatives to be valued.
+        valuation_date (date): The date to value the derivatives at, defaults to today.
+
+    Returns:
+        dict: A dictionary mapping each derivative ID to a dictionary of its
+        notional value, underlying price and underlying currency code.
+    """
+    # Only load the columns needed for valuation when given a query
+    if isinstance(derivatives, Query):
+        derivatives = derivatives.with_entities(Derivative.id,
+                                                Derivative.asset,
+                                                Derivative.selling_party,
+                                                Derivative.quantity,
+                                                Derivative.notional_curr_code).all()
+
+    # Value all the derivatives using array arithmetic
+    snapshot = external_management.getMarketSnapshot(valuation_date)
+    notional_values, underlying_prices, underlying_curr_codes = snapshot.valueTrades(
+        [d.asset for d in derivatives],
+        [d.selling_party for d in derivatives],
+        [d.quantity for d in derivatives],
+        [d.notional_curr_code for d in derivatives])
+
+    # Key each valuation by the derivative id
+    return {d.id: {'notional_value': nv, 'underlying_price': up, 'underlying_curr_code': ucc}
+            for d, nv, up, ucc in zip(derivatives,
+                                      notional_values.tolist(),
+                                      underlying_prices.tolist(),
+                                      underlying_curr_codes)}
+
+
+def joinValuation(query, valuation_date=None):
+    """ Join the market data needed to value derivatives onto a derivative
+    query, so that valuations can be filtered and ordered by the database.
+
+    Args:
+        query (Query): The derivative query to join the market data onto.
+        valuation_date (date): The date to value the derivatives at, defaults to today.
+
+    Returns:
+        (tuple): tuple containing:
+            query (Query): The query with the market data joined
+            expressions (dict): The SQL expressions for the notional value,
+            underlying price and underlying currency code of each derivative
+    """
+    valuation_date = valuation_date or datetime.date.today()
+
+    # Alias the external tables, the currency table is joined twice
+    product = external_management.getExternalTable(Product).alias('product')
+    stock = external_management.getExternalTable(CompanyStock).alias('company_stock')
+    u_curr = external_management.getExternalTable(Currency).alias('underlying_currency')
+    n_curr = external_management.getExternalTable(Currency).alias('notional_currency')
+
+    # Stocks are priced by the selling party, all other assets by product
+    is_stock = func.lower(Derivative.asset) == 'stocks'
+    query = query.outerjoin(stock, and_(is_stock,
+                                        stock.c.company_id == Derivative.selling_party,
+                                        stock.c.valuation_date == valuation_date))
+    query = query.outerjoin(product, and_(~is_stock,
+                                          product.c.name == Derivative.asset,
+                                          product.c.valuation_date == valuation_date))
+
+    # Join the exchange rates of the underlying and notional currencies
+    underlying_curr_code = func.coalesce(stock.c.currency_code, product.c.currency_code)
+    query = query.outerjoin(u_curr, and_(u_curr.c.code == underlying_curr_code,
+                                         u_curr.c.valuation_date == valuation_date))
+    query = query.outerjoin(n_curr, and_(n_curr.c.code == Derivative.notional_curr_code,
+                                         n_curr.c.valuation_date == valuation_date))
+
+    # Form the valuation expressions
+    underlying_price = func.coalesce(stock.c.stock_price, product.c.market_price)
+    notional_value = Derivative.quantity * underlying_price * u_curr.c.usd_exchange_rate / n_curr.c.usd_exchange_rate
+
+    return query, {
+        'notional_value': notional_value,
+        'underlying_price': underlying_price,
+        'underlying_curr_code': func.coalesce(underlying_curr_code, literal('?')),
+    }
+
+
 def addDerivative(derivative, user_id):
     """ Adds a derivative and a corrosponding user action to the database
 
@@ -44,6 +147,9 @@ def addDerivative(derivative, user_id):
     # Add corrosponding user action to the database session
     action = Action(derivative_id=derivative.id, user_id=user_id, type=ActionType.ADD)
     db.session.add(action)
+
+    # Make the derivative code searchable
+    search_management.indexSearchTerms(SearchTermType.CODE, [(derivative.code, derivative.code)])
     db.session.flush()
 
 
@@ -75,6 +181,9 @@ def deleteDerivative(derivative, user_id):
     db.session.add(derivative)
     db.session.add(action)
 
+    # Deleted derivatives are not trained on
+    learned_behaviour_management.removeTrainingSamples([derivative.id])
+
 
 def updateDerivative(derivative, user_id, tree_id, updates):
     """ Updates the attributes of the given derivative with new values and
@@ -88,6 +197,45 @@ def updateDerivative(derivative, user_id, tree_id, updates):
     Returns:
         list: A list of dictionarys that each log an update to an derivative attribute.
 
+    Raises:
+        AbsoluteDerivativeException: If the derivative is absolute
+    """
+    # Apply and log all updates to the derivative
+    update_log = applyUpdates(derivative, updates)
+
+    # Register an update action for each update one at a time
+    for log in update_log:
+        action = Action(derivative_id=derivative.id,
+                        user_id=user_id,
+                        tree_id=tree_id,
+                        type=ActionType.UPDATE,
+                        update_log=log)
+
+        db.session.add(action)
+
+    if update_log:
+        # Add the updated derivative to the session
+        db.session.add(derivative)
+        db.session.flush()
+
+        # Store the state the updates corrected for training
+        learned_behaviour_management.recordTrainingSamples([(derivative, update_log)])
+
+    # Return the update log
+    return update_log
+
+
+def applyUpdates(derivative, updates):
+    """ Updates the attributes of the given derivative with new values
+    without registering any actions.
+
+    Args:
+        derivative (Derivative): The derivative to be updated.
+        updates (dict): A dictionary of derivative attribute, value pairs.
+
+    Returns:
+        list: A list of dictionarys that each log an update to an derivative attribute.
+
     Raises:
         AbsoluteDerivativeException: If the derivative is absolute
     """
@@ -108,85 +256,259 @@ def updateDerivative(derivative, user_id, tree_id, updates):
         if old_value == new_value:
             continue
 
-        # Cast date attributes to strings
-        if isinstance(old_value, datetime.date):
-            old_value = str(old_value)
-
         # Perform update
         setattr(derivative, attribute, new_value)
 
-        # Log update one at a time
-        log = {
+        # Log update one at a time, casting date attributes to strings
+        update_log.append({
             'attribute': attribute,
-            'old_value': old_value,
-            'new_value': new_value
-        }
-
-        # Register update action
-        action = Action(derivative_id=derivative.id,
-                        user_id=user_id,
-                        tree_id=tree_id,
-                        type=ActionType.UPDATE,
-                        update_log=log)
-
-        db.session.add(action)
-        update_log.append(log)
+            'old_value': str(old_value) if isinstance(old_value, datetime.date) else old_value,
+            'new_value': str(new_value) if isinstance(new_value, datetime.date) else new_value
+        })
 
     if update_log:
         # Flag that the derivative needs to be reported
         derivative.reported = False
 
-        # Add the updated derivative to the session
-        db.session.add(derivative)
-        db.session.flush()
+        # Make a new derivative code searchable
+        if 'code' in [log['attribute'] for log in update_log]:
+            search_management.indexSearchTerms(SearchTermType.CODE, [(derivative.code, derivative.code)])
 
     # Return the update log
     return update_log
 
 
-def indexDerivatives(page_size, page_number, order_key, reverse_order, search_term,  # noqa: C901
-                     min_notional, max_notional, min_strike, max_strike,
-                     min_maturity, max_maturity, min_trade_date, max_trade_date,
-                     buyers, sellers, assets, show_deleted, hide_not_deleted):
-    # Enforce a minimum page size
-    page_size = max(page_size, 3)
+def validateValue(attribute, value):
+    """ Validate a value for a derivative attribute against its column.
+
+    Args:
+        attribute (str): The name of the derivative attribute.
+        value (object): The value to validate.
+
+    Returns:
+        object: The value cast to the type of the column.
+
+    Raises:
+        ValueError: If the value is not valid for the attribute.
+    """
+    column = Derivative.__table__.columns.get(attribute)
+    if column is None:
+        raise ValueError(f'{attribute} is not a derivative attribute')
+
+    # Required attributes must have a value
+    if value is None:
+        if not column.nullable and column.default is None:
+            raise ValueError(f'{attribute} is required')
+        return value
+
+    # Cast the value to the type of the column
+    python_type = column.type.python_type
+    if python_type is datetime.date and isinstance(value, str):
+        value = utils.to_date(value)
+    elif python_type is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+
+    if not isinstance(value, python_type) or (python_type is int and isinstance(value, bool)):
+        raise ValueError(f'{attribute} must be of type {python_type.__name__}')
+
+    # Strings must fit in the column
+    length = getattr(column.type, 'length', None)
+    if length is not None and len(value) > length:
+        raise ValueError(f'{attribute} must be at most {length} characters')
+
+    return value
+
+
+def validateDerivative(data):
+    """ Create a derivative from a dictionary of attribute values, validating
+    every value before anything is sent to the database.
+
+    Args:
+        data (dict): A dictionary of derivative attribute, value pairs.
+
+    Returns:
+        Derivative: The validated derivative.
+
+    Raises:
+        ValueError: If the derivative data is not valid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('derivative must be an object')
 
+    # Derivatives are assigned their id by the database
+    columns = [c.name for c in Derivative.__table__.columns if not c.primary_key]
+    for attribute in data:
+        if attribute not in columns:
+            raise ValueError(f'{attribute} is not a derivative attribute')
+
+    # Validate every attribute, including missing required attributes
+    values = {}
+    for attribute in columns:
+        value = validateValue(attribute, data.get(attribute))
+        if attribute in data:
+            values[attribute] = value
+
+    return Derivative(**values)
+
+
+def validateUpdates(updates):
+    """ Validate a dictionary of updates to derivative attributes.
+
+    Args:
+        updates (dict): A dictionary of derivative attribute, value pairs.
+
+    Returns:
+        dict: The updates with each value cast to the type of its column.
+
+    Raises:
+        ValueError: If the updates are not valid.
+    """
+    if not isinstance(updates, dict):
+        raise ValueError('updates must be an object')
+
+    return {attribute: validateValue(attribute, value) for attribute, value in updates.items()}
+
+
+def addDerivatives(derivatives, user_id):
+    """ Adds many derivatives and their corrosponding user actions to the
+    database with a single flush and a bulk insert of the actions.
+
+    Args:
+        derivatives (list of Derivative): The derivatives to be added to the database.
+        user_id (int): The ID of the user requesting the derivative additions.
+
+    Returns:
+        None
+    """
+    # Flag that the derivatives need to be reported
+    for derivative in derivatives:
+        derivative.reported = False
+
+    # Add the derivatives to the database session, assigning their ids
+    db.session.add_all(derivatives)
+    db.session.flush()
+
+    # Bulk insert the corrosponding user actions
+    actions = [dict(derivative_id=d.id, user_id=user_id, type=ActionType.ADD, timestamp=datetime.datetime.now())
+               for d in derivatives]
+    db.session.bulk_insert_mappings(Action, actions)
+
+    # Make the derivative codes searchable
+    search_management.indexSearchTerms(SearchTermType.CODE, [(d.code, d.code) for d in derivatives])
+
+
+def deleteDerivatives(derivatives, user_id):
+    """ Labels many derivatives in the database as deleted and bulk inserts
+    the user actions that corrospond to the deletions.
+
+    Args:
+        derivatives (list of Derivative): The derivatives to be marked as deleted.
+        user_id (int): The ID of the user requesting the derivative deletions.
+
+    Returns:
+        None
+
+    Raises:
+        AbsoluteDerivativeException: If any of the derivatives are absolute
+    """
+    if any(d.absolute for d in derivatives):
+        raise AbsoluteDerivativeException
+
+    # Mark the derivatives as deleted and flag that they need to be reported
+    for derivative in derivatives:
+        derivative.deleted = True
+        derivative.reported = False
+    db.session.flush()
+
+    # Bulk insert the corrosponding user actions
+    actions = [dict(derivative_id=d.id, user_id=user_id, type=ActionType.DELETE, timestamp=datetime.datetime.now())
+               for d in derivatives]
+    db.session.bulk_insert_mappings(Action, actions)
+
+    # Deleted derivatives are not trained on
+    learned_behaviour_management.removeTrainingSamples([d.id for d in derivatives])
+
+
+def updateDerivatives(updates, user_id, tree_id):
+    """ Updates many derivatives with new values with a single flush and a
+    bulk insert of the corrosponding actions.
+
+    Args:
+        updates (list): A list of (derivative, updates) pairs, where the updates
+            are a dictionary of derivative attribute, value pairs.
+        user_id (int): The ID of the user performing the derivative updates.
+        tree_id (int): The ID of the tree that suggested the updates.
+
+    Returns:
+        list: The update log of each derivative.
+
+    Raises:
+        AbsoluteDerivativeException: If any of the derivatives are absolute
+    """
+    if any(derivative.absolute for derivative, _ in updates):
+        raise AbsoluteDerivativeException
+
+    # Apply and log the updates to each derivative
+    update_logs = [applyUpdates(derivative, derivative_updates) for derivative, derivative_updates in updates]
+    db.session.flush()
+
+    # Bulk insert an update action for each update
+    now = datetime.datetime.now()
+    actions = [dict(derivative_id=derivative.id, user_id=user_id, tree_id=tree_id,
+                    type=ActionType.UPDATE, timestamp=now, update_log=log)
+               for (derivative, _), update_log in zip(updates, update_logs)
+               for log in update_log]
+    db.session.bulk_insert_mappings(Action, actions)
+
+    # Store the states the updates corrected for training
+    learned_behaviour_management.recordTrainingSamples([(d, log) for (d, _), log in zip(updates, update_logs)])
+
+    return update_logs
+
+
+# Derivative properties that can be filtered and ordered by in SQL
+VALUATION_KEYS = ['notional_value', 'underlying_price', 'underlying_curr_code']
+
+
+def filterDerivatives(order_key, search_term,  # noqa: C901
+                      min_notional, max_notional, min_strike, max_strike,
+                      min_maturity, max_maturity, min_trade_date, max_trade_date,
+                      buyers, sellers, assets, show_deleted, hide_not_deleted):
+    """ Form a query for the derivatives that match the index filters.
+
+    Returns:
+        (tuple): tuple containing:
+            query (Query): The filtered derivative query
+            order_expression (ColumnElement): The expression for the order key,
+            None if the derivatives cannot be ordered by the key
+    """
     # Create base query
     query = Derivative.query
 
     # Fuzzy search
-    if search_term is not None:
+    if search_term:
         # Standardise the search term
         search_term = search_term.strip().upper()
 
-        # Search for matching derivative codes
-        code_fuz = []
-        all_codes = Derivative.query.with_entities(Derivative.code).all()
-        for code in [c[0] for c in all_codes]:
-            if search_term in code.upper():
-                code_fuz.append(code)
-
-        # Search for matching asset names
-        assets_fuz = []
-        for asset in external_management.indexAssets():
-            if search_term in asset.upper():
-                assets_fuz.append(asset)
-
-        # Search for matching company ids or names
-        companies_fuz = []
-        for company in external_management.indexCompanies():
-            if search_term in company.id.upper() or search_term in company.name.upper():
-                companies_fuz.append(company.id)
+        # Match the derivative codes, asset names and company ids against
+        # subqueries of the search index
+        matching_codes = search_management.searchTermsQuery(search_term, SearchTermType.CODE)
+        matching_assets = search_management.searchTermsQuery(search_term, SearchTermType.ASSET)
+        matching_companies = search_management.searchTermsQuery(search_term, SearchTermType.COMPANY)
+        conditions = [
+            Derivative.code.in_(matching_codes.subquery()),
+            Derivative.asset.in_(matching_assets.subquery()),
+            Derivative.buying_party.in_(matching_companies.subquery()),
+            Derivative.selling_party.in_(matching_companies.subquery()),
+        ]
+
+        # Dates can only contain the search term if it is made of date characters
+        if set(search_term) <= set('0123456789-'):
+            conditions.append(Derivative.date_of_trade.contains(search_term))
+            conditions.append(Derivative.maturity_date.contains(search_term))
 
         # Apply fuzzy search to query
-        query = query.filter(or_(
-            Derivative.date_of_trade.contains(search_term),
-            Derivative.maturity_date.contains(search_term),
-            Derivative.code.in_(code_fuz),
-            Derivative.asset.in_(assets_fuz),
-            Derivative.buying_party.in_(companies_fuz),
-            Derivative.selling_party.in_(companies_fuz),
-        ))
+        query = query.filter(or_(false(), *conditions))
 
     # Apply query filters
     if min_strike is not None:
@@ -212,40 +534,90 @@ def indexDerivatives(page_size, page_number, order_key, reverse_order, search_te
     if hide_not_deleted:
         query = query.filter_by(deleted=True)
 
-    # Order the query if the order key is a field in the schema
+    # Join the market data if the derivatives are filtered or ordered by valuation
+    valuations = {}
+    if min_notional is not None or max_notional is not None or order_key in VALUATION_KEYS:
+        query, valuations = joinValuation(query)
+
+    # Apply valuation filters
+    if min_notional is not None:
+        query = query.filter(valuations['notional_value'] >= min_notional)
+    if max_notional is not None:
+        query = query.filter(valuations['notional_value'] <= max_notional)
+
+    # Derivatives can be ordered by a field in the schema or a valuation
+    order_expression = valuations.get(order_key)
     if order_key in Derivative.__table__.columns:
-        query = query.order_by(desc(order_key) if reverse_order else asc(order_key))
-
-    # Determine if there is any post query processing
-    post_filters = min_notional is not None or max_notional is not None
-    post_ordering = isinstance(getattr(Derivative, order_key, None), property)
-
-    # If there is a post query processing, execute the query and apply afterwards
-    if post_filters or post_ordering:
-        # Execute sql query
-        derivatives = query.all()
-
-        # Apply post ordering
-        if post_ordering:
-            derivatives.sort(key=lambda d: getattr(d, order_key), reverse=reverse_order)
-
-        # Apply post query filters
-        if min_notional is not None:
-            derivatives = [d for d in derivatives if d.notional_value >= min_notional]
-        if max_notional is not None:
-            derivatives = [d for d in derivatives if d.notional_value <= max_notional]
-
-        # Paginate derivatives
-        page_count = len(derivatives) // page_size + 1
-        offset = page_size * (clamp(page_number, 1, page_count) - 1)
-        derivatives = derivatives[offset:offset + page_size]
-    else:
-        # Paginate query
-        page_count = query.count() // page_size + 1
-        offset = page_size * (clamp(page_number, 1, page_count) - 1)
-        query = query.limit(page_size).offset(offset)
-        # Execute sql query
-        derivatives = query.all()
+        order_expression = Derivative.__table__.columns[order_key]
+
+    return query, order_expression
+
+
+def indexDerivatives(page_size, page_number, order_key, reverse_order, search_term,
+                     min_notional, max_notional, min_strike, max_strike,
+                     min_maturity, max_maturity, min_trade_date, max_trade_date,
+                     buyers, sellers, assets, show_deleted, hide_not_deleted):
+    # Enforce a minimum page size
+    page_size = max(page_size, 3)
+
+    # Form filtered query
+    query, order_expression = filterDerivatives(
+        order_key, search_term, min_notional, max_notional, min_strike,
+        max_strike, min_maturity, max_maturity, min_trade_date, max_trade_date,
+        buyers, sellers, assets, show_deleted, hide_not_deleted)
+
+    # Order the query if the order key is orderable
+    if order_expression is not None:
+        query = query.order_by(desc(order_expression) if reverse_order else asc(order_expression))
+        # Break ties by id so that pages are stable
+        query = query.order_by(desc(Derivative.id) if reverse_order else asc(Derivative.id))
+
+    # Paginate query
+    page_count = query.count() // page_size + 1
+    offset = page_size * (clamp(page_number, 1, page_count) - 1)
+    query = query.limit(page_size).offset(offset)
+    # Execute sql query
+    derivatives = query.all()
 
     # Return derivatives and page count
     return derivatives, page_count
+
+
+def indexDerivativesByCursor(page_size, cursor, order_key, reverse_order, search_term,
+                             min_notional, max_notional, min_strike, max_strike,
+                             min_maturity, max_maturity, min_trade_date, max_trade_date,
+                             buyers, sellers, assets, show_deleted, hide_not_deleted):
+    """ Enumerates a page of derivatives after the page identified by a cursor,
+    taking the same filters as ``indexDerivatives``.
+
+    Args:
+        page_size (int): The number of derivatives that form a page.
+        cursor (str): The cursor of the page, or an empty string for the first page.
+
+    Returns:
+        (tuple): tuple containing:
+            derivatives (list): The list of derivatives that make up the page
+            next_cursor (str): The cursor of the next page, None on the last page
+            total_count (int): The approximate number of derivatives across all pages
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    # Enforce a minimum page size
+    page_size = max(page_size, 3)
+
+    # Form filtered query
+    query, order_expression = filterDerivatives(
+        order_key, search_term, min_notional, max_notional, min_strike,
+        max_strike, min_maturity, max_maturity, min_trade_date, max_trade_date,
+        buyers, sellers, assets, show_deleted, hide_not_deleted)
+
+    # Default to ordering by id
+    if order_expression is None:
+        order_expression = Derivative.id
+
+    # Retrieve the page after the cursor
+    derivatives, next_cursor = utils.paginateByKeyset(query, order_expression, Derivative.id,
+                                                      page_size, cursor, reverse_order)
+
+    return derivatives, next_cursor, utils.approximateCount(query)
@@ -2,8 +2,167 @@
 import math
 from datetime import date
 
+# Third party imports
+from flask import g, has_app_context
+from sqlalchemy import Column, MetaData, Table
+import numpy as np
+
 # Local application imports
 from backend.external_models import Company, Currency, Product, CompanyStock
+from backend.db import db
+
+# Schema qualified copies of the external tables, keyed by schema and table name
+_external_tables = {}
+
+
+class MarketSnapshot:
+    """ An in-memory copy of the market data for a single valuation date.
+
+    The currency, product and company stock rows for the valuation date are
+    each loaded with a single query the first time they are needed, after
+    which all valuation lookups are served from memory.
+    """
+
+    def __init__(self, valuation_date):
+        self.valuation_date = valuation_date
+        self._exchange_rates = None
+        self._product_prices = None
+        self._stock_prices = None
+
+    @property
+    def exchange_rates(self):
+        if self._exchange_rates is None:
+            query = Currency.query.filter_by(valuation_date=self.valuation_date)
+            query = query.with_entities(Currency.code, Currency.usd_exchange_rate)
+            self._exchange_rates = dict(query.all())
+        return self._exchange_rates
+
+    @property
+    def product_prices(self):
+        if self._product_prices is None:
+            query = Product.query.filter_by(valuation_date=self.valuation_date)
+            query = query.with_entities(Product.name, Product.market_price, Product.currency_code)
+            self._product_prices = {name: (price, code) for name, price, code in query.all()}
+        return self._product_prices
+
+    @property
+    def stock_prices(self):
+        if self._stock_prices is None:
+            query = CompanyStock.query.filter_by(valuation_date=self.valuation_date)
+            query = query.with_entities(CompanyStock.company_id, CompanyStock.stock_price, CompanyStock.currency_code)
+            self._stock_prices = {company: (price, code) for company, price, code in query.all()}
+        return self._stock_prices
+
+    def getUSDExchangeRate(self, currency_code):
+        return self.exchange_rates.get(currency_code, math.nan)
+
+    def getProductPrice(self, product_name):
+        return self.product_prices.get(product_name, (math.nan, '?'))
+
+    def getCompanyStockPrice(self, company_id):
+        return self.stock_prices.get(company_id, (math.nan, '?'))
+
+    def getAssetPrice(self, asset_name, selling_party):
+        if asset_name.lower() == 'stocks':
+            return self.getCompanyStockPrice(selling_party)
+        return self.getProductPrice(asset_name)
+
+    def valueTrades(self, assets, selling_parties, quantities, notional_curr_codes):
+        """ Value many trades at once against this snapshot.
+
+        Args:
+            assets (list): The asset name of each trade.
+            selling_parties (list): The selling party of each trade.
+            quantities (list): The quantity of each trade.
+            notional_curr_codes (list): The notional currency code of each trade.
+
+        Returns:
+            (tuple): tuple containing:
+                notional_values (ndarray): The notional value of each trade
+                underlying_prices (ndarray): The underlying price of each trade
+                underlying_curr_codes (list): The underlying currency code of each trade
+        """
+        # Look up the underlying price and currency of each trade
+        prices = [self.getAssetPrice(a, s) for a, s in zip(assets, selling_parties)]
+        underlying_prices = np.array([p for p, _ in prices], dtype=float)
+        underlying_curr_codes = [c for _, c in prices]
+
+        # Look up the exchange rates of the underlying and notional currencies
+        u_ex_rates = np.array([self.getUSDExchangeRate(c) for c in underlying_curr_codes], dtype=float)
+        n_ex_rates = np.array([self.getUSDExchangeRate(c) for c in notional_curr_codes], dtype=float)
+
+        # Calculate the notional values of all the trades in one pass
+        quantities = np.array(quantities, dtype=float)
+        notional_values = quantities * underlying_prices * u_ex_rates / n_ex_rates
+
+        return notional_values, underlying_prices, underlying_curr_codes
+
+
+def getMarketSnapshot(valuation_date=None):
+    """ Retrieve the market data snapshot for the given valuation date.
+
+    Snapshots are cached on the application context, so within a request each
+    valuation date is loaded at most once.
+
+    Args:
+        valuation_date (date): The valuation date of the snapshot, defaults to today.
+
+    Returns:
+        MarketSnapshot: The market data snapshot for the valuation date.
+    """
+    valuation_date = valuation_date or date.today()
+
+    # Snapshots can only be shared when there is a context to hold them
+    if not has_app_context():
+        return MarketSnapshot(valuation_date)
+
+    if 'market_snapshots' not in g:
+        g.market_snapshots = {}
+
+    if valuation_date not in g.market_snapshots:
+        g.market_snapshots[valuation_date] = MarketSnapshot(valuation_date)
+
+    return g.market_snapshots[valuation_date]
+
+
+def invalidateMarketSnapshots(valuation_date=None):
+    """ Discard cached market data snapshots, such as when new prices land.
+
+    Args:
+        valuation_date (date): The valuation date to invalidate, defaults to all dates.
+
+    Returns:
+        None
+    """
+    if not has_app_context() or 'market_snapshots' not in g:
+        return
+
+    if valuation_date is None:
+        g.market_snapshots.clear()
+    else:
+        g.market_snapshots.pop(valuation_date, None)
+
+
+def getExternalTable(model):
+    """ Retrieve a schema qualified copy of an external table, so that it can
+    be joined to from queries against the derivatex database.
+
+    Args:
+        model (db.Model): The external model whose table is required.
+
+    Returns:
+        Table: The table of the model qualified by the external schema.
+    """
+    # The external schema is the database named by the external bind
+    schema = db.get_engine(bind='external').url.database
+    key = (schema, model.__tablename__)
+
+    if key not in _external_tables:
+        # Copy the columns only, foreign keys would refer to unqualified tables
+        columns = [Column(c.name, c.type, primary_key=c.primary_key) for c in model.__table__.columns]
+        _external_tables[key] = Table(model.__tablename__, MetaData(), *columns, schema=schema)
+
+    return _external_tables[key]
 
 
 def indexCompanies():
@@ -21,27 +180,16 @@ def indexCurrencyCodes():
 
 
 def getUSDExchangeRate(currency_code):
-    currency = Currency.query.get((currency_code, date.today()))
-    if currency is not None:
-        return currency.usd_exchange_rate
-    return math.nan
+    return getMarketSnapshot().getUSDExchangeRate(currency_code)
 
 
 def getProductPrice(product_name):
-    product = Product.query.get((product_name, date.today()))
-    if product is not None:
-        return product.market_price, product.currency_code
-    return math.nan, '?'
+    return getMarketSnapshot().getProductPrice(product_name)
 
 
 def getCompanyStockPrice(company_id):
-    company_stock = CompanyStock.query.get((company_id, date.today()))
-    if company_stock is not None:
-        return company_stock.stock_price, company_stock.currency_code
-    return math.nan, '?'
+    return getMarketSnapshot().getCompanyStockPrice(company_id)
 
 
 def getAssetPrice(asset_name, selling_party):
-    if asset_name.lower() == 'stocks':
-        return getCompanyStockPrice(selling_party)
-    return getProductPrice(asset_name)
+    return getMarketSnapshot().getAssetPrice(asset_name, selling_party)
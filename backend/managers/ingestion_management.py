@@ -0,0 +1,255 @@
+# Standard library imports
+import csv
+import datetime
+import hashlib
+import itertools
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+# Third party imports
+from flask import current_app
+
+# Local application imports
+from backend.derivatex_models import Derivative, Action, ActionType, IngestedFile, SearchTermType
+from backend.managers import external_management
+from backend.managers import search_management
+from backend.db import db
+
+# Format of the dates within trade files
+TRADE_DATE_FORMAT = '%d/%m/%Y'
+
+# Number of trades written to the database per transaction
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def listTradeFiles(paths):
+    """ Expand a list of trade files and directories of trade files.
+
+    Args:
+        paths (list of str): The paths of trade files or directories.
+
+    Returns:
+        list of str: The paths of the trade files, in name order within each directory.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.csv')]
+        else:
+            files.append(path)
+    return files
+
+
+def hashTradeFile(path):
+    """ Compute the digest of the contents of a trade file, which identifies
+    the file however it is named or wherever it is moved.
+
+    Args:
+        path (str): The path of the trade file.
+
+    Returns:
+        str: The hexadecimal SHA-256 digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as trade_file:
+        for block in iter(lambda: trade_file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def normalizeTrade(fields, exchange_rates):
+    """ Form derivative attribute values from the fields of a trade file row.
+
+    Strike prices are recorded in USD within the trade files, so they are
+    converted to the notional currency using the exchange rates of the date
+    of trade. Derivative codes are regenerated from the selling party.
+
+    Args:
+        fields (list of str): The fields of the trade file row.
+        exchange_rates (dict): The USD exchange rates of the date of trade, by currency code.
+
+    Returns:
+        dict: The derivative attribute values.
+
+    Raises:
+        ValueError: If the row is not a valid trade.
+    """
+    if len(fields) < 12:
+        raise ValueError(f'trade has {len(fields)} fields, expected 12')
+
+    # Unpack the fields of the trade
+    date_of_trade, _, asset, buying_party, selling_party, _, notional_curr_code, quantity, \
+        maturity_date, _, _, strike_price = fields[:12]
+
+    # Convert the strike price to the notional currency
+    strike_price = float(strike_price)
+    rate = exchange_rates.get(notional_curr_code)
+    if rate:
+        strike_price /= rate
+
+    return {
+        'code': f'{selling_party[:3]}-{random.randrange(1000)}',  # nosec B311
+        'buying_party': buying_party,
+        'selling_party': selling_party,
+        'asset': asset,
+        'quantity': int(float(quantity)),
+        'strike_price': strike_price,
+        'notional_curr_code': notional_curr_code,
+        'date_of_trade': datetime.datetime.strptime(date_of_trade, TRADE_DATE_FORMAT).date(),
+        'maturity_date': datetime.datetime.strptime(maturity_date, TRADE_DATE_FORMAT).date(),
+        'reported': False,
+        'deleted': False
+    }
+
+
+def parseTrades(rows, snapshots, excluded_parties=()):
+    """ Normalize the valid trades within rows of a trade file.
+
+    Args:
+        rows (list of list): The fields of each trade file row.
+        snapshots (dict): The market snapshots already loaded, by date, which is
+            extended with the snapshots of any new dates of trade.
+        excluded_parties (collection of str): Companies whose trades are skipped.
+
+    Returns:
+        (tuple): tuple containing:
+            trades (list of dict): The derivative attribute values of the valid trades
+            skipped (int): The number of rows skipped
+    """
+    trades = []
+    for fields in rows:
+        try:
+            date_of_trade = datetime.datetime.strptime(fields[0], TRADE_DATE_FORMAT).date()
+            if date_of_trade not in snapshots:
+                snapshots[date_of_trade] = external_management.MarketSnapshot(date_of_trade)
+            trade = normalizeTrade(fields, snapshots[date_of_trade].exchange_rates)
+        except (IndexError, ValueError):
+            continue
+
+        # Skip the trades of excluded companies
+        if trade['buying_party'] not in excluded_parties and trade['selling_party'] not in excluded_parties:
+            trades.append(trade)
+
+    return trades, len(rows) - len(trades)
+
+
+def writeTrades(trades, user_ids, batch):
+    """ Bulk insert derivatives and the actions that record their addition.
+
+    Args:
+        trades (list of dict): The derivative attribute values of the trades,
+            which are given the ids assigned by the database.
+        user_ids (list of int): The users actions are attributed to at random, may be empty.
+        batch (str): The key identifying the chunk of trades amongst all ingested trades.
+
+    Returns:
+        None
+    """
+    # Insert the derivatives with a single executemany
+    for trade in trades:
+        trade['ingest_batch'] = batch
+    db.session.bulk_insert_mappings(Derivative, trades)
+
+    # Read back the ids assigned by the database, which increase in insertion order
+    query = Derivative.query.filter_by(ingest_batch=batch).with_entities(Derivative.id).order_by(Derivative.id)
+    for trade, (derivative_id,) in zip(trades, query.all()):
+        trade['id'] = derivative_id
+
+    # Insert the actions recording the addition of the derivatives
+    db.session.bulk_insert_mappings(Action, [
+        dict(derivative_id=t['id'],
+             user_id=random.choice(user_ids) if user_ids else None,  # nosec B311
+             type=ActionType.ADD,
+             timestamp=datetime.datetime.combine(t['date_of_trade'], datetime.time()))
+        for t in trades])
+
+    # Make the derivative codes searchable
+    search_management.indexSearchTerms(SearchTermType.CODE, [(t['code'], t['code']) for t in trades])
+
+
+def ingestTradeFile(path, chunk_size=DEFAULT_CHUNK_SIZE, user_ids=None, excluded_parties=()):
+    """ Stream a trade file into the database in chunks, each committed in a
+    single transaction alongside the progress through the file. Files that
+    were partially ingested resume from the last committed chunk, files are
+    identified by their contents so that files of the same name are distinct.
+
+    Args:
+        path (str): The path of the trade file.
+        chunk_size (int): The number of rows committed per transaction.
+        user_ids (list of int): The users actions are attributed to at random.
+        excluded_parties (collection of str): Companies whose trades are skipped.
+
+    Returns:
+        dict: A summary of the rows loaded and skipped from the file.
+    """
+    # Retrieve the progress through the file
+    digest = hashTradeFile(path)
+    progress = IngestedFile.query.get(digest)
+    if progress is None:
+        progress = IngestedFile(digest=digest, path=os.path.abspath(path), rows_read=0, complete=False)
+        db.session.add(progress)
+    summary = {'file': os.path.basename(path), 'loaded': 0, 'skipped': 0}
+
+    if progress.complete:
+        return summary
+
+    # Market snapshots are loaded once per date of trade within the file
+    snapshots = {}
+
+    with open(path, newline='') as trade_file:
+        # Skip the header and any rows committed by a previous run
+        rows = itertools.islice(csv.reader(trade_file), 1 + progress.rows_read, None)
+
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+
+            trades, skipped = parseTrades(chunk, snapshots, excluded_parties)
+            summary['skipped'] += skipped
+
+            # Write the chunk and the progress through the file in one transaction
+            if trades:
+                writeTrades(trades, user_ids, f'{digest}:{progress.rows_read}')
+            progress.rows_read += len(chunk)
+            progress.complete = len(chunk) < chunk_size
+            db.session.commit()
+
+            summary['loaded'] += len(trades)
+            if progress.complete:
+                return summary
+
+
+def ingestTradeFiles(paths, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, user_ids=None, excluded_parties=()):
+    """ Ingest many trade files, several at once when multiple workers are used.
+
+    Args:
+        paths (list of str): The paths of trade files or directories of trade files.
+        workers (int): The number of files ingested at once.
+        chunk_size (int): The number of rows committed per transaction.
+        user_ids (list of int): The users actions are attributed to at random.
+        excluded_parties (collection of str): Companies whose trades are skipped.
+
+    Returns:
+        list of dict: A summary of the rows loaded and skipped from each file.
+    """
+    files = listTradeFiles(paths)
+
+    # A single worker ingests the files within the current session
+    if workers <= 1:
+        return [ingestTradeFile(f, chunk_size, user_ids, excluded_parties) for f in files]
+
+    app = current_app._get_current_object()  # pylint: disable=W0212
+
+    # Each worker ingests its files within its own app context and session
+    def work(path):
+        with app.app_context():
+            try:
+                return ingestTradeFile(path, chunk_size, user_ids, excluded_parties)
+            finally:
+                db.session.remove()
+
+    # Release the current session so the workers' transactions are not blocked
+    db.session.commit()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(work, files))
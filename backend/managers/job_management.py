@@ -0,0 +1,214 @@
+# Standard library imports
+from datetime import date, datetime, timedelta
+import logging
+import threading
+
+# Local application imports
+from backend.derivatex_models import ReportJob, ReportJobType, JobStatus
+from backend.managers import report_management
+from backend.db import db
+
+# Number of seconds an idle worker waits before checking for jobs again
+JOB_POLL_INTERVAL = 5
+
+# Running jobs not finished within this time are assumed to have been abandoned
+JOB_TIMEOUT = timedelta(hours=6)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueueReportJob(job_type, target_date=None, delta=False):
+    """ Add a report generation job to the job queue.
+
+    Args:
+        job_type (ReportJobType): The type of the job.
+        target_date (date): The date to generate a report for, if generating a single report.
+        delta (bool): Whether to patch the previous report of each date.
+
+    Returns:
+        ReportJob: The queued job.
+    """
+    job = ReportJob(type=job_type, target_date=target_date, delta=delta,
+                    status=JobStatus.QUEUED, progress=0, created=datetime.now())
+
+    # Add the job to the database session
+    db.session.add(job)
+    db.session.flush()
+
+    return job
+
+
+def enqueueMissedReports():
+    """ Queue the generation of all pending reports if any are for a day that has
+    already ended, as happens when the nightly job did not run.
+
+    Returns:
+        ReportJob: The queued job, None if no reports were missed or a job to generate them is already queued.
+    """
+    # Reports are only missed for the days before today
+    today = date.today()
+    if not any(target_date < today for target_date in report_management.getPendingReportDates()):
+        return None
+
+    # Leave the reports to a job that has not finished yet
+    query = ReportJob.query.filter(ReportJob.type == ReportJobType.GENERATE_ALL_REPORTS,
+                                   ReportJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]))
+    if query.first() is not None:
+        return None
+
+    return enqueueReportJob(ReportJobType.GENERATE_ALL_REPORTS)
+
+
+def getReportJob(job_id):
+    """ Retrieve the report job from the database that has the given ID.
+
+    Args:
+        job_id (int): The ID of the desired job.
+
+    Returns:
+        ReportJob: The job in the database with the corrosponding ID.
+    """
+    return ReportJob.query.get(job_id)
+
+
+def claimNextJob():
+    """ Claim the oldest queued job for the calling worker. Jobs locked by other
+    workers are skipped, so each job is claimed by exactly one worker.
+
+    Returns:
+        ReportJob: The claimed job, None if there are no queued jobs.
+    """
+    query = ReportJob.query.filter_by(status=JobStatus.QUEUED).order_by(ReportJob.id)
+    job = query.with_for_update(skip_locked=True).first()
+
+    if job is not None:
+        # Mark the job as running and release the lock
+        job.status = JobStatus.RUNNING
+        job.started = datetime.now()
+    db.session.commit()
+
+    return job
+
+
+def requeueAbandonedJobs():
+    """ Return jobs that have been running for longer than the job timeout to the
+    queue, such as those of a worker that was stopped part way through a job.
+
+    Returns:
+        int: The number of jobs returned to the queue.
+    """
+    query = ReportJob.query.filter(ReportJob.status == JobStatus.RUNNING,
+                                   ReportJob.started < datetime.now() - JOB_TIMEOUT)
+    count = query.update(dict(status=JobStatus.QUEUED, started=None, progress=0), synchronize_session=False)
+    db.session.commit()
+
+    return count
+
+
+def runJob(job):
+    """ Run a claimed report job, recording its progress, result and status.
+
+    Args:
+        job (ReportJob): The job to run.
+
+    Returns:
+        ReportJob: The finished job.
+    """
+    job_id = job.id
+
+    # Record the progress of the job as each report is generated
+    def recordProgress(progress, total):
+        job.progress = progress
+        job.total = total
+        db.session.commit()
+
+    try:
+        if job.type == ReportJobType.GENERATE_REPORT:
+            generate = report_management.generateDeltaReport if job.delta else report_management.generateReport
+            recordProgress(0, 1)
+            report_id = generate(job.target_date)
+            if report_id is None:
+                raise ValueError(f'no derivatives to report for: {job.target_date}')
+            report_ids = [report_id]
+            recordProgress(1, 1)
+        else:
+            report_ids = report_management.generateAllReports(delta=job.delta, on_progress=recordProgress)
+
+        job.report_ids = report_ids
+        job.status = JobStatus.COMPLETE
+
+    except Exception as e:  # pylint: disable=W0703
+        # Discard the work of the failed job and record the failure
+        logger.exception('report job %s failed', job_id)
+        db.session.rollback()
+        job = getReportJob(job_id)
+        job.status = JobStatus.FAILED
+        job.error = str(e)
+
+    job.finished = datetime.now()
+    db.session.commit()
+
+    return job
+
+
+def runNextJob():
+    """ Claim and run the oldest queued job.
+
+    Returns:
+        ReportJob: The finished job, None if there were no queued jobs.
+    """
+    job = claimNextJob()
+    return None if job is None else runJob(job)
+
+
+class JobWorker(threading.Thread):
+    """ A background thread that runs queued report jobs until stopped. """
+
+    def __init__(self, app, poll_interval=JOB_POLL_INTERVAL):
+        super(JobWorker, self).__init__(daemon=True)
+        self.app = app
+        self.poll_interval = poll_interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            with self.app.app_context():
+                try:
+                    job = runNextJob()
+                except Exception:  # pylint: disable=W0703
+                    logger.exception('report job worker failed to claim a job')
+                    job = None
+                finally:
+                    db.session.remove()
+
+            # Wait before checking for jobs again when the queue is empty
+            if job is None:
+                self.stopped.wait(self.poll_interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def startJobWorkers(app, count):
+    """ Start background threads that run queued report jobs.
+
+    Args:
+        app (Flask): The app the workers bind the database through.
+        count (int): The number of workers to start.
+
+    Returns:
+        list of JobWorker: The started workers.
+    """
+    if count <= 0:
+        return []
+
+    # Return the jobs of any workers that were stopped part way through to the queue
+    with app.app_context():
+        requeueAbandonedJobs()
+        db.session.remove()
+
+    workers = [JobWorker(app) for _ in range(count)]
+    for worker in workers:
+        worker.start()
+
+    return workers
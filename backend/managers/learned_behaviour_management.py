@@ -1,14 +1,50 @@
 # flake8: noqa
 
 # Standard library imports
+import contextlib
+import itertools
+import multiprocessing
+import os
 import random
 import datetime
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dateutil.relativedelta import *
 
+# Third party imports
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
 # Local application imports
 from backend.managers import external_management
 from backend.db import db
-from backend.derivatex_models import DecisionTreeNode, Label, Derivative, Action, ActionType, Features
+from backend.derivatex_models import DecisionTreeNode, Label, Derivative, Action, ActionType, Features, TrainingSample, \
+    IdSequence
+from backend import utils
+
+# Number of seconds compiled trees are reused before being compiled again, so
+# that changes made by other processes are picked up
+COMPILED_TREE_TTL = 60
+
+# Derivative attribute compared by the nodes of each feature
+FEATURE_FIELDS = {
+    Features.BUYING_PARTY: 'buying_party',
+    Features.SELLING_PARTY: 'selling_party',
+    Features.ASSET: 'asset',
+    Features.QUANTITY: 'quantity',
+    Features.STRIKE_PRICE: 'strike_price'
+}
+
+# Name of the sequence the ids of stored nodes are reserved from
+NODE_ID_SEQUENCE = 'decision_tree_node'
+
+# Features compared against statistics of the derivatives being split
+NUMERIC_FEATURES = (Features.QUANTITY, Features.STRIKE_PRICE)
+
+# Labels of the leaves of compiled trees, a child index of -1 - i denotes the i-th label
+LEAF_LABELS = (Label.VALID, Label.ERRONEOUS)
 
 
 def indexTrees():
@@ -34,44 +70,261 @@ def getNode(node_id):
     return DecisionTreeNode.query.get(node_id)
 
 
-def getFlags(node_id):
+def getFlags(node_id, limit=None):
     """Gets the flags for a give tree.
 
     Args:
         node_id (int): The ID of the tree to be ran.
+        limit (int): The maximum number of flags to return.
     Returns:
-        list: List of suspect derivatives.
+        list: List of suspect derivatives, in ID order.
     """
+    flagged_ids = splitOnTree(getNode(node_id))[Label.ERRONEOUS][:limit]
 
-    return splitOnTree(getNode(node_id))[Label.ERRONEOUS]
+    # Only the flagged derivatives are loaded in full
+    derivatives = Derivative.query.filter(Derivative.id.in_(flagged_ids.tolist())).order_by(Derivative.id).all()
+    columns = [c.name for c in Derivative.__table__.columns]
+
+    return [{'derivative': {c: getattr(d, c) for c in columns}} for d in derivatives]
 
 
 def verifyDerivative(derivative):
-    data = [{'derivative': derivative}]
+    """Find the approved trees that flag a derivative as erroneous, using the
+    compiled trees so that no database queries are made.
+
+    Args:
+        derivative (dict): The attributes of the derivative.
+    Returns:
+        list: The serialized root nodes of the trees that flag the derivative.
+    """
+    return [serialized for tree, serialized in getCompiledTrees()
+            if evaluateCompiledTree(tree, derivative) == Label.ERRONEOUS]
 
-    all_trees = DecisionTreeNode.query.filter(DecisionTreeNode.approved == 1).all()
-    result = []
 
-    for root_node in all_trees:
-        results = splitOnNode(root_node, data)
-        if len(results[Label.ERRONEOUS]) == 1:
-            result.append(root_node)
+def serializeTree(node, nodes):
+    """Serialize a tree as it is by the JSON encoder, with each node holding its children.
 
-    return result
+    Args:
+        node (DecisionTreeNode): The root node of the tree.
+        nodes (dict): All nodes by ID.
+    Returns:
+        dict: The serialized tree.
+    """
+    children = {
+        'true_node': nodes.get(node.true_node_id),
+        'false_node': nodes.get(node.false_node_id)
+    }
+    children = {k: serializeTree(v, nodes) if v is not None else None for k, v in children.items()}
+    return utils.getSerializer(DecisionTreeNode).serialize(node, children)
+
+
+def compileTree(root_node, nodes):
+    """Flatten a tree into parallel arrays indexed by node position, with the
+    root node at position 0.
+
+    Nodes of a numeric feature send their true branch everything, as they do
+    when splitting too few derivatives to derive the mean and deviation from.
+
+    Args:
+        root_node (DecisionTreeNode): The root node of the tree.
+        nodes (dict): All nodes by ID.
+    Returns:
+        tuple: The compared attribute (None for numeric features), criteria,
+        true child index and false child index of each node. Negative child
+        indices denote leaves of the corresponding ``LEAF_LABELS`` label.
+    """
+    # Number the nodes of the tree
+    order = []
+    stack = [root_node]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        for label, child_id in [(node.false_label, node.false_node_id), (node.true_label, node.true_node_id)]:
+            if label is None and child_id in nodes:
+                stack.append(nodes[child_id])
+    positions = {node.id: position for position, node in enumerate(order)}
+
+    # Resolve the index of a child, missing children are valid leaves
+    def childIndex(label, child_id):
+        if label is None and child_id in positions:
+            return positions[child_id]
+        return -1 - LEAF_LABELS.index(label or Label.VALID)
+
+    fields = [None if n.feature in NUMERIC_FEATURES else FEATURE_FIELDS.get(n.feature)
+              for n in order]
+    criteria = [n.criteria for n in order]
+    true_children = [childIndex(n.true_label, n.true_node_id) for n in order]
+    false_children = [childIndex(n.false_label, n.false_node_id) for n in order]
+
+    return fields, criteria, true_children, false_children
+
+
+def evaluateCompiledTree(tree, derivative):
+    """Label a derivative using a compiled tree.
+
+    Args:
+        tree (tuple): The compiled tree.
+        derivative (dict): The attributes of the derivative.
+    Returns:
+        Label: The label the tree gives the derivative.
+    """
+    fields, criteria, true_children, false_children = tree
+
+    index = 0
+    while index >= 0:
+        field = fields[index]
+        if field is None or derivative.get(field) == criteria[index]:
+            index = true_children[index]
+        else:
+            index = false_children[index]
+
+    return LEAF_LABELS[-1 - index]
+
+
+def getCompiledTrees():
+    """Get the approved trees compiled for evaluation, compiling them with a
+    single query when they have been invalidated or have expired.
+
+    Returns:
+        list: Tuples of each compiled tree and its serialized root node.
+    """
+    compiled, compiled_at = getattr(getCompiledTrees, 'cache', None) or (None, 0)
+
+    if compiled is None or time.monotonic() - compiled_at > COMPILED_TREE_TTL:
+        nodes = {node.id: node for node in DecisionTreeNode.query.all()}
+        roots = sorted((n for n in nodes.values() if n.approved), key=lambda n: n.id)
+        compiled = [(compileTree(root, nodes), serializeTree(root, nodes)) for root in roots]
+        getCompiledTrees.cache = (compiled, time.monotonic())
+
+    return compiled
+
+
+def invalidateCompiledTrees():
+    """Discard the compiled trees, so they are compiled again when next used.
+    """
+    getCompiledTrees.cache = None
+
+
+def loadFeatureColumns(query, features=tuple(Features)):
+    """Load the feature attributes of derivatives into arrays, one per attribute.
+
+    Args:
+        query (Query): The query of the derivatives.
+        features (collection of Features): The features to load the attributes of.
+    Returns:
+        dict: The array of IDs and of each feature attribute, by attribute name.
+    """
+    fields = ['id'] + [FEATURE_FIELDS[f] for f in Features if f in features]
+    query = query.with_entities(*[getattr(Derivative, f) for f in fields]).order_by(Derivative.id)
+
+    # Rows are fetched without building ORM result tuples
+    rows = db.session.execute(query.statement).fetchall()
+    values = list(zip(*rows)) or [()] * len(fields)
+
+    # Numeric attributes are stored as floats, the others as python objects
+    dtypes = {FEATURE_FIELDS[f]: float for f in NUMERIC_FEATURES}
+    dtypes['id'] = np.int64
+    return {f: np.array(v, dtype=dtypes.get(f, object)) for f, v in zip(fields, values)}
+
+
+def splitMask(feature, criteria, columns, rows, valid=None):
+    """Evaluate a node over derivatives as ``DecisionTreeNode.split`` does,
+    deriving the statistics of numeric features from the derivatives split.
+
+    Args:
+        feature (Features): The feature of the node.
+        criteria (str): The criteria of the node.
+        columns (dict): The feature arrays of all derivatives.
+        rows (ndarray): The positions of the derivatives to split.
+        valid (ndarray): Whether each derivative is labelled valid, if labelled.
+    Returns:
+        ndarray: Whether each split derivative matches the node.
+    """
+    values = columns[FEATURE_FIELDS[feature]][rows]
+
+    if feature not in NUMERIC_FEATURES:
+        return values == criteria
+
+    # Too few derivatives to derive statistics from all match
+    if len(rows) <= 2:
+        return np.ones(len(rows), dtype=bool)
+
+    # Statistics are derived from the valid derivatives when labelled, none
+    # match if there are too few to derive them from
+    stats = values if valid is None else values[valid[rows]]
+    mean, deviation = 0, 0
+    if criteria in ('less_than_mean', 'more_than_mean'):
+        if len(stats) < 1:
+            return np.zeros(len(rows), dtype=bool)
+        mean = stats.mean()
+    else:
+        if len(stats) < 2:
+            return np.zeros(len(rows), dtype=bool)
+        deviation = stats.std(ddof=1)
+    distance = np.abs(mean - values)
+
+    masks = {
+        'less_than_mean': lambda: values < mean,
+        'more_than_mean': lambda: values > mean,
+        '0_to_1_std': lambda: distance <= deviation,
+        '1_to_2_std': lambda: (deviation < distance) & (distance <= 2 * deviation),
+        '2_to_3_std': lambda: (2 * deviation < distance) & (distance <= 3 * deviation),
+        '3_to_inf_std': lambda: distance > 3 * deviation
+    }
+    return masks.get(criteria, lambda: np.zeros(len(rows), dtype=bool))()
+
+
+def splitRows(root_node, columns, nodes, valid=None, rows=None):
+    """Label derivatives with a tree, evaluating each node over all the
+    derivatives that reach it at once.
+
+    Args:
+        root_node (DecisionTreeNode): The root node of the tree.
+        columns (dict): The feature arrays of the derivatives.
+        nodes (dict): All nodes by ID.
+        valid (ndarray): Whether each derivative is labelled valid, if labelled.
+        rows (ndarray): The positions of the derivatives to label, all by default.
+    Returns:
+        dict: The positions of the derivatives given each label, in ascending order.
+    """
+    result = {Label.VALID: [], Label.ERRONEOUS: []}
+
+    stack = [(root_node, np.arange(len(columns['id'])) if rows is None else rows)]
+    while stack:
+        node, rows = stack.pop()
+        mask = splitMask(node.feature, node.criteria, columns, rows, valid)
+
+        # Label the derivatives reaching leaves, passing the others on to the child nodes
+        for label, child_id, branch in [(node.true_label, node.true_node_id, rows[mask]),
+                                        (node.false_label, node.false_node_id, rows[~mask])]:
+            if label is None and child_id in nodes:
+                stack.append((nodes[child_id], branch))
+            else:
+                result[label or Label.VALID].append(branch)
+
+    return {label: np.sort(np.concatenate(parts)) if parts else np.array([], dtype=int)
+            for label, parts in result.items()}
 
 
 def splitOnTree(root_node):
+    """Label the derivatives traded within the last month with a tree.
+
+    Args:
+        root_node (DecisionTreeNode): The root node of the tree.
+    Returns:
+        dict: The IDs of the derivatives given each label, in ascending order.
+    """
     # Gather data
     one_month_ago = datetime.date.today() - relativedelta(months=1)
-    nonAbsoluteDerivatives = Derivative.query.filter(Derivative.date_of_trade >= one_month_ago).all()
-    data = []
-    for derivative in nonAbsoluteDerivatives:
-        derivative = derivative.__dict__
-        derivative.pop('_sa_instance_state')
-        data.append({'derivative': derivative})
+    nodes = {node.id: node for node in DecisionTreeNode.query.all()}
+
+    # Only the attributes of features compared by some node are loaded
+    features = {node.feature for node in nodes.values()} | {root_node.feature}
+    columns = loadFeatureColumns(Derivative.query.filter(Derivative.date_of_trade >= one_month_ago), features)
 
     # Split the data
-    result = splitOnNode(root_node, data)
+    rows = splitRows(root_node, columns, nodes)
+    result = {label: columns['id'][positions] for label, positions in rows.items()}
 
     # Update the last flag count
     root_node.last_flag_count = len(result[Label.ERRONEOUS])
@@ -129,6 +382,9 @@ def updateNode(node, updates):
     db.session.add(node)
     db.session.flush()
 
+    # Trees are compiled again with the update
+    invalidateCompiledTrees()
+
     # Return None
     return None
 
@@ -158,6 +414,7 @@ def removeTree(root_node):
     for node in all_nodes:
         db.session.delete(node)
     db.session.flush()
+    invalidateCompiledTrees()
 
 
 def removeUnapprovedTrees():
@@ -169,17 +426,69 @@ def removeUnapprovedTrees():
     db.session.commit()
 
 
-def growTrees():
+def growTrees(workers=1, rebuild=False):
     """Grow decision trees from the current data.
 
     This function will grow a number of decision trees from the
     erroneous data in the database.
+
+    Args:
+        workers (int): The number of processes candidate nodes are evaluated by.
+        rebuild (bool): Whether to rebuild the training samples from the action history.
+    Returns:
+        int: 1 once the trees are grown, 0 if there is no erroneous training data.
     """
+    # Samples are recorded as derivatives are updated, the history of earlier
+    # updates is only replayed on request
+    if rebuild:
+        rebuildTrainingSamples()
 
     trainingData, testData = compileData()
 
-    validTrainingData = [x for x in trainingData if x['label'] == Label.VALID]
-    errorsLeftToFind = [x for x in trainingData if x['label'] == Label.ERRONEOUS]
+    # Encode the training data once for all trees
+    training_set = TrainingSet(trainingData)
+
+    # Trees are grown from errors, there are none until samples are recorded or rebuilt
+    if training_set.valid.all():
+        return 0
+
+    with contextlib.ExitStack() as stack:
+        executor = None
+        if workers > 1:
+            # Workers memory map the training arrays from a temporary directory,
+            # and are spawned as forking would copy the locks held by other threads
+            directory = stack.enter_context(tempfile.TemporaryDirectory())
+            training_set.save(directory)
+            context = multiprocessing.get_context('spawn')
+            executor = stack.enter_context(ProcessPoolExecutor(workers, mp_context=context,
+                                                               initializer=initTrainingWorker,
+                                                               initargs=(directory,)))
+
+        # Trees are grown one after another, each from the errors left by the last
+        growTreesFrom(training_set, executor, workers)
+
+    db.session.commit()
+
+    # Trees are compiled again with the new trees
+    invalidateCompiledTrees()
+
+    return 1
+
+
+def growTreesFrom(training_set, executor=None, workers=1):
+    """Grow up to 10 decision trees, each from the errors not found by the previous trees.
+
+    Args:
+        training_set (TrainingSet): The encoded training data.
+        executor (ProcessPoolExecutor): The training workers to search for nodes with, if any.
+        workers (int): The number of training workers of the executor.
+    """
+    validTrainingRows = np.flatnonzero(training_set.valid)
+    errorsLeftToFind = np.flatnonzero(~training_set.valid)
+
+    # Nodes are numbered in memory as trees are grown, and renumbered with
+    # reserved ids when they are stored
+    ids = itertools.count(1)
 
     number_of_trees = 0
     total_starting_errors = len(errorsLeftToFind)
@@ -187,101 +496,91 @@ def growTrees():
 
     while number_of_trees < 10 and not finished:
         number_of_trees += 1
-        print(f"Training tree {number_of_trees}")
-        print(f"{len(errorsLeftToFind)} errors left to find")
-        trainingData = validTrainingData + errorsLeftToFind
-        rootNode = growTree(trainingData)
-        result = splitOnNode(rootNode, trainingData)
-        truePositives = [x for x in result[Label.ERRONEOUS] if x['label'] == Label.ERRONEOUS]
-        falsePositives = [x for x in result[Label.ERRONEOUS] if x['label'] == Label.VALID]
-        print(len(truePositives))
-        print((len(truePositives) + len(falsePositives)))
-        rootNode.confidence = (len(truePositives) / (len(truePositives) + len(falsePositives))) * 100
-        if len(truePositives) / total_starting_errors < 0.05:
-            removeTree(rootNode)
-        else:
-            splitOnTree(rootNode)
-        db.session.flush()
-        errorsLeftToFind = [x for x in result[Label.VALID] if x['label'] == Label.ERRONEOUS]
+        rows = np.concatenate([validTrainingRows, errorsLeftToFind])
+        rootNode, nodes = growTree(training_set, rows, ids, executor, workers)
+        result = splitRows(rootNode, training_set.columns, nodes, training_set.valid, rows)
+        truePositives = np.count_nonzero(~training_set.valid[result[Label.ERRONEOUS]])
+        falsePositives = np.count_nonzero(training_set.valid[result[Label.ERRONEOUS]])
+        rootNode.confidence = (truePositives / max(truePositives + falsePositives, 1)) * 100
+        # Only trees that find enough errors are stored
+        if truePositives / total_starting_errors >= 0.05:
+            persistTree(nodes)
+            # Release the id sequence once the tree is stored
+            db.session.commit()
+            splitOnTree(getNode(rootNode.id))
+        errorsLeftToFind = result[Label.VALID][~training_set.valid[result[Label.VALID]]]
         if len(errorsLeftToFind) / total_starting_errors < 0.1:
             finished = True
 
-    db.session.commit()
 
-    return 1
-
-
-def growTree(trainingData):
+def growTree(training_set, rows, ids, executor=None, workers=1):
+    """Grow and prune a decision tree from training data in memory, without
+    adding its nodes to the database session.
 
+    Args:
+        training_set (TrainingSet): The encoded training data.
+        rows (ndarray): The positions of the training data to grow the tree from.
+        ids (iterator): The ids to assign the nodes of the tree.
+        executor (ProcessPoolExecutor): The training workers to search for nodes with, if any.
+        workers (int): The number of training workers of the executor.
+    Returns:
+        (DecisionTreeNode, dict): The root node of the tree and all its nodes by id.
+    """
     potentialNodeCriteria = generatePotentialNodeCriteria()
-    q = []
+    nodes = {}
+
+    # Add a grown node to the tree, returning whether it labels any data erroneous
+    def addNode(nodeData, parent_id=None):
+        node, trueData, falseData = nodeData
+        node.id = next(ids)
+        node.parent_id = parent_id
+        node.true_label = training_set.label(trueData)
+        node.false_label = training_set.label(falseData)
+        nodes[node.id] = node
+        return Label.ERRONEOUS in (node.true_label, node.false_label)
+
+    q = [growNode(potentialNodeCriteria, training_set, rows, executor, workers)]
+    addNode(q[0])
+    rootNode = q[0][0]
     finished = False
-    q.append(growNode(potentialNodeCriteria, trainingData))
-    trueLabel, falseLabel = getNodeLabel(q[0][1], q[0][2])
-    q[0][0].true_label = trueLabel
-    q[0][0].false_label = falseLabel
-    db.session.add(q[0][0])
-    db.session.flush()
-    rootNodeId = q[0][0].id
     while len(q) > 0 and not finished:
-        currentNodeData = q.pop(0)
-        currentNode = currentNodeData[0]
-        trueData = currentNodeData[1]
-        falseData = currentNodeData[2]
-        # Check for the tree being complete
-
-        trueNodeData = growNode(potentialNodeCriteria, trueData)
-        trueLabel, falseLabel = getNodeLabel(trueNodeData[1], trueNodeData[2])
-        impurity = calculateGiniImpurity(trueNodeData[1], trueNodeData[2])
-        # print(f"trueNode: {trueNodeData[0]}")
-        # print(f"truelabel: {trueLabel}")
-        # print(f"falselabel: {falseLabel}")
-        # print(f"impurity: {calculateGiniImpurity(trueNodeData[1], trueNodeData[2])}")
-        # print()
-        trueNodeData[0].parent_id = currentNode.id
-        trueNodeData[0].true_label = trueLabel
-        trueNodeData[0].false_label = falseLabel
+        currentNode, trueData, falseData = q.pop(0)
+
+        # Replace the true label of the node with a child node, stopping once a node labels errors
+        trueNodeData = growNode(potentialNodeCriteria, training_set, trueData, executor, workers)
+        finished = addNode(trueNodeData, currentNode.id)
         currentNode.true_label = None
-        db.session.add(trueNodeData[0])
         currentNode.true_node_id = trueNodeData[0].id
         q.append(trueNodeData)
 
-        if trueLabel == Label.ERRONEOUS or falseLabel == Label.ERRONEOUS:
-            finished = True
-
-        db.session.flush()
-        currentNode.true_node_id = trueNodeData[0].id
-
         if not finished:
-            falseNodeData = growNode(potentialNodeCriteria, falseData)
-            trueLabel, falseLabel = getNodeLabel(falseNodeData[1], falseNodeData[2])
-            # impurity = calculateGiniImpurity(falseNodeData[1], falseNodeData[2])
-            # print(f"trueNode: {falseNodeData[0]}")
-            # print(f"truelabel: {trueLabel}")
-            # print(f"falselabel: {falseLabel}")
-            # print(f"impurity: {calculateGiniImpurity(trueNodeData[1], trueNodeData[2])}")
-            # print()
-            falseNodeData[0].parent_id = currentNode.id
-            falseNodeData[0].true_label = trueLabel
-            falseNodeData[0].false_label = falseLabel
+            falseNodeData = growNode(potentialNodeCriteria, training_set, falseData, executor, workers)
+            finished = addNode(falseNodeData, currentNode.id)
             currentNode.false_label = None
-            db.session.add(falseNodeData[0])
-            db.session.flush()
             currentNode.false_node_id = falseNodeData[0].id
             q.append(falseNodeData)
 
-            if trueLabel == Label.ERRONEOUS or falseLabel == Label.ERRONEOUS:
-                finished = True
+    # Prune the resulting tree
+    pruneNode(rootNode, nodes)
 
-        db.session.add(currentNode)
-        db.session.flush()
-        db.session.commit()
+    # Suggest corrections to the errors the tree finds
+    suggestCorrection(rootNode, nodes, training_set, rows)
+
+    return rootNode, nodes
 
-    # Prune the resulting tree
-    pruneNode(getNode(rootNodeId))
 
-    erroneous_split = splitOnNode(getNode(rootNodeId), trainingData)[Label.ERRONEOUS]
-    correct_erroneous_split = [x for x in erroneous_split if x['label'] == Label.ERRONEOUS]
+def suggestCorrection(root_node, nodes, training_set, rows):
+    """Suggest the field, and the value, that is corrected in over 90% of the
+    errors a tree finds, if there are such a field and value.
+
+    Args:
+        root_node (DecisionTreeNode): The root node of the tree.
+        nodes (dict): The nodes of the tree by id.
+        training_set (TrainingSet): The encoded training data.
+        rows (ndarray): The positions of the training data the tree was grown from.
+    """
+    erroneous_split = splitRows(root_node, training_set.columns, nodes, training_set.valid, rows)[Label.ERRONEOUS]
+    correct_erroneous_split = [training_set.items[i] for i in erroneous_split if not training_set.valid[i]]
 
     suggested_features = {}
     for err in correct_erroneous_split:
@@ -292,10 +591,9 @@ def growTree(trainingData):
 
     for feature in suggested_features:
         if suggested_features[feature] / len(correct_erroneous_split) > 0.9:
-            getNode(rootNodeId).suggested_feature = feature
-            db.session.flush()
+            root_node.suggested_feature = feature
 
-    if getNode(rootNodeId).suggested_feature:
+    if root_node.suggested_feature:
         suggested_values = {}
         for err in correct_erroneous_split:
             if err["correction"] not in suggested_values:
@@ -305,23 +603,26 @@ def growTree(trainingData):
 
         for value in suggested_values:
             if suggested_values[value] / len(correct_erroneous_split) > 0.9:
-                getNode(rootNodeId).suggested_value = value
-                db.session.flush()
+                root_node.suggested_value = value
 
-    db.session.commit()
-    return getNode(rootNodeId)
 
+def pruneNode(node, nodes):
+    """Replace the children of a tree that give both branches the same label
+    with that label, removing them from the nodes of the tree.
 
-def pruneNode(node):
+    Args:
+        node (DecisionTreeNode): The node to prune the subtree of.
+        nodes (dict): The nodes of the tree by id.
+    """
     if (node.true_node_id is not None):
-        pruneNode(DecisionTreeNode.query.get(node.true_node_id))
+        pruneNode(nodes[node.true_node_id], nodes)
 
     if (node.false_node_id is not None):
-        pruneNode(DecisionTreeNode.query.get(node.false_node_id))
+        pruneNode(nodes[node.false_node_id], nodes)
 
-    if node.true_label is not None and node.false_label is not None:
+    if node.true_label is not None and node.false_label is not None and node.parent_id is not None:
         if node.true_label == node.false_label:
-            parentNode = DecisionTreeNode.query.get(node.parent_id)
+            parentNode = nodes[node.parent_id]
             isTrueNode = parentNode.true_node_id == node.id
             if isTrueNode:
                 parentNode.true_label = node.true_label
@@ -329,69 +630,276 @@ def pruneNode(node):
             else:
                 parentNode.false_label = node.false_label
                 parentNode.false_node_id = None
-            db.session.delete(node)
+            del nodes[node.id]
 
+
+def reserveNodeIds(count):
+    """Reserve a block of consecutive node ids, so that overlapping training
+    runs store their trees under distinct ids. The sequence row is locked
+    until the session is committed.
+
+    Args:
+        count (int): The number of ids to reserve.
+    Returns:
+        int: The first id of the block.
+    """
+    sequence = IdSequence.query.filter_by(name=NODE_ID_SEQUENCE).with_for_update().first()
+
+    if sequence is None:
+        # Create the sequence, another process may create it at the same time
+        db.session.add(IdSequence(name=NODE_ID_SEQUENCE, next_id=1))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        return reserveNodeIds(count)
+
+    # Start after any nodes stored without reserving their ids
+    max_id = db.session.query(func.max(DecisionTreeNode.id)).scalar()
+    start = max(sequence.next_id, (max_id or 0) + 1)
+    sequence.next_id = start + count
     db.session.flush()
 
+    return start
 
-def getNodeLabel(trueSplit, falseSplit):
-    trueValid = len([x for x in trueSplit if x['label'] == Label.VALID])
-    trueErroneous = len([x for x in trueSplit if x['label'] == Label.ERRONEOUS])
-    if trueValid >= trueErroneous:
-        trueLabel = Label.VALID
-    else:
-        trueLabel = Label.ERRONEOUS
 
-    falseValid = len([x for x in falseSplit if x['label'] == Label.VALID])
-    falseErroneous = len([x for x in falseSplit if x['label'] == Label.ERRONEOUS])
-    if falseValid >= falseErroneous:
-        falseLabel = Label.VALID
-    else:
-        falseLabel = Label.ERRONEOUS
+def persistTree(nodes):
+    """Insert the nodes of a tree grown in memory with a single bulk insert,
+    renumbering them with a block of reserved ids.
+
+    Args:
+        nodes (dict): The nodes of the tree by their ids in memory.
+    Returns:
+        dict: The nodes of the tree by their stored ids.
+    """
+    start = reserveNodeIds(len(nodes))
+    assigned = {node_id: start + i for i, node_id in enumerate(nodes)}
 
-    return trueLabel, falseLabel
+    # Renumber the nodes and the references between them
+    for node in nodes.values():
+        node.id = assigned[node.id]
+        for reference in ['parent_id', 'true_node_id', 'false_node_id']:
+            setattr(node, reference, assigned.get(getattr(node, reference)))
 
+    # Every node sets every column, NULLs included, so that the nodes are
+    # inserted with one executemany. Unset attributes take the column defaults
+    columns = DecisionTreeNode.__table__.columns
+    defaults = {c.name: c.default.arg for c in columns if c.default is not None}
+    mappings = [{c.name: defaults.get(c.name) if getattr(node, c.name) is None else getattr(node, c.name)
+                 for c in columns} for node in nodes.values()]
+    db.session.bulk_insert_mappings(DecisionTreeNode, mappings, render_nulls=True)
 
-def growNode(potentialNodeCriteria, trainingData):
-    bestNode = None
-    bestImpurity = 1.1
-    for nodeCriteria in potentialNodeCriteria:
-        potentialNode = DecisionTreeNode(feature=nodeCriteria[0],
-                                         criteria=nodeCriteria[1])
+    return {node.id: node for node in nodes.values()}
 
-        trueSplit, falseSplit = potentialNode.split(trainingData)
-        impurity = calculateGiniImpurity(trueSplit, falseSplit)
-        if impurity < bestImpurity:
-            bestImpurity = impurity
-            bestNode = potentialNode
 
-    trueSplit, falseSplit = bestNode.split(trainingData)
-    return bestNode, trueSplit, falseSplit
+class TrainingSet:
+    """Labelled training data encoded into arrays once, so that candidate
+    nodes are evaluated by counting rather than by splitting lists.
 
+    The values of categorical features are encoded as integer codes, so that
+    the labels of each value are counted for every candidate at once.
+    """
 
-def calculateGiniImpurity(trueSplit, falseSplit):
-    if (len(trueSplit) + len(falseSplit)) == 0:
-        return 0
-    alpha = len(trueSplit) / (len(trueSplit) + len(falseSplit))
+    def __init__(self, data):
+        self.items = data
+        self.valid = np.array([x['label'] == Label.VALID for x in data], dtype=bool)
+        self.columns = {'id': np.array([x['derivative'].get('id') or 0 for x in data], dtype=np.int64)}
+        self.codes = {}
+        self.code_lookup = {}
+
+        for feature, field in FEATURE_FIELDS.items():
+            values = [x['derivative'][field] for x in data]
+            if feature in NUMERIC_FEATURES:
+                self.columns[field] = np.array(values, dtype=float)
+                continue
+
+            # Number each distinct value of the feature
+            lookup = {}
+            self.codes[field] = np.array([lookup.setdefault(v, len(lookup)) for v in values], dtype=np.int64)
+            self.code_lookup[field] = lookup
+            self.columns[field] = np.array(values, dtype=object)
+
+    def counts(self, rows, mask=None):
+        """Count the valid and erroneous training data at the given positions.
+
+        Args:
+            rows (ndarray): The positions of the training data.
+            mask (ndarray): Which of the positions to count, all by default.
+        Returns:
+            (int, int): The number of valid and erroneous items.
+        """
+        valid = self.valid[rows] if mask is None else self.valid[rows][mask]
+        valid_count = np.count_nonzero(valid)
+        return valid_count, len(valid) - valid_count
+
+    @property
+    def arrays(self):
+        """dict: The label mask, categorical codes and numeric attributes, by name."""
+        arrays = {'valid': self.valid}
+        arrays.update(self.codes)
+        arrays.update({FEATURE_FIELDS[f]: self.columns[FEATURE_FIELDS[f]] for f in NUMERIC_FEATURES})
+        return arrays
+
+    def encodeCandidates(self, potentialNodeCriteria):
+        """Encode the criteria of candidate nodes against the training data.
+
+        Args:
+            potentialNodeCriteria (list): The feature and criteria of each candidate node.
+        Returns:
+            list: The feature, criteria and value code of each candidate. Codes
+            are None for numeric features, and -1 for values absent from the data.
+        """
+        encoded = []
+        for feature, criteria in potentialNodeCriteria:
+            lookup = self.code_lookup.get(FEATURE_FIELDS[feature])
+            encoded.append((feature, criteria, None if lookup is None else lookup.get(criteria, -1)))
+        return encoded
+
+    def save(self, directory):
+        """Save the arrays used to evaluate candidates, so that worker
+        processes can memory map them rather than receive copies.
+
+        Args:
+            directory (str): The directory to save the arrays in.
+        Returns:
+            None
+        """
+        for name, array in self.arrays.items():
+            np.save(os.path.join(directory, f'{name}.npy'), array)
+
+    def label(self, rows):
+        """Find the majority label of the training data at the given positions,
+        favouring valid.
+
+        Args:
+            rows (ndarray): The positions of the training data.
+        Returns:
+            Label: The majority label.
+        """
+        valid, erroneous = self.counts(rows)
+        return Label.VALID if valid >= erroneous else Label.ERRONEOUS
+
+
+def calculateGiniImpurity(true_valid, true_erroneous, false_valid, false_erroneous):
+    """Calculate the weighted Gini impurity of splits from their label counts.
 
-    trueSplitValidData = list(filter(lambda x: x['label'] == Label.VALID, trueSplit))
-    trueSplitErroneousData = list(filter(lambda x: x['label'] == Label.ERRONEOUS, trueSplit))
-    if len(trueSplitValidData) > 0 and len(trueSplitErroneousData) > 0:
-        trueP = len(trueSplitValidData) / (len(trueSplitValidData) + len(trueSplitErroneousData))
-    else:
-        trueP = 0
+    Args:
+        true_valid (ndarray): The number of valid items in the true split of each candidate.
+        true_erroneous (ndarray): The number of erroneous items in the true split of each candidate.
+        false_valid (ndarray): The number of valid items in the false split of each candidate.
+        false_erroneous (ndarray): The number of erroneous items in the false split of each candidate.
+    Returns:
+        ndarray: The impurity of each candidate.
+    """
+    true_total = true_valid + true_erroneous
+    false_total = false_valid + false_erroneous
+    total = true_total + false_total
+    alpha = true_total / np.maximum(total, 1)
+
+    # Pure splits have no impurity
+    trueP = np.where((true_valid > 0) & (true_erroneous > 0), true_valid / np.maximum(true_total, 1), 0)
+    falseP = np.where((false_valid > 0) & (false_erroneous > 0), false_valid / np.maximum(false_total, 1), 0)
     trueImpurity = 2 * trueP * (1 - trueP)
-
-    falseSplitValidData = list(filter(lambda x: x['label'] == Label.VALID, falseSplit))
-    falseSplitErroneousData = list(filter(lambda x: x['label'] == Label.ERRONEOUS, falseSplit))
-    if len(falseSplitValidData) > 0 and len(falseSplitErroneousData) > 0:
-        falseP = len(falseSplitValidData) / (len(falseSplitValidData) + len(falseSplitErroneousData))
-    else:
-        falseP = 0
     falseImpurity = 2 * falseP * (1 - falseP)
 
     impurity = alpha * trueImpurity + (1 - alpha) * falseImpurity
-    return impurity
+    return np.where(total > 0, impurity, 0)
+
+
+def countCandidateLabels(candidates, arrays, rows):
+    """Count the labels of the training data each candidate node sends to its
+    true branch.
+
+    Args:
+        candidates (list): The encoded candidates, see ``TrainingSet.encodeCandidates``.
+        arrays (dict): The arrays of the training data, see ``TrainingSet.arrays``.
+        rows (ndarray): The positions of the training data to split.
+    Returns:
+        (ndarray, ndarray): The number of valid and erroneous items sent to the
+        true branch of each candidate.
+    """
+    true_valid = np.zeros(len(candidates), dtype=np.int64)
+    true_erroneous = np.zeros(len(candidates), dtype=np.int64)
+    valid = arrays['valid'][rows]
+    value_counts = {}
+
+    for i, (feature, criteria, code) in enumerate(candidates):
+        field = FEATURE_FIELDS[feature]
+        if code is None:
+            mask = splitMask(feature, criteria, arrays, rows, arrays['valid'])
+            true_valid[i] = np.count_nonzero(valid & mask)
+            true_erroneous[i] = np.count_nonzero(mask) - true_valid[i]
+            continue
+
+        # Count the labels of every value of the feature at once
+        if field not in value_counts:
+            codes = arrays[field][rows]
+            value_counts[field] = (np.bincount(codes[valid]), np.bincount(codes[~valid]))
+        valid_counts, erroneous_counts = value_counts[field]
+        true_valid[i] = valid_counts[code] if 0 <= code < len(valid_counts) else 0
+        true_erroneous[i] = erroneous_counts[code] if 0 <= code < len(erroneous_counts) else 0
+
+    return true_valid, true_erroneous
+
+
+def initTrainingWorker(directory):
+    """Memory map the training arrays saved by ``TrainingSet.save`` within a
+    training worker process.
+
+    Args:
+        directory (str): The directory the arrays were saved in.
+    Returns:
+        None
+    """
+    countCandidateLabelsInWorker.arrays = {
+        name[:-len('.npy')]: np.load(os.path.join(directory, name), mmap_mode='r')
+        for name in os.listdir(directory)
+    }
+
+
+def countCandidateLabelsInWorker(candidates, rows):
+    """Count the labels of candidates within a training worker process, see
+    ``countCandidateLabels``.
+    """
+    return countCandidateLabels(candidates, countCandidateLabelsInWorker.arrays, rows)
+
+
+def growNode(potentialNodeCriteria, training_set, rows, executor=None, workers=1):
+    """Find the candidate node that splits training data with the least impurity,
+    the first such candidate if several are equally good.
+
+    Args:
+        potentialNodeCriteria (list): The feature and criteria of each candidate node.
+        training_set (TrainingSet): The encoded training data.
+        rows (ndarray): The positions of the training data to split.
+        executor (ProcessPoolExecutor): The training workers candidates are
+            divided between, if any.
+        workers (int): The number of training workers of the executor.
+    Returns:
+        (DecisionTreeNode, ndarray, ndarray): The best node, and the positions
+        of the training data it splits into its true and false branches.
+    """
+    candidates = training_set.encodeCandidates(potentialNodeCriteria)
+
+    if executor is None:
+        true_valid, true_erroneous = countCandidateLabels(candidates, training_set.arrays, rows)
+    else:
+        # Divide the candidates into contiguous chunks, one per worker, and
+        # gather the counts in candidate order
+        size = -(-len(candidates) // workers)
+        chunks = [candidates[i:i + size] for i in range(0, len(candidates), size)]
+        counts = list(executor.map(countCandidateLabelsInWorker, chunks, [rows] * len(chunks)))
+        true_valid = np.concatenate([c[0] for c in counts])
+        true_erroneous = np.concatenate([c[1] for c in counts])
+
+    total_valid, total_erroneous = training_set.counts(rows)
+    impurity = calculateGiniImpurity(true_valid, true_erroneous,
+                                     total_valid - true_valid, total_erroneous - true_erroneous)
+
+    # Split the training data on the best candidate
+    feature, criteria = potentialNodeCriteria[int(np.argmin(impurity))]
+    mask = splitMask(feature, criteria, training_set.columns, rows, training_set.valid)
+    return DecisionTreeNode(feature=feature, criteria=criteria), rows[mask], rows[~mask]
 
 
 def generatePotentialNodeCriteria():
@@ -405,42 +913,159 @@ def generatePotentialNodeCriteria():
     return potentialNodes
 
 
-def compileData():
-    # Get all of the data
-    derivatives = Derivative.query.filter(Derivative.id <= 25000, Derivative.deleted == False).all() # noqa E712
+def iterTrainingData(max_id=25000, chunk_size=5000):
+    """Stream labelled training data from the derivatives in the database.
+
+    Each derivative is valid as it is now. Replaying its updates from the
+    newest back gives each earlier state, which is erroneous in the field
+    the update corrected. Derivatives are read in chunks, and all update
+    actions are read with a single query.
 
+    Args:
+        max_id (int): The largest id of the derivatives to read, None to read all.
+        chunk_size (int): The number of derivatives read at once.
+    Returns:
+        generator: The labelled training items, each derivative followed by its earlier states.
+    """
+    # Gather the update logs of every derivative, newest first
+    query = Action.query.with_entities(Action.derivative_id, Action.update_log)
+    query = query.filter(Action.type == ActionType.UPDATE)
+    if max_id is not None:
+        query = query.filter(Action.derivative_id <= max_id)
+    query = query.order_by(Action.derivative_id, Action.timestamp.desc(), Action.id.desc())
+    updates = {derivative_id: [log for _, log in group]
+               for derivative_id, group in itertools.groupby(query.all(), key=lambda row: row[0])}
+
+    query = db.session.query(*Derivative.__table__.columns)
+    query = query.filter(Derivative.deleted == False).order_by(Derivative.id)  # noqa E712
+    if max_id is not None:
+        query = query.filter(Derivative.id <= max_id)
+    for row in query.yield_per(chunk_size):
+        derivative = row._asdict()
+        yield {
+            'label': Label.VALID,
+            'derivative': derivative
+        }
+
+        # Undo the updates of the derivative one at a time
+        for update_log in updates.get(derivative['id'], ()):
+            derivative = derivative.copy()
+            derivative[update_log['attribute']] = update_log['old_value']
+            yield {
+                'label': Label.ERRONEOUS,
+                'derivative': derivative,
+                'erroneous_field': update_log['attribute'],
+                'correction': update_log['new_value']
+            }
+
+
+def recordTrainingSamples(updates):
+    """Store the erroneous states undone by updates to derivatives as training
+    samples, as replaying the action history of the derivatives would give them.
+
+    States undone by earlier updates are unaffected by later updates, so the
+    samples of previous updates remain valid.
+
+    Args:
+        updates (list): A list of (derivative, update log) pairs, where the
+            derivative has had the updates of the log applied.
+    Returns:
+        None
+    """
+    samples = []
+    for derivative, update_log in updates:
+        # Undo the updates one at a time, from the last applied
+        state = {field: getattr(derivative, field) for field in FEATURE_FIELDS.values()}
+        for log in reversed(update_log):
+            state = state.copy()
+            if log['attribute'] in state:
+                state[log['attribute']] = log['old_value']
+            samples.append(dict(state, derivative_id=derivative.id,
+                                erroneous_field=log['attribute'], correction=log['new_value']))
+
+    db.session.bulk_insert_mappings(TrainingSample, samples)
+
+
+def removeTrainingSamples(derivative_ids):
+    """Remove the training samples of derivatives, such as deleted derivatives.
+
+    Args:
+        derivative_ids (list of int): The ids of the derivatives.
+    Returns:
+        None
+    """
+    query = TrainingSample.query.filter(TrainingSample.derivative_id.in_(derivative_ids))
+    query.delete(synchronize_session=False)
+
+
+def rebuildTrainingSamples(chunk_size=5000):
+    """Replace the training samples with those replayed from the action history.
+
+    Args:
+        chunk_size (int): The number of samples inserted at once.
+    Returns:
+        int: The number of training samples.
+    """
+    TrainingSample.query.delete(synchronize_session=False)
+
+    # Insert the erroneous states of every derivative a chunk at a time
+    samples = (dict({field: item['derivative'][field] for field in FEATURE_FIELDS.values()},
+                    derivative_id=item['derivative']['id'],
+                    erroneous_field=item['erroneous_field'],
+                    correction=item['correction'])
+               for item in iterTrainingData(max_id=None) if item['label'] == Label.ERRONEOUS)
+    count = 0
+    while True:
+        chunk = list(itertools.islice(samples, chunk_size))
+        db.session.bulk_insert_mappings(TrainingSample, chunk)
+        count += len(chunk)
+        if len(chunk) < chunk_size:
+            return count
+
+
+def iterStoredTrainingData(max_id=25000, chunk_size=5000):
+    """Stream labelled training data from the current derivatives and the
+    stored training samples, without replaying the action history.
+
+    Args:
+        max_id (int): The largest id of the derivatives to read.
+        chunk_size (int): The number of rows read at once.
+    Returns:
+        generator: The valid derivatives followed by the erroneous samples.
+    """
+    fields = list(FEATURE_FIELDS.values())
+
+    query = db.session.query(Derivative.id, *[getattr(Derivative, f) for f in fields])
+    query = query.filter(Derivative.id <= max_id, Derivative.deleted == False)  # noqa E712
+    for row in query.order_by(Derivative.id).yield_per(chunk_size):
+        yield {
+            'label': Label.VALID,
+            'derivative': row._asdict()
+        }
+
+    columns = [getattr(TrainingSample, f) for f in fields + ['erroneous_field', 'correction']]
+    query = db.session.query(TrainingSample.derivative_id, *columns)
+    query = query.filter(TrainingSample.derivative_id <= max_id).order_by(TrainingSample.id)
+    for row in query.yield_per(chunk_size):
+        derivative = {f: getattr(row, f) for f in fields}
+        derivative['id'] = row.derivative_id
+        yield {
+            'label': Label.ERRONEOUS,
+            'derivative': derivative,
+            'erroneous_field': row.erroneous_field,
+            'correction': row.correction
+        }
+
+
+def compileData():
     # Calculate the features and label of each derivative
     validData = []
     erroneousData = []
-    for derivative in derivatives:
-        if len(derivative.associated_actions) > 1:
-            history = [derivative.__dict__]
-            history[0].pop('_sa_instance_state')
-            actions = derivative.associated_actions
-            actions.reverse()
-            for actionId in actions:
-                action = Action.query.get(actionId)
-                if action.type == ActionType.UPDATE:
-                    historicalDerivative = history[-1].copy()
-                    historicalDerivative[action.update_log['attribute']] = action.update_log['old_value']
-                    history.append(historicalDerivative)
-                    erroneousData.append({
-                        'label': Label.ERRONEOUS,
-                        'derivative': historicalDerivative,
-                        'erroneous_field': action.update_log['attribute'],
-                        'correction': action.update_log['new_value']
-                    })
-            validData.append({
-                'label': Label.VALID,
-                'derivative': history[0],
-            })
+    for item in iterStoredTrainingData():
+        if item['label'] == Label.VALID:
+            validData.append(item)
         else:
-            derivativeDict = derivative.__dict__
-            derivativeDict.pop('_sa_instance_state')
-            validData.append({
-                'label': Label.VALID,
-                'derivative': derivativeDict
-            })
+            erroneousData.append(item)
 
     # Split data into training and test data
     trainingData = []
@@ -1,17 +1,57 @@
 # Standard library imports
-from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
 import csv
+import itertools
+import multiprocessing
 import os
+import shutil
+import tempfile
 
 # Third party imports
-from sqlalchemy import asc
+from flask import Flask, current_app
+from sqlalchemy import asc, func
+import numpy as np
 
 # Local application imports
 from backend.derivatex_models import ReportHead, Derivative
 from backend.db import db
+from backend.managers import derivative_management
+from backend import utils
 from backend.utils import clamp
 from backend.utils import MyFPDF
 
+# Maximum number of processes generating reports at once
+MAX_REPORT_WORKERS = 4
+
+# Number of derivatives read and valued at once when generating a report
+REPORT_CHUNK_SIZE = 1000
+
+# Derivative fields to include in reports
+REPORT_FIELDS = ['code', 'date_of_trade', 'asset', 'quantity',
+                 'buying_party', 'selling_party', 'notional_value',
+                 'notional_curr_code', 'maturity_date', 'underlying_price',
+                 'underlying_curr_code', 'strike_price']
+
+# Directory of rendered report artifacts, which are kept until evicted
+REPORT_ARTIFACT_DIR = 'res/artifacts'
+
+# Limits of the report artifact cache, in bytes and seconds since last accessed
+MAX_ARTIFACT_CACHE_SIZE = 2 * 1024 ** 3
+MAX_ARTIFACT_AGE = 30 * 24 * 60 * 60
+
+# Report fields that rows can be filtered by, indexed when a report is generated
+REPORT_INDEXED_FIELDS = ['buying_party', 'selling_party', 'asset']
+
+# Types of the numeric report fields within columnar report storage, the
+# remaining fields are stored as UTF-8 encoded text
+REPORT_FIELD_TYPES = {
+    'quantity': np.int64,
+    'notional_value': np.float64,
+    'underlying_price': np.float64,
+    'strike_price': np.float64
+}
+
 
 def indexReports(from_date, to_date, page_size, page_number):
     """ Enumerates a page of reports from a date range filtered subset of
@@ -51,6 +91,42 @@ def indexReports(from_date, to_date, page_size, page_number):
     return reports, page_count
 
 
+def indexReportsByCursor(from_date, to_date, page_size, cursor):
+    """ Enumerates a page of reports after the page identified by a cursor,
+    from a date range filtered subset of all reports in the database.
+
+    Args:
+        from_date (date): The earliest date a returned report can be for.
+        to_date (date): The latest date a returned report can be for.
+        page_size (int): The number of reports that form a page.
+        cursor (str): The cursor of the page, or an empty string for the first page.
+
+    Returns:
+        (tuple): tuple containing:
+            reports (list): The list of reports that make up the page
+            next_cursor (str): The cursor of the next page, None on the last page
+            total_count (int): The approximate number of reports across all pages
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    # Create base query
+    query = ReportHead.query
+
+    # Filter query
+    if from_date is not None:
+        query = query.filter(ReportHead.target_date >= from_date)
+
+    if to_date is not None:
+        query = query.filter(ReportHead.target_date <= to_date)
+
+    # Retrieve the page after the cursor
+    reports, next_cursor = utils.paginateByKeyset(query, ReportHead.target_date, ReportHead.id,
+                                                  page_size, cursor)
+
+    return reports, next_cursor, utils.approximateCount(query)
+
+
 def getReportHead(report_id):
     """ Retrieve the report metadata from the database that has the given ID.
 
@@ -63,76 +139,267 @@ def getReportHead(report_id):
     return ReportHead.query.get(report_id)
 
 
-def getReportData(report_id):
-    """ Retrieve the report contents from the CSV file of the report that has the given ID.
+def validateReportFilters(filters):
+    """ Validate filters of report rows.
+
+    Args:
+        filters (dict): A dictionary mapping report fields to the list of values rows may have.
+
+    Returns:
+        dict: The filters without any empty lists of values.
+
+    Raises:
+        ValueError: If any of the fields can not be filtered by.
+    """
+    filters = {f: values for f, values in (filters or {}).items() if values}
+    if any(f not in REPORT_INDEXED_FIELDS for f in filters):
+        raise ValueError(f'reports can only be filtered by {REPORT_INDEXED_FIELDS}')
+    return filters
+
+
+def findReportRows(columns_path, filters):
+    """ Find the positions of the rows of a report that match the given filters
+    using the indexes within the columnar storage of the report.
+
+    Args:
+        columns_path (str): The path of the columnar storage of the report.
+        filters (dict): A dictionary mapping report fields to the list of values rows may have.
+
+    Returns:
+        ndarray: The positions of the matching rows in ascending order.
+    """
+    positions = None
+    for field, values in filters.items():
+        # Each index holds the values of the field in order alongside their row positions
+        order = np.load(os.path.join(columns_path, f'{field}.order.npy'), mmap_mode='r')
+        ordered_values = np.load(os.path.join(columns_path, f'{field}.sorted.npy'), mmap_mode='r')
+
+        # Binary search the index for the rows holding each value
+        matches = []
+        for value in values:
+            value = str(value).encode()
+            start = np.searchsorted(ordered_values, value, side='left')
+            stop = np.searchsorted(ordered_values, value, side='right')
+            matches.append(order[start:stop])
+        # Repeated values match the same rows, which are only counted once
+        field_positions = np.unique(np.concatenate(matches))
+
+        # Rows must match a value of every field
+        if positions is None:
+            positions = field_positions
+        else:
+            positions = np.intersect1d(positions, field_positions, assume_unique=True)
+
+    return positions
+
+
+def getReportData(report_id, offset=0, limit=None, fields=None, filters=None):
+    """ Retrieve rows of the report that has the given ID. The rows are read from
+    the columnar storage of the report when it exists, so that only the requested
+    rows and fields are read, else they are read from the report CSV file.
 
     Args:
         report_id (int): The ID of the desired report.
+        offset (int): The number of matching rows to skip.
+        limit (int): The maximum number of rows to retrieve, defaults to all rows.
+        fields (list of str): The fields of each row to retrieve, defaults to all fields.
+        filters (dict): A dictionary mapping report fields to the list of values
+            rows may have, defaults to no filters.
 
     Returns:
         Report: A list of dictionaries which represent each derivative in the report
+
+    Raises:
+        ValueError: If any of the fields or filters are not valid.
     """
+    fields = fields or REPORT_FIELDS
+    if any(f not in REPORT_FIELDS for f in fields):
+        raise ValueError(f'report fields must be within {REPORT_FIELDS}')
+
+    filters = validateReportFilters(filters)
+    stop = None if limit is None else offset + limit
+
+    # Read the rows from the columnar storage if the report has it
+    columns_path = f'res/reports/{report_id}.cols'
+    if os.path.isdir(columns_path):
+        # Determine the rows to read, filtering them by the indexes
+        rows = slice(offset, stop)
+        if filters:
+            rows = findReportRows(columns_path, filters)[offset:stop]
+
+        # Memory map the requested columns and read the requested rows
+        columns = {}
+        for field in fields:
+            column = np.load(os.path.join(columns_path, f'{field}.npy'), mmap_mode='r')[rows].tolist()
+            # Present values as they appear in the report CSV
+            columns[field] = [v.decode() if isinstance(v, bytes) else str(v) for v in column]
+
+        return [dict(zip(fields, values)) for values in zip(*(columns[f] for f in fields))]
+
     # Form report CSV path
     path = f'res/reports/{report_id}.csv'
 
     if os.path.isfile(path):
         # Open report file if it exists
         with open(path) as file:
-            # Read report using dictionary reader
-            return list(csv.DictReader(file))
+            # Read report using dictionary reader, up to the last requested row
+            rows = (row for row in csv.DictReader(file)
+                    if all(row[f] in map(str, values) for f, values in filters.items()))
+            return [{f: row[f] for f in fields} for row in itertools.islice(rows, offset, stop)]
 
     # Report does not exist
     return None
 
 
-def createPDF(report_id):
+def countReportData(report_id, filters=None):
+    """ Count the rows of the report that has the given ID.
+
+    Args:
+        report_id (int): The ID of the desired report.
+        filters (dict): A dictionary mapping report fields to the list of values
+            rows may have, defaults to no filters.
+
+    Returns:
+        int: The number of matching rows, None if the report does not exist.
+
+    Raises:
+        ValueError: If any of the filters are not valid.
+    """
+    filters = validateReportFilters(filters)
+
+    # Count the rows using the columnar storage if the report has it
+    columns_path = f'res/reports/{report_id}.cols'
+    if os.path.isdir(columns_path):
+        if filters:
+            return len(findReportRows(columns_path, filters))
+        return len(np.load(os.path.join(columns_path, f'{REPORT_FIELDS[0]}.npy'), mmap_mode='r'))
+
+    # Otherwise count the rows of the report CSV
+    rows = getReportData(report_id, fields=REPORT_INDEXED_FIELDS, filters=filters)
+    return None if rows is None else len(rows)
+
+
+def writeReportColumns(report_id):
+    """ Write the columnar storage of a report from its CSV file. Each field is
+    stored as a NumPy array file that can be memory mapped, so that pages of the
+    report can be read without parsing the whole report.
+
+    Args:
+        report_id (int): The ID of the report.
+
+    Returns:
+        None
+    """
+    csv_path = f'res/reports/{report_id}.csv'
+    columns_path = f'res/reports/{report_id}.cols'
+
+    # Count the rows and measure the widest text value of each field
+    with open(csv_path) as file:
+        reader = csv.reader(file)
+        fields = next(reader)
+        widths = [1] * len(fields)
+        row_count = 0
+        for row in reader:
+            row_count += 1
+            widths = [max(w, len(v.encode())) for w, v in zip(widths, row)]
+
+    # Create the column files in a temporary directory
+    temp_path = f'{columns_path}.tmp'
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    types = [REPORT_FIELD_TYPES.get(f, f'S{w}') for f, w in zip(fields, widths)]
+    columns = [np.lib.format.open_memmap(os.path.join(temp_path, f'{f}.npy'), mode='w+', dtype=t, shape=(row_count,))
+               for f, t in zip(fields, types)]
+
+    # Copy the rows into the columns a chunk at a time
+    with open(csv_path) as file:
+        reader = csv.reader(file)
+        next(reader)
+        for start in range(0, row_count, REPORT_CHUNK_SIZE):
+            chunk = list(itertools.islice(reader, REPORT_CHUNK_SIZE))
+            for field, column, values in zip(fields, columns, zip(*chunk)):
+                if field in REPORT_FIELD_TYPES:
+                    column[start:start + len(chunk)] = np.array(values, dtype=column.dtype)
+                else:
+                    column[start:start + len(chunk)] = [v.encode() for v in values]
+
+    # Flush the columns to disk
+    for column in columns:
+        column.flush()
+    del columns
+
+    # Index the rows of the filterable fields by value
+    for field in REPORT_INDEXED_FIELDS:
+        column = np.load(os.path.join(temp_path, f'{field}.npy'))
+        order = np.argsort(column, kind='stable')
+        np.save(os.path.join(temp_path, f'{field}.order.npy'), order)
+        np.save(os.path.join(temp_path, f'{field}.sorted.npy'), column[order])
+
+    # Move the columns into place
+    shutil.rmtree(columns_path, ignore_errors=True)
+    os.rename(temp_path, columns_path)
+
+
+def iterReportData(report_id, fields=None, chunk_size=REPORT_CHUNK_SIZE):
+    """ Iterate over the rows of the report that has the given ID, reading a
+    chunk of rows at a time.
+
+    Args:
+        report_id (int): The ID of the desired report.
+        fields (list of str): The fields of each row to retrieve, defaults to all fields.
+        chunk_size (int): The number of rows read at once.
+
+    Yields:
+        dict: The next row of the report.
+    """
+    fields = fields or REPORT_FIELDS
+
+    # Read pages of the columnar storage if the report has it
+    if os.path.isdir(f'res/reports/{report_id}.cols'):
+        for offset in itertools.count(0, chunk_size):
+            rows = getReportData(report_id, offset, chunk_size, fields)
+            if not rows:
+                return
+            yield from rows
+
+    # Otherwise stream the rows of the report CSV
+    else:
+        with open(f'res/reports/{report_id}.csv') as file:
+            for row in csv.DictReader(file):
+                yield {f: row[f] for f in fields}
+
+
+def createPDF(report_id, file_path=None):
     """ Create a temporary PDF file containing the data required by the trade repository.
 
     Args:
         report_id (int): The ID of the report which a PDF is required for.
+        file_path (str): The path to write the PDF to, defaults to the temporary directory.
 
     Returns:
         String: A string corresponding to the path to the generated PDF.
     """
-    # Get report derivative rows as list of lists
-    data = getReportData(report_id)
-    date = data[0]['date_of_trade']
-
-    # Creates design for table to be added to PDF
-    header = """
-    <font size="8" face="Courier New" >
-    <table align="center" width="100%">
-    <thead><tr>
-    <th width="6%">Code</th><th width="8%">Trade Date</th>
-    <th width="17%">Asset</th><th width="7%">Quantity</th><th width="7%">Buyer</th>
-    <th width="7%">Seller</th><th width="9%">Notional Val</th><th width="4%">Curr</th>
-    <th width="8%">Maturity</th><th width="9%">Underlying P</th><th width="4%">Curr</th>
-    <th width="8%">Strike P</th>
-    </tr></thead>
-    """
-
-    # Adds every row of data to html which will be used to create table
-    html_out = ''
-    grey = True
-    for derivative in data:
-        html_out += '<tr bgcolor="#E1E1E1"><td>' if grey else '<tr bgcolor="#FFFFFF"><td>'
-        grey = not grey
-        html_out += derivative['code']
-        html_out += ('</td><td>' + derivative['date_of_trade'])
-        html_out += ('</td><td>' + derivative['asset'])
-        html_out += ('</td><td>' + derivative['quantity'])
-        html_out += ('</td><td>' + derivative['buying_party'])
-        html_out += ('</td><td>' + derivative['selling_party'])
-        html_out += ('</td><td>' + "{:.2f}".format(float(derivative['notional_value'])))
-        html_out += ('</td><td>' + derivative['notional_curr_code'])
-        html_out += ('</td><td>' + derivative['maturity_date'])
-        html_out += ('</td><td>' + derivative['underlying_price'])
-        html_out += ('</td><td>' + derivative['underlying_curr_code'])
-        html_out += ('</td><td>' + "{:.2f}".format(float(derivative['strike_price'])))
-        html_out += '</td></tr>\n'
-
-    # Create final html that represents table
-    html = header + html_out + '</tbody></table>'
+    date = getReportHead(report_id).target_date
+
+    # Columns of the table and the fraction of the page width they take up
+    headers = ['Code', 'Trade Date', 'Asset', 'Quantity', 'Buyer', 'Seller', 'Notional Val',
+               'Curr', 'Maturity', 'Underlying P', 'Curr', 'Strike P']
+    widths = [0.06, 0.08, 0.17, 0.07, 0.07, 0.07, 0.09, 0.04, 0.08, 0.09, 0.04, 0.08]
+
+    # Format the text of each cell of the table as the rows are drawn
+    def formatRow(derivative):
+        return [derivative['code'],
+                derivative['date_of_trade'],
+                derivative['asset'],
+                derivative['quantity'],
+                derivative['buying_party'],
+                derivative['selling_party'],
+                "{:.2f}".format(float(derivative['notional_value'])),
+                derivative['notional_curr_code'],
+                derivative['maturity_date'],
+                derivative['underlying_price'],
+                derivative['underlying_curr_code'],
+                "{:.2f}".format(float(derivative['strike_price']))]
 
     # Create PDF
     pdf = MyFPDF('P', 'mm', 'letter')
@@ -142,9 +409,12 @@ def createPDF(report_id):
     pdf.alias_nb_pages()
     pdf.set_font('Arial', style='B', size=14)
     pdf.cell(200, 5, txt=f'Derivative Report {date}', ln=1, align='C')
-    pdf.write_html(html)
 
-    file_path = f'res/temp/{report_id}.pdf'
+    # Draw the report rows as a table
+    pdf.set_font('Courier', size=6)
+    pdf.table(headers, widths, map(formatRow, iterReportData(report_id)))
+
+    file_path = file_path or f'res/temp/{report_id}.pdf'
 
     pdf.output(file_path)
 
@@ -152,6 +422,81 @@ def createPDF(report_id):
     return os.path.realpath(file_path)
 
 
+def getReportPDF(report_id):
+    """ Retrieve the path of the PDF of the report that has the given ID,
+    rendering it into the artifact cache the first time it is requested.
+    Reports never change once created, so the PDF is reused until evicted.
+
+    Args:
+        report_id (int): The ID of the report which a PDF is required for.
+
+    Returns:
+        String: A string corresponding to the path to the PDF.
+    """
+    report = getReportHead(report_id)
+    path = os.path.realpath(os.path.join(REPORT_ARTIFACT_DIR, f'{report.id}-v{report.version}.pdf'))
+
+    if os.path.isfile(path):
+        # Record the access, leaving the modification time the ETag is formed from
+        os.utime(path, (datetime.now().timestamp(), os.path.getmtime(path)))
+        return path
+
+    # Render the PDF to a unique temporary file and move it into place, so a
+    # PDF is never served while it is partially written
+    os.makedirs(REPORT_ARTIFACT_DIR, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(suffix='.pdf.tmp', dir=REPORT_ARTIFACT_DIR)
+    os.close(descriptor)
+    try:
+        createPDF(report.id, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    # Keep the cache within its limits
+    evictReportArtifacts(keep=path)
+
+    return path
+
+
+def evictReportArtifacts(max_size=MAX_ARTIFACT_CACHE_SIZE, max_age=MAX_ARTIFACT_AGE, keep=None):
+    """ Remove report artifacts that have not been accessed within the maximum
+    age, then the least recently accessed artifacts until the cache fits within
+    the maximum size.
+
+    Args:
+        max_size (int): The maximum total size of the artifacts in bytes.
+        max_age (int): The maximum number of seconds since an artifact was accessed.
+        keep (str): The path of an artifact that must not be removed.
+
+    Returns:
+        list of str: The paths of the removed artifacts.
+    """
+    if not os.path.isdir(REPORT_ARTIFACT_DIR):
+        return []
+
+    # Gather the artifacts, most recently accessed first
+    artifacts = []
+    for entry in os.scandir(REPORT_ARTIFACT_DIR):
+        if entry.is_file() and entry.name.endswith('.pdf'):
+            stat = entry.stat()
+            artifacts.append((stat.st_atime, stat.st_size, os.path.realpath(entry.path)))
+    artifacts.sort(reverse=True)
+
+    # Keep recent artifacts while they fit within the maximum size
+    removed = []
+    total_size = 0
+    now = datetime.now().timestamp()
+    for accessed, size, path in artifacts:
+        total_size += size
+        if path != keep and (now - accessed > max_age or total_size > max_size):
+            os.remove(path)
+            removed.append(path)
+            total_size -= size
+
+    return removed
+
+
 def getPendingReportDates():
     """ Creates a list containing all dates that contain unreported derivatives.
 
@@ -169,76 +514,331 @@ def getPendingReportDates():
     return [d[0] for d in query.all()]
 
 
-def generateAllReports():
-    """ Create a new report for each date that contains unreported derivatives
+def getNextReportVersions(target_dates):
+    """ Determine the version number of the next report for each of the given dates.
+
+    Args:
+        target_dates (list of date): The dates reports are required for.
+
+    Returns:
+        dict: A dictionary mapping each date to the version of its next report.
+    """
+    # Query the latest report version of each date at once
+    query = ReportHead.query.filter(ReportHead.target_date.in_(target_dates))
+    query = query.with_entities(ReportHead.target_date, func.max(ReportHead.version))
+    latest_versions = dict(query.group_by(ReportHead.target_date).all())
+
+    return {d: latest_versions.get(d, 0) + 1 for d in target_dates}
+
+
+def initReportWorker(config):
+    """ Bind the database within a report worker process through an app of its own.
 
     Args:
+        config (dict): The configuration of the app that started the worker.
+
+    Returns:
         None
+    """
+    # Create an app for the worker with its own engines and sessions
+    app = Flask(__name__)
+    app.config.update(config)
+    db.init_app(app)
+    app.app_context().push()
+
+
+def generateReportInWorker(target_date, version, delta=False):
+    """ Create a new report within a report worker process, releasing the
+    worker's session afterwards.
+
+    Args:
+        target_date (date): The date for which a new report is required
+        version (int): The version of the new report
+        delta (bool): Whether to patch the previous report for the date
+
+    Returns:
+        id: The id of the newly generated report for the requested date
+    """
+    try:
+        if delta:
+            return generateDeltaReport(target_date, version)
+        return generateReport(target_date, version)
+    finally:
+        db.session.remove()
+
+
+def generateAllReports(max_workers=MAX_REPORT_WORKERS, delta=False, on_progress=None):
+    """ Create a new report for each date that contains unreported derivatives,
+    generating reports for many dates at once in a pool of worker processes.
+
+    Args:
+        max_workers (int): The maximum number of worker processes.
+        delta (bool): Whether to patch the previous report of each date.
+        on_progress (callable): Called with the number of reports generated so far
+            and the number of reports to generate as each report is generated.
 
     Returns:
         report_ids: A list containing the ids of all the newly generated reports
     """
     target_dates = getPendingReportDates()
+
+    # Reserve the version of each report before any are generated
+    versions = getNextReportVersions(target_dates)
+
+    # Report progress as each report is generated
     report_ids = []
 
-    # Generate a report for each of the target_dates
-    for target_date in target_dates:
-        id = generateReport(target_date)
-        report_ids.append(id)
+    def record(report_id):
+        report_ids.append(report_id)
+        if on_progress is not None:
+            on_progress(len(report_ids), len(target_dates))
+
+    # Generate a small number of reports within the current process
+    workers = min(max_workers, len(target_dates))
+    if workers <= 1:
+        generate = generateDeltaReport if delta else generateReport
+        for target_date in target_dates:
+            record(generate(target_date, versions[target_date]))
+        return report_ids
+
+    # End the current transaction so the workers are not blocked by it
+    db.session.commit()
+
+    # Generate a report for each of the target dates in the worker pool, the
+    # workers are spawned as forking would copy the locks held by other threads
+    config = dict(current_app.config)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=initReportWorker,
+                             initargs=(config,)) as executor:
+        for report_id in executor.map(generateReportInWorker, target_dates, [versions[d] for d in target_dates],
+                                      [delta] * len(target_dates)):
+            record(report_id)
 
     return report_ids
 
 
-def generateReport(target_date):
-    """ Create a new report for the specified date
+def iterReportRows(target_date, chunk_size=REPORT_CHUNK_SIZE, unreported_only=False):
+    """ Yield the report rows of the non-deleted derivatives traded on a date,
+    reading and valuing the derivatives a chunk at a time so that memory use is
+    bounded however many derivatives were traded.
+
+    Args:
+        target_date (date): The date the derivatives were traded on.
+        chunk_size (int): The number of derivatives read and valued at once.
+        unreported_only (bool): Whether to only read the derivatives flagged as unreported.
+
+    Yields:
+        list of dict: The report rows of the next chunk of derivatives, each
+        keyed by the report fields and the derivative id.
+    """
+    # Only read the columns included in the report
+    columns = [f for f in REPORT_FIELDS if f in Derivative.__table__.columns]
+    query = Derivative.query.filter_by(date_of_trade=target_date, deleted=False)
+    query = query.with_entities(Derivative.id, *[getattr(Derivative, c) for c in columns])
+
+    if unreported_only:
+        query = query.filter_by(reported=False)
+
+    last_id = None
+    while True:
+        # Seek past the previous chunk rather than offsetting into the day
+        chunk_query = query if last_id is None else query.filter(Derivative.id > last_id)
+        rows = chunk_query.order_by(Derivative.id).limit(chunk_size).all()
+        if not rows:
+            return
+
+        # Value the chunk at once and form its report rows
+        valuations = derivative_management.valueDerivatives(rows)
+        yield [dict(id=row.id, **{c: getattr(row, c) for c in columns}, **valuations[row.id]) for row in rows]
+
+        last_id = rows[-1].id
+
+
+def generateReport(target_date, version=None):
+    """ Create a new report for the specified date, streaming the derivatives
+    traded on the date into the report CSV a chunk at a time.
 
     Args:
         target_date (date): The date for which a new report is required
+        version (int): The version of the new report, defaults to one after the latest report
 
     Returns:
         id: The id of the newly generated report for the requested date
     """
-    # Get all none-deleted erivatives traded on the target_date
-    derivatives = Derivative.query.filter_by(date_of_trade=target_date,
-                                             deleted=False).all()
+    # Read the first chunk of none-deleted derivatives traded on the target_date
+    chunks = iterReportRows(target_date)
+    first_chunk = next(chunks, None)
     # Return if there are no derivatives to report
-    if not derivatives:
+    if first_chunk is None:
         return None
 
-    # Get all the existing reports for the given target_date
-    reports = ReportHead.query.filter_by(target_date=target_date).all()
-
-    # Obtain latest report version number or default to 0
-    version = max([report.version for report in reports], default=0)
+    # Obtain the next report version number unless one was reserved
+    if version is None:
+        query = ReportHead.query.filter_by(target_date=target_date)
+        version = (query.with_entities(func.max(ReportHead.version)).scalar() or 0) + 1
 
-    # Create new report metadata object
+    # Create new report metadata object, the derivatives are counted as they are written
     report = ReportHead(target_date=target_date,
                         creation_date=date.today(),
-                        version=version + 1,
-                        derivative_count=len(derivatives))
+                        version=version,
+                        derivative_count=0)
 
     # Add report to database session
     db.session.add(report)
     db.session.flush()
 
-    # Make CSV and open for writing
-    with open(f'res/reports/{report.id}.csv', 'w') as file:
-        # Derivative fields to include in report
-        fieldnames = ['code', 'date_of_trade', 'asset', 'quantity',
-                      'buying_party', 'selling_party', 'notional_value',
-                      'notional_curr_code', 'maturity_date', 'underlying_price',
-                      'underlying_curr_code', 'strike_price']
-
+    # Make CSV, and the file of the derivative ids of its rows, and open for writing
+    with open(f'res/reports/{report.id}.csv', 'w') as file, open(f'res/reports/{report.id}.ids', 'w') as ids_file:
         # Create CSV writer
-        writer = csv.DictWriter(file, fieldnames, extrasaction='ignore')
+        writer = csv.DictWriter(file, REPORT_FIELDS, extrasaction='ignore')
 
         # Write fieldname header to the report
         writer.writeheader()
 
-        # Append the values of each derivative to the report
-        for d in derivatives:
-            data = {a: getattr(d, a) for a in vars(d.__class__) if a in fieldnames}
-            writer.writerow(data)
+        # Append the rows of each chunk to the report as they are read
+        for rows in itertools.chain([first_chunk], chunks):
+            writer.writerows(rows)
+            ids_file.writelines(f'{row["id"]}\n' for row in rows)
+            report.derivative_count += len(rows)
+
+    # Store the report in columns for random access
+    writeReportColumns(report.id)
+
+    # Mark all derivatives on the target date as reported
+    Derivative.query.filter_by(date_of_trade=target_date).update(dict(reported=True))
+
+    # Commit the session to the database
+    db.session.commit()
+
+    # Return the id of the report
+    return report.id
+
+
+def getChangedDerivativeIds(target_date, previous_id, chunk_size=REPORT_CHUNK_SIZE):
+    """ Retrieve the ids of the derivatives whose rows in the previous report
+    for a date are out of date. Derivatives are flagged as unreported when they
+    are added, updated or deleted, which unlike the timestamps of their actions
+    is never backdated.
+
+    Args:
+        target_date (date): The date of the reports.
+        previous_id (int): The id of the previous report for the date.
+        chunk_size (int): The number of previously reported derivatives checked at once.
+
+    Returns:
+        set: The ids of the unreported derivatives traded on the date, and of the
+        previously reported derivatives that are no longer traded on the date.
+    """
+    # Find the derivatives changed since they were last reported
+    query = Derivative.query.filter_by(date_of_trade=target_date, reported=False)
+    changed_ids = {derivative_id for derivative_id, in query.with_entities(Derivative.id).all()}
+
+    # Find the previously reported derivatives that have been moved to another date
+    with open(f'res/reports/{previous_id}.ids') as ids_file:
+        previous_ids = (int(line) for line in ids_file)
+        while True:
+            chunk = set(itertools.islice(previous_ids, chunk_size))
+            if not chunk:
+                return changed_ids
+
+            query = Derivative.query.filter(Derivative.id.in_(chunk), Derivative.date_of_trade == target_date)
+            changed_ids |= chunk - {derivative_id for derivative_id, in query.with_entities(Derivative.id).all()}
+
+
+def patchReportFiles(previous_id, report_id, changed_ids, rows):
+    """ Write the files of a report by copying the rows of a previous report,
+    replacing the rows of changed derivatives with their current rows.
+
+    Args:
+        previous_id (int): The id of the report being patched.
+        report_id (int): The id of the new report.
+        changed_ids (set): The ids of the derivatives whose rows are replaced.
+        rows (iterable of dict): The current report rows of the changed derivatives
+            that are still reported, in derivative id order.
+
+    Returns:
+        int: The number of derivatives in the new report.
+    """
+    with open(f'res/reports/{previous_id}.csv') as previous_file, \
+            open(f'res/reports/{previous_id}.ids') as previous_ids_file, \
+            open(f'res/reports/{report_id}.csv', 'w') as file, \
+            open(f'res/reports/{report_id}.ids', 'w') as ids_file:
+        # Copy the fieldname header to the report
+        reader = csv.reader(previous_file)
+        writer = csv.writer(file)
+        writer.writerow(next(reader))
+
+        derivative_count = 0
+        rows = iter(rows)
+        row = next(rows, None)
+
+        # Merge the current rows into the previous rows in derivative id order
+        for fields, line in zip(reader, previous_ids_file):
+            derivative_id = int(line)
+            while row is not None and row['id'] < derivative_id:
+                writer.writerow([row[f] for f in REPORT_FIELDS])
+                ids_file.write(f'{row["id"]}\n')
+                derivative_count += 1
+                row = next(rows, None)
+
+            # Previous rows of changed derivatives are dropped
+            if derivative_id not in changed_ids:
+                writer.writerow(fields)
+                ids_file.write(line)
+                derivative_count += 1
+
+        # Append the current rows after the last previous row
+        while row is not None:
+            writer.writerow([row[f] for f in REPORT_FIELDS])
+            ids_file.write(f'{row["id"]}\n')
+            derivative_count += 1
+            row = next(rows, None)
+
+    return derivative_count
+
+
+def generateDeltaReport(target_date, version=None):
+    """ Create a new report for the specified date by patching the latest
+    report for the date, so that only the derivatives changed since it was
+    created are read and valued again. The rows of all other derivatives keep
+    the values of the previous report.
+
+    Falls back to generating the report in full when there is no previous
+    report to patch.
+
+    Args:
+        target_date (date): The date for which a new report is required
+        version (int): The version of the new report, defaults to one after the latest report
+
+    Returns:
+        id: The id of the newly generated report for the requested date
+    """
+    # Retrieve the latest report for the target date
+    previous = ReportHead.query.filter_by(target_date=target_date).order_by(ReportHead.version.desc()).first()
+
+    # Reports without derivative ids can not be patched
+    if previous is None or not os.path.isfile(f'res/reports/{previous.id}.ids'):
+        return generateReport(target_date, version)
+
+    # Determine the derivatives changed since the previous report was created
+    changed_ids = getChangedDerivativeIds(target_date, previous.id)
+
+    # Create new report metadata object
+    report = ReportHead(target_date=target_date,
+                        creation_date=date.today(),
+                        version=version or previous.version + 1,
+                        derivative_count=0)
+
+    # Add report to database session
+    db.session.add(report)
+    db.session.flush()
+
+    # Patch the previous report with the current rows of the changed derivatives
+    rows = itertools.chain.from_iterable(iterReportRows(target_date, unreported_only=True))
+    report.derivative_count = patchReportFiles(previous.id, report.id, changed_ids, rows)
+
+    # Store the report in columns for random access
+    writeReportColumns(report.id)
 
     # Mark all derivatives on the target date as reported
     Derivative.query.filter_by(date_of_trade=target_date).update(dict(reported=True))
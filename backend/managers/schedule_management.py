@@ -0,0 +1,136 @@
+# Standard library imports
+from datetime import datetime, timedelta
+import functools
+import logging
+import os
+import socket
+
+# Third party imports
+from sqlalchemy.exc import IntegrityError
+
+# Local application imports
+from backend.derivatex_models import SchedulerLease
+from backend.db import db
+
+# Name of the lease held by the process that runs scheduled jobs
+LEADER_LEASE_NAME = 'scheduler'
+
+# Number of seconds between renewals of the lease by each process
+LEADER_RENEW_INTERVAL = 30
+
+# Time for which the leader holds the lease without renewing it, long enough
+# to survive a late renewal but short enough for a new leader to take over quickly
+LEADER_LEASE_DURATION = timedelta(seconds=LEADER_RENEW_INTERVAL * 5 // 2)
+
+logger = logging.getLogger(__name__)
+
+
+def getHolderId():
+    """ Identify the calling process amongst the processes of every host.
+
+    Returns:
+        str: The host name and process id of the calling process.
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def acquireLeadership(name=LEADER_LEASE_NAME, holder=None, duration=LEADER_LEASE_DURATION):
+    """ Acquire or renew a lease, making the holder the leader until it expires.
+    The lease row is locked while it is inspected, so at most one holder
+    acquires an expired lease.
+
+    Args:
+        name (str): The name of the lease.
+        holder (str): The identifier of the acquiring process, the calling process by default.
+        duration (timedelta): The time for which the lease is held.
+
+    Returns:
+        bool: True if the holder is the leader, False if another holder has the lease.
+    """
+    holder = holder or getHolderId()
+    now = datetime.now()
+
+    lease = SchedulerLease.query.filter_by(name=name).with_for_update().first()
+
+    if lease is None:
+        # Create the lease, another holder may create it at the same time
+        db.session.add(SchedulerLease(name=name, holder=holder, expires=now + duration))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        return True
+
+    # Leave leases held by other holders until they expire
+    if lease.holder != holder and lease.expires > now:
+        db.session.commit()
+        return False
+
+    # Take or renew the lease
+    lease.holder = holder
+    lease.expires = now + duration
+    db.session.commit()
+
+    return True
+
+
+def releaseLeadership(name=LEADER_LEASE_NAME, holder=None):
+    """ Release a lease so that another holder can acquire it immediately.
+
+    Args:
+        name (str): The name of the lease.
+        holder (str): The identifier of the releasing process, the calling process by default.
+
+    Returns:
+        bool: True if the lease was held by the holder, False otherwise.
+    """
+    holder = holder or getHolderId()
+    query = SchedulerLease.query.filter_by(name=name, holder=holder)
+    released = query.update(dict(expires=datetime.now()), synchronize_session=False)
+    db.session.commit()
+
+    return released > 0
+
+
+def leaderOnly(app, func, name=LEADER_LEASE_NAME, on_takeover=None):
+    """ Wrap a scheduled job so that it only runs in the process holding the
+    lease, when every process of a deployment schedules the same jobs.
+
+    Args:
+        app (Flask): The app the job binds the database through.
+        func (function): The job to run.
+        name (str): The name of the lease.
+        on_takeover (function): Called when the process becomes the leader, to
+            catch up on jobs the previous leader may have missed.
+
+    Returns:
+        function: The wrapped job.
+    """
+    leading = False
+
+    @functools.wraps(func)
+    def job():
+        nonlocal leading
+
+        with app.app_context():
+            try:
+                leader = acquireLeadership(name)
+            except Exception:  # pylint: disable=W0703
+                logger.exception('failed to acquire the %s lease', name)
+                leader = False
+            finally:
+                db.session.remove()
+
+        # Catch up once each time the process takes over the lease
+        took_over = leader and not leading
+        leading = leader
+        if took_over and on_takeover is not None:
+            on_takeover()
+
+        # Skip the job in every process other than the leader
+        if leader:
+            return func()
+        return None
+
+    return job
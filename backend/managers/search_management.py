@@ -0,0 +1,129 @@
+# Local application imports
+from backend.derivatex_models import Derivative, SearchGram, SearchTermType
+from backend.managers import external_management
+from backend.db import db
+
+# Length of the grams that texts are indexed by
+GRAM_LENGTH = 3
+
+
+def gramsOf(text, padded=True):
+    """ Split a text into its grams.
+
+    Indexed texts are padded so that every character starts a gram, which
+    lets search terms shorter than a gram be matched by gram prefix.
+
+    Args:
+        text (str): The text to be split.
+        padded (bool): Whether to pad the end of the text.
+
+    Returns:
+        set: The distinct grams of the upper case text.
+    """
+    text = text.upper()
+    if padded:
+        text += ' ' * (GRAM_LENGTH - 1)
+    return {text[i:i + GRAM_LENGTH] for i in range(len(text) - GRAM_LENGTH + 1)}
+
+
+def indexSearchTerms(term_type, terms):
+    """ Add search terms to the search index, skipping any already indexed.
+
+    Args:
+        term_type (SearchTermType): The type of the search terms.
+        terms (list): A list of (term, text) pairs, where the term is the value
+            derivatives are filtered by and the text is what it is found by.
+
+    Returns:
+        None
+    """
+    # Remove duplicate terms
+    terms = {(term, text.upper()) for term, text in terms if term and text}
+    if not terms:
+        return
+
+    # Determine which of the terms are already indexed
+    query = SearchGram.query.filter(SearchGram.term_type == term_type,
+                                    SearchGram.term.in_({term for term, _ in terms}))
+    query = query.with_entities(SearchGram.term, SearchGram.text).distinct()
+    terms -= set(query.all())
+
+    # Insert the grams of the new terms in bulk
+    mappings = [dict(gram=gram, term_type=term_type, term=term, text=text)
+                for term, text in terms for gram in gramsOf(text)]
+    db.session.bulk_insert_mappings(SearchGram, mappings)
+
+
+def updateSearchIndex():
+    """ Add the assets and companies missing from the search index, so that
+    products and companies added to the external database become searchable.
+
+    Returns:
+        None
+    """
+    # Index all asset names, skipping those already indexed
+    assets = external_management.indexAssets()
+    indexSearchTerms(SearchTermType.ASSET, [(asset, asset) for asset in assets])
+
+    # Index all companies by both their id and name, skipping those already indexed
+    companies = external_management.indexCompanies()
+    indexSearchTerms(SearchTermType.COMPANY, [(c.id, c.id) for c in companies] + [(c.id, c.name) for c in companies])
+
+    db.session.commit()
+
+
+def rebuildSearchIndex():
+    """ Rebuild the search index from the derivative codes, assets and companies.
+
+    Returns:
+        None
+    """
+    # Clear the existing search index
+    SearchGram.query.delete()
+
+    # Index all distinct derivative codes
+    codes = Derivative.query.with_entities(Derivative.code).distinct().all()
+    indexSearchTerms(SearchTermType.CODE, [(code, code) for code, in codes])
+
+    # Index all assets and companies, committing the rebuilt index
+    updateSearchIndex()
+
+
+def searchTermsQuery(search_term, term_type):
+    """ Form a query for the indexed terms of a type whose text contains the
+    search term, which can be used as a subquery so that the matching terms
+    are never loaded.
+
+    Args:
+        search_term (str): The search term.
+        term_type (SearchTermType): The type of the terms.
+
+    Returns:
+        Query: The query for the distinct matching terms.
+    """
+    search_term = search_term.upper()
+
+    if len(search_term) >= GRAM_LENGTH:
+        # Every text that contains the search term contains each of its grams
+        gram_condition = SearchGram.gram == min(gramsOf(search_term, padded=False))
+    else:
+        # Short search terms are found by the prefixes of the grams
+        gram_condition = SearchGram.gram.startswith(search_term, autoescape=True)
+
+    query = SearchGram.query.with_entities(SearchGram.term)
+    query = query.filter(SearchGram.term_type == term_type, gram_condition,
+                         SearchGram.text.contains(search_term, autoescape=True))
+    return query.distinct()
+
+
+def searchTerms(search_term):
+    """ Find all indexed terms whose text contains the search term.
+
+    Args:
+        search_term (str): The search term.
+
+    Returns:
+        dict: A dictionary mapping each search term type to the set of matching terms.
+    """
+    return {term_type: {term for term, in searchTermsQuery(search_term, term_type).all()}
+            for term_type in SearchTermType}
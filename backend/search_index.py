@@ -0,0 +1,27 @@
+# Standard library imports
+import argparse
+
+# Local application imports
+from backend.app import Application
+from backend.managers import search_management
+
+
+def main(argv=None):
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Build the search index of the derivatex database.')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='clear the index and index every derivative code, asset and company')
+    args = parser.parse_args(argv)
+
+    # Setup app to bind the database
+    Application.getCliApp()
+
+    # Build the search index
+    if args.rebuild:
+        search_management.rebuildSearchIndex()
+    else:
+        search_management.updateSearchIndex()
+
+
+if __name__ == '__main__':
+    main()
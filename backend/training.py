@@ -0,0 +1,28 @@
+# Standard library imports
+import argparse
+
+# Local application imports
+from backend.app import Application
+from backend.db import db
+from backend.managers import learned_behaviour_management
+
+
+def main(argv=None):
+    # Parse command line arguments
+    parser = argparse.ArgumentParser(description='Rebuild the training samples of the decision trees.')
+    parser.add_argument('--chunk-size', type=int, default=5000,
+                        help='number of training samples inserted at once')
+    args = parser.parse_args(argv)
+
+    # Setup app to bind the database
+    Application.getCliApp()
+
+    # Replay the action history into the training samples
+    count = learned_behaviour_management.rebuildTrainingSamples(args.chunk_size)
+    db.session.commit()
+
+    print(f'rebuilt {count} training samples')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
 # Standard library imports
+import base64
+import binascii
+import json
 import locale
+import numbers
+import time
 from datetime import datetime, date
 
 # Third party imports
+from sqlalchemy import and_, asc, desc, or_
 from sqlalchemy.ext.declarative import DeclarativeMeta
 from flask.json import JSONEncoder
 from fpdf import FPDF, HTMLMixin
@@ -12,30 +18,191 @@ class AbsoluteDerivativeException(Exception):
     """Exception raised when a absolute derivative is modified"""
 
 
+# Serializer for the instances of a SQLAlchemy model
+class ModelSerializer:
+    def __init__(self, model):
+        # Compile the attribute lists of the model once
+        expensive = set(getattr(model, '__expensive_properties__', ()))
+        properties = [n for n, v in vars(model).items() if isinstance(v, property)]
+        self.columns = [c.name for c in model.__table__.columns]
+        self.properties = [p for p in properties if p not in expensive]
+        # Models may derive properties for many instances at once
+        self.prefetch = getattr(model, 'prefetchProperties', None)
+
+    def serialize(self, o, prefetched=None):
+        prefetched = prefetched or {}
+        # Gather column values and any property values that were not prefetched
+        data = {column: getattr(o, column) for column in self.columns}
+        data.update({p: getattr(o, p) for p in self.properties if p not in prefetched})
+        # Expensive properties are only serialized when prefetched
+        data.update(prefetched)
+        return data
+
+
+def getSerializer(model):
+    if not hasattr(getSerializer, 'serializers'):
+        getSerializer.serializers = {}
+
+    if model not in getSerializer.serializers:
+        getSerializer.serializers[model] = ModelSerializer(model)
+
+    return getSerializer.serializers[model]
+
+
+def prefetchModelProperties(o):
+    """ Prefetch the derived properties of all model instances within a
+    JSON serializable object, one bulk prefetch per model.
+
+    Args:
+        o (object): The object to be serialized.
+
+    Returns:
+        dict: A dictionary mapping the id of each instance to a tuple of the
+        instance and its prefetched property values.
+    """
+    # Gather the model instances contained in the object by model
+    instances = {}
+    stack = [o]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif isinstance(item.__class__, DeclarativeMeta):
+            instances.setdefault(item.__class__, {})[id(item)] = item
+
+    # Prefetch the properties of the instances of each model in bulk
+    prefetched = {}
+    for model, model_instances in instances.items():
+        prefetch = getSerializer(model).prefetch
+        if prefetch is not None:
+            # Instances are held alongside their properties to keep them alive
+            for instance, properties in prefetch(list(model_instances.values())).items():
+                prefetched[id(instance)] = (instance, properties)
+
+    return prefetched
+
+
 # Custom JSON encoder for SQLAlchemy Models and dates
 class MyJSONEncoder(JSONEncoder):
+    def iterencode(self, o, _one_shot=False):
+        # Prefetch model properties before encoding the object
+        self.prefetched = prefetchModelProperties(o)
+        return super(MyJSONEncoder, self).iterencode(o, _one_shot)
+
     def default(self, o):  # pylint: disable=E0202
         if isinstance(o, date):
             return o.isoformat()
         if isinstance(o.__class__, DeclarativeMeta):
-            # Gather object attributes
-            columns = [c.name for c in o.__table__.columns]
-            properties = [n for n, v in vars(o.__class__).items() if isinstance(v, property)]
-            attributes = columns + properties
             # Return a dictionary of attribute-value pairs
-            return {attribute: getattr(o, attribute) for attribute in attributes}
+            _, prefetched = getattr(self, 'prefetched', {}).get(id(o), (o, None))
+            return getSerializer(o.__class__).serialize(o, prefetched)
 
         return super(MyJSONEncoder, self).default(o)
 
 
+# String buffer that is appended to in constant time, as fpdf appends each
+# object of the document to a single string
+class StringBuilder:
+    def __init__(self, text=''):
+        self.parts = [text]
+        self.length = len(text)
+
+    def __iadd__(self, text):
+        self.parts.append(text)
+        self.length += len(text)
+        return self
+
+    def __len__(self):
+        return self.length
+
+    def __str__(self):
+        return ''.join(self.parts)
+
+
 # Add html functionality to fpdf pdf maker and set footer
 class MyFPDF(FPDF, HTMLMixin):
+    def close(self):
+        if self.state == 3:
+            return
+        # Build the document in a string builder, then restore the string fpdf expects
+        self.buffer = StringBuilder(self.buffer)
+        super(MyFPDF, self).close()
+        self.buffer = str(self.buffer)
+
     def footer(self):
         self.set_y(-25)
         self.set_font('Arial', 'I', 10)
         self.set_text_color(0, 0, 0)
         self.cell(0, 10, 'PAGE %s OF {nb}' % self.page_no(), 0, 0, 'C')
 
+    def table(self, headers, widths, rows, height=4, fill_color=(225, 225, 225)):
+        """ Draw a table of text cells directly, without parsing HTML, starting a
+        new page and repeating the header whenever a row does not fit the page.
+
+        The rows of each page are written to the page in one go, so drawing
+        large tables costs little more than formatting their text.
+        Only the core fonts are supported.
+
+        Args:
+            headers (list of str): The title of each column.
+            widths (list of float): The fraction of the page width of each column.
+            rows (iterable of list): The text of each cell of each row, which is
+                only iterated as the rows are drawn.
+            height (float): The height of each row.
+            fill_color (tuple): The RGB color of the background of alternate rows.
+
+        Returns:
+            None
+        """
+        # Size the columns to the page and determine the characters each can hold
+        page_width = self.w - self.l_margin - self.r_margin
+        widths = [page_width * w for w in widths]
+        char_width = self.get_string_width('W') or 1
+        max_chars = [max(int((w - 2 * self.c_margin) / char_width), 1) for w in widths]
+
+        # Horizontal offsets of the text of each column in user space units
+        k = self.k
+        offsets = [(self.l_margin + sum(widths[:i]) + self.c_margin) * k for i in range(len(widths))]
+
+        def drawHeader():
+            style = self.font_style
+            self.set_font(self.font_family, 'B', self.font_size_pt)
+            for header, width in zip(headers, widths):
+                self.cell(width, height, header, 0, 0, 'L')
+            self.ln(height)
+            self.set_font(self.font_family, style, self.font_size_pt)
+
+        # Row backgrounds are filled within their own graphics state to keep the text color
+        fill = '%.3f %.3f %.3f rg' % tuple(c / 255 for c in fill_color)
+
+        drawHeader()
+        operations = [self.text_color]
+        for i, row in enumerate(rows):
+            # Start a new page before any row that would overflow the page
+            if self.y + height > self.page_break_trigger:
+                self._out(' '.join(operations))
+                operations = [self.text_color]
+                self.add_page()
+                drawHeader()
+
+            # Fill the background of alternate rows with a single rectangle
+            if i % 2 == 0:
+                operations.append('q %s %.2f %.2f %.2f %.2f re f Q' % (fill, self.l_margin * k, (self.h - self.y) * k,
+                                                                       page_width * k, -height * k))
+
+            # Draw the text of each cell, clipping text that would overflow its column
+            baseline = (self.h - (self.y + 0.5 * height + 0.3 * self.font_size)) * k
+            for text, offset, chars in zip(row, offsets, max_chars):
+                if text:
+                    operations.append('BT %.2f %.2f Td (%s) Tj ET' % (offset, baseline, self._escape(text[:chars])))
+
+            self.ln(height)
+
+        # Write the rows of the last page
+        self._out(' '.join(operations))
+
 
 def getCurrencySymbol(code, default='?'):
     if not hasattr(getCurrencySymbol, "lookup"):
@@ -67,3 +234,192 @@ def to_date(date_string):
 
 def clamp(val, min_val, max_val):
     return max(min(max_val, val), min_val)
+
+
+def encodeCursor(values):
+    """ Encode a list of values as an opaque pagination cursor.
+
+    Args:
+        values (list): The values identifying the last item of a page.
+
+    Returns:
+        str: The URL safe cursor.
+    """
+    # Tag dates so that they can be restored when the cursor is decoded
+    def tag(value):
+        if isinstance(value, datetime):
+            return {'datetime': value.isoformat()}
+        if isinstance(value, date):
+            return {'date': value.isoformat()}
+        return value
+
+    values = [tag(v) for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decodeCursor(cursor):
+    """ Decode a pagination cursor made by ``encodeCursor``.
+
+    Args:
+        cursor (str): The cursor to decode.
+
+    Returns:
+        list: The values identifying the last item of a page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'{cursor} is not a valid cursor')
+
+    if not isinstance(values, list):
+        raise ValueError(f'{cursor} is not a valid cursor')
+
+    # Restore tagged dates
+    def untag(value):
+        if isinstance(value, dict) and 'datetime' in value:
+            return datetime.fromisoformat(value['datetime'])
+        if isinstance(value, dict) and 'date' in value:
+            return to_date(value['date'])
+        return value
+
+    return [untag(v) for v in values]
+
+
+def checkCursorValue(value, expression, cursor):
+    """ Check that a decoded cursor value can be compared with the expression
+    it was taken from.
+
+    Args:
+        value (object): The decoded cursor value.
+        expression (ColumnElement): The expression the value was taken from.
+        cursor (str): The cursor the value was decoded from.
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: If the value is not of the type of the expression.
+    """
+    # NULL values are compared with any expression
+    if value is None:
+        return
+
+    # Expressions of unknown type are compared with any value
+    try:
+        python_type = expression.type.python_type
+    except NotImplementedError:
+        return
+
+    # Booleans are integers and datetimes are dates, so neither is accepted in place of the other
+    if python_type is bool:
+        valid = isinstance(value, bool)
+    elif issubclass(python_type, int):
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    elif issubclass(python_type, numbers.Number):
+        valid = isinstance(value, numbers.Number) and not isinstance(value, bool)
+    elif python_type is date:
+        valid = isinstance(value, date) and not isinstance(value, datetime)
+    else:
+        valid = isinstance(value, python_type)
+
+    if not valid:
+        raise ValueError(f'{cursor} is not a valid cursor')
+
+
+def paginateByKeyset(query, order_expression, id_column, page_size, cursor, reverse=False):
+    """ Retrieve a page of a query ordered by an expression and then by id,
+    starting after the item identified by a cursor.
+
+    Unlike offset pagination, the database seeks straight to the start of the
+    page so every page costs the same however deep it is.
+
+    Args:
+        query (Query): The query to paginate.
+        order_expression (ColumnElement): The expression the items are ordered by.
+        id_column (Column): The unique id column used to break ties.
+        page_size (int): The number of items that form a page.
+        cursor (str): The cursor of the page, or an empty string for the first page.
+        reverse (bool): Whether the items are in descending order.
+
+    Returns:
+        (tuple): tuple containing:
+            items (list): The items that make up the page
+            next_cursor (str): The cursor of the next page, None on the last page
+
+    Raises:
+        ValueError: If the cursor is malformed or its values do not match the ordering.
+    """
+    # Select the ordering values alongside the items to form the next cursor
+    query = query.add_columns(order_expression, id_column)
+
+    # Seek past the last item of the previous page, NULLs are ordered lowest
+    if cursor:
+        values = decodeCursor(cursor)
+        if len(values) != 2:
+            raise ValueError(f'{cursor} is not a valid cursor')
+        last_value, last_id = values
+
+        # Reject values that cannot be compared with the ordering
+        checkCursorValue(last_value, order_expression, cursor)
+        checkCursorValue(last_id, id_column, cursor)
+
+        if reverse and last_value is None:
+            seek = and_(order_expression.is_(None), id_column < last_id)
+        elif reverse:
+            seek = or_(order_expression < last_value,
+                       and_(order_expression == last_value, id_column < last_id),
+                       order_expression.is_(None))
+        elif last_value is None:
+            seek = or_(order_expression.isnot(None),
+                       and_(order_expression.is_(None), id_column > last_id))
+        else:
+            seek = or_(order_expression > last_value,
+                       and_(order_expression == last_value, id_column > last_id))
+        query = query.filter(seek)
+
+    # Order the query and fetch one extra item to detect the last page
+    order = desc if reverse else asc
+    query = query.order_by(order(order_expression), order(id_column))
+    rows = query.limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encodeCursor(list(rows[-1][-2:]))
+
+    return [row[0] for row in rows], next_cursor
+
+
+def approximateCount(query, max_age=60):
+    """ Count the results of a query, reusing counts made in the last
+    ``max_age`` seconds for the same query.
+
+    Args:
+        query (Query): The query to count.
+        max_age (int): The number of seconds a count can be reused for.
+
+    Returns:
+        int: The approximate number of results of the query.
+    """
+    if not hasattr(approximateCount, 'cache'):
+        approximateCount.cache = {}
+
+    # Identify the query by its SQL and parameters
+    statement = query.statement.compile()
+    key = (str(statement), repr(sorted(statement.params.items())))
+
+    # Reuse a recent count if there is one
+    now = time.monotonic()
+    count, counted_at = approximateCount.cache.get(key, (None, 0))
+    if count is None or now - counted_at > max_age:
+        # Drop stale counts before the cache grows large
+        if len(approximateCount.cache) > 1000:
+            approximateCount.cache = {k: v for k, v in approximateCount.cache.items() if now - v[1] <= max_age}
+
+        count = query.count()
+        approximateCount.cache[key] = (count, now)
+
+    return count
@@ -0,0 +1,4 @@
+from backend.app import Application
+
+if __name__ == '__main__':
+    Application.runJobWorkers()
@@ -82,38 +82,6 @@ for p in res/temp/productPrices/*.csv; do
      SET valuation_date = STR_TO_DATE(@valuation_date, '%d/%m/%Y'), currency_code = 'USD';"
 done
 
-echo "populating derivative table"
-for p in res/temp/derivativeTrades/*.csv; do
-  mysql -e "
-     USE derivatex;
-     LOAD DATA LOCAL INFILE '${p}'
-     INTO TABLE derivative
-     FIELDS TERMINATED BY ',' ENCLOSED BY '\"' LINES TERMINATED BY '\n'
-     IGNORE 1 ROWS
-     (@date_of_trade, code, asset, buying_party, selling_party, @dummy, notional_curr_code, quantity, @maturity_date, @dummy, @dummy, strike_price)
-     SET date_of_trade = STR_TO_DATE(@date_of_trade, '%d/%m/%Y'), maturity_date = STR_TO_DATE(@maturity_date, '%d/%m/%Y');"
-done
-
-echo "correcting strike price" # Nice one James
-mysql -e "
-    UPDATE derivatex.derivative d JOIN external.currency c
-    ON d.notional_curr_code = c.code AND d.date_of_trade = c.valuation_date
-    SET strike_price = strike_price / usd_exchange_rate;
-"
-
-echo "deleting company QETH27" # And again ...
-mysql -e "
-    DELETE FROM derivatex.derivative WHERE selling_party = 'QETH27' OR buying_party = 'QETH27';
-    DELETE FROM external.company WHERE id = 'QETH27';
-"
-
-echo "correcting derivative codes"
-mysql -e "
-  UPDATE derivatex.derivative
-
-  SET code = CONCAT(LEFT(derivative.selling_party, 3), '-', FLOOR(RAND()*1000));
-"
-
 echo "creating users"
 mysql -e "
   USE derivatex;
@@ -123,16 +91,14 @@ mysql -e "
     ('John', 'Doe', 'john.doe@gmail.com', '123', 'data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAUDBAQEAwUEBAQFBQUGBwwIBwcHBw8LCwkMEQ8SEhEPERETFhwXExQaFRERGCEYGh0dHx8fExciJCIeJBweHx7/2wBDAQUFBQcGBw4ICA4eFBEUHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh7/wAARCABXAIADAREAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwD5uttLjZj3OK45TsdUUtzoNN8PLLED5fFYSqnRRhzM7fw34FidFeWIFjjqKSk2ViZKKO8sfAluoUeQuAPSuKrJnjuWph+NPB9ilu5aBPlHpToOUWXT1Z5PN4djadvLTah6YHWvZg3Y6uVWG2KT6Zexxad5U15zncDtj+vqf0qnG5ijuLeUGL7drusN5iJ8sTS5x9EXgCmlFFe8bWkeNW0uaKbRtTvLa4TBLK2Vxj+IdMexrGsrx0NaVr6nvfws+KOn+LVj0rVY4bPU3+SKRG/c3LY6D+6/faevauNSvozaUGtVsW/iBoZlhZvJBrN2RSueHeIIok863dAsgBxn6VC0dzR6qxw0Njbg8sc11e3Zx+wRc02BVvlQ4PcH1rVVOZGFSnyuxp6vbIbZ2P8AdNRzWJjG5xkFrCXzjv61TqM1jTMzQrdPtLNLggdqmqmUnod7o5gZY1CrgsBWCi7nTCfKj13wrpSMkfy5zXSoWRx1qjkdhNYSrHlUUcelYToNu5ytHlXxSlmt45VCcFTV0qDvdmlLRnkGs6gllZQsgDSzfIo9OPmP+fWvQSsjaUrqyPTvg94L0jxFB9ovY3MccYXcrbRk+nc/U1FappY1w1O7uzvfFPwL0C8tDLozCOUL91umcdayTVtDocLvVHmeqfB3X7D9zb2K3afeOSdrMDxkd/x9KxlX5NzVYXmWhSTwn4s8NWd1q8mmOyRKJJBtCgAHOcKMnB5yTmueWIpzkkX9VnCLbZ9HfDPxDf8AjT4cx6rqsCJOJGhDBslwoHzH3yayqGUVZnifxg068h1xGs4i28kNg9q6cLhpVE9DLEVo02jjYdHv9u7YOffpWs8JUXQmFeEtmTWNhdrfpuQYUHPNEaM4rUxrzTaNXV7S4fT5CqdFNL2cmYwkrnB+VJAMsKJ05I6IzRkXbNp9y4Cnb7V01I3MkzY8NX1xNdQgKQgYHms7JIG2z6R8C30P2OFmYbgozWkUmZSVjsri/jNqSpFXymbdjyT4jXEEkU2/BODVxjcaZ4Zr6RLc27OOQWAGOMEjNVUVrGqPpH4ZCx0/REhsc/vCGbLAszYyenHFceJVtUduDd9Gen2LzOA6AnI5rlTfQ7ml1NCLzOjJmom2ylYs+Rb3Mb2txAjxTKUZSucgjBrn62Yp3SujzWx1Kw8D6JPo2Ui/fNKqA/wkDH6CumlRlNnHUqxirs4DUdUTWtTadiCo6V9JhcPyQseHia/PIkFrCy9BXRKmRCrYhjsYxclgo4FcdenZHV7S4X8aCBxgdK4o72GjzvU4Ig7gYxnipqs0iMufDkl1MZHgfH+7VNXFexc0/RBagHYQfpXLUWtjenY2bXXJ9MIG84FVTbQ6sU0aMHxClaMo5OKv2vQ4ZRdzj/EviQ37sN3FdlFXEkzprnwtpuofC23uWt7T7ZLGtxDNt/fPJk5XcP4TwuDxxXm1q81Xab0ufRUsHTnhYyivetds7b4XaedK8E2upyobi4lj8wRr2BPCis6stdTGhC0Ul1LJ+Jevm9aODwhcxwR/elklCbucfKO/6VnKa5eZHTCL5+Vo7WPxfJH4dfWri3kjhiGXyP0+tYOq0dCoxbE8C/EvSvEupRWS2OoWsznA86Egc8A59M96JKzVznnG8W4nifx2h1uy1Cy1G8ljaO6i8uPY5LR7f4WBHXnPGa9bAVYyjyrdbnkY6jOHvSWj2Oe8KPcyIpaZq92nLQ8SojsRvjhB8xq25jJXT0DTpnkuWG4nArixTVjppSdyr4qkeKwlKsVyK8bnakehCNzzSe5kMvLkgms5TbZ0qKsfV8GhWXlY8hfyrUyMfXPDtiEJ8oZpWHex4p49s/sV0+3headrIXNc5rwlpk+v6r9kiYoi8yOOwrK9mHIjuNU+HGm/2bIbczC4Vch/MJyfp0rppVpIhwRv/AS8iv8Aw7d6JcFH1DR5m8uMjJeN8kcegbI9uKxxcPf5u562CrP2Tgd94ECWVilm4wsWVAb0ya5L3d2XBdOx0OrW2nm1kmlSMLtz061TUTohF9C9olpb/wDCMOLiKMQFt4UjGBx1qasPcTYlJ+0SRsaXp1ihilWJMxncpx09cVjyJ6mVacldHzp+0VK+p+JbXR4nAGnxZlA/56Pz+YUL+ZrvwC5LyfU58cvaQUVsjn/C2llSkaz5PfjpXuwkfOTg0z0Kw8PQXUQR5nzjqK0c9DOMLksXhYQSusMrMT/eFcOInzI6IQszM8YeFxPpMiR3LCX0I4NeVLc76aseQz6Q9vO8dxlXU4qUbNn0NpHjzS7mIbZhzW0TFuxY1TXrOe3LpIpGPWtEiGzxH4i3i3crlDwMilIaQz4Iyw2+p3kM5VWlA2E/yrC2tzRnqOtTxWWmzzzMFUIcZ78VpFXdiTwXwpdXY8ZyahZXU1tI0jfNG207Seh9q6a1nGzHScou6dj6B0a5EbLCJGLx4DFjkkHnP615LPUT1NnVdVs4sWlzdiKQrmMlwuD6896ISV/eZ2QcraIf4Qnu442hk1w3NvIzMTJMjbs5yv0rKU7vc3dNr3nE6ldZj0Tw1f6tO4uILGB5gd2N4A4GffgfjRTXNLlRx4lqTPmLUdebWNcvdYvGQXN3M00gXoCew9h0r1oQsctSUVGxNousxWtyZHYBTXXGpY8WpC7PS/CPiCxuMHzo8eu4U6lXzCnTOpXVLPLS7lwD1zXDUrI39mYXiS9gS1acyLtJyOaxKieRavdxXuou0eCM4yKaiNyOL03Vri3UDJpwlYckblr4jn27SzYPvWvOZ8hXvrl7s/WolIuMbE2kxvbS+Yh2t6is7l8pp6xqF7c2RillJXHrVxmkLlKXwc0a61f4weHNKhjJtBdNd6iwHAhhXftPsW2jHfOK9SlSfKpNas5KtTVpHsvjjTL7QdXWabLtjErL0kHXcP1rxcRScJtM9ilNTgpIv6RPa6zZx5ZC6nhiBkH8a51F9Dqp1nF6HTaJpZCkXMFjIM/wwKCfrxWU1J7nXLFO25z3xvtb5/h3Np2mfuYXkV59owCinIQe2cZ+ldWCppS5nseRi8Q9lufKUl40Zbe5yDgjNe2oRWp5060pKxVW9dnJ3sR9azcbmaZq6VrJtSBuYD2Nc9WhzI2pVuXc9M8I62bmzOHZvqa4vYOL1Kq4hS2F1+yvNUaOMTSrEW+6p4rto07nNdlnTPCghKlwSAK3dC4+Y4zT/DrORkV5p1XN+18KggHYPyoDQuJ4WI6IKAHNoBhQu+1FXqTwBTUW3ZD5rHOa/e2cETQwN5smOGHQV6eHy93Uqn3HLUxXSJkfDzxfceDfHNh4ghDNHDJsuYxyZYW4cfXHI9wK9Fs5rXPtbUdP0nxdocEm9J7a4jEtrdRHkKwyCPUH0rkr0Y1VaR0UK0qTujyvWvAut+Hbl7iAGS1zkTRAlf8AgQ6r/nmvIq0ZU/iV13PUp1IVfhdn2Op8Cwajd7GvrkMhwioi/M5PAGa4W+aXLE6HFxV30OK+L2oSW3xL1rQRI0BEMFxAqkhZYnjAPHQ4ZWr36aSSizx23LU8g1LQPDbyv9s0lopGJJe3ndcn1AJI/SteVLoTy32MW58D2M2X0fV2z/zyugAfwYf1FS4roLlZz114e122vvsq2Mkzk/L5XzZ+mKzba0Fynp/w/wDD+tW9qq3emXcOTzvjIrlnFylYg9c0Xw8sscZaP5u+R0rqp2iikjQ1HRpYUASMNj0rrpzj1JlFnB6fpiqR8oryOU6eY6CysVOFCZJ6cUcguYwPFvi/RdFZrKyC6hfLw+1v3UR9CR94+w/OuyhgXU96WiMZ11HRHmWv+Jbq+Yvd3BYdo1+VB9AK9SnSp0VaKOaUpT3OWuL03FwFxwQaHO5SjYqSxDkjis2Uj6J/ZB8fKWl8BapPzlp9KZz+MkI/VwP96sWy0j6Yuru0sLC4vr+aOC0t4mlmlkOFRFGWY+wFYyVy07Hxlq/xy1fUviPdar4WvZdJ0lJB9jtURQHjHHmOuDy3LEdhxShg6afMlqaPETceST0Ox/aNXULy08JfEoRbJPsgstSRFwB824H2B38fUUct0xRdmeZ6nctIyozblPzI/wDeB6fjUczsacpli4khnxk9aTloFjtPgpd/bPinHo05Dpd2xMef4XXnI+oBFK94kTR9YJpUcNmI/LUKBgADiouZ2Mn7NF9oaONR8p4p8xVh95psjwkgdqakFjymyg4GBzWYHk/xN+Klv9rl8P6DdOkSEx3V0g++RwUQ54X1Pf6de3D0oxfNIxnJvRHnkuqAKPLOVPRq7XVMVApyXbS9WzWEp3NlGxBKzMMrI0bDoynBFTzDsEVzc7GScow/hdRgt9RQ5tKw1EtaRqN5pOq2up2EzQXdrKs0MinlXU5BpJ3Q9j718CeJYfiH8O7HV4wiLcptuYlOdkq8Oh+h5+hFZatlKyPnH9q3wT4c8LtoWq6LZCz1S9nmjnEI2xzKqZLMo6HcRyMdTXRSUrmc2j03wZf2nxN/ZfubW6jC39hZvZ3Az82+NBscj1IC/iDUuPLNruNO6PnHRrr7ZoEe8nfD+7bvjFck1aR0xd0EgVhG6kHsfrUuw0aHw5uHs/jTociP5bCSLDDtufB/Qmpfwia1PuDWVu7W0A8wncdoOKzldGaSM/SLQySFmoiUzdltUFvjPaqJPmXx9q0mh+AtX1KFtsyW5SJv7ruQgP4bs/hWlON5JEN2R8kTNh8g5rtM0WrO5IUIxJU1DZaLSSsDj0qSrFk5kiK5IyOo7UXAZA5cHf8AfU4b60ATN0qoiZ9BfsX+NH07xXdeDrks1rqyma3HUJPGuT9AyA/iopSWtwWw/wDbVdpNX0FFZysL3K4zj5iIyDXdS+Exluc5+zN4iuNN8ZnQJZNtl4ihNnIvJPmMpMT/AJgj/gRqJq7u+g1ocaLc6R411zQn+7HcyIMdOuRXHiI2Z0UmNCmOQr23VzM2SC3nNl46tb1PvRW8cg+oYn+lT9kT+I/QPU5lvNBhuUHyyiORc+jDP9adTYyW5U03CL0rNFMt3j/uWwe1UTY//9k='),
     ('Jane', 'Doe', 'jane.doe@gmail.com', '123', 'data:image/jpeg;base64,/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDAAUDBAQEAwUEBAQFBQUGBwwIBwcHBw8LCwkMEQ8SEhEPERETFhwXExQaFRERGCEYGh0dHx8fExciJCIeJBweHx7/2wBDAQUFBQcGBw4ICA4eFBEUHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh4eHh7/wAARCABmAIADAREAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwD5ajWpJJ1HFK4C4oAeq0APC0AOAoAXFAD0WgCwLebaW8mTAGSdpwKXMg5X2GYqriGsopDGbaAEYYoAbii4BincCORARQIrJwKBkg6UgHKKAJAKAHgUALQBWvLpLcAfekPRf6mkNIgj1K8gfdC6iQjuoOB9DxUuKluaRlbY6qOf4h3mkeZ9lu7qxAyT9mUADHYgA/lxXO3RTtezOlKs1exk3M8kMwS4iIb+LPDr9R3+tbwldHPOFmOOOxBHqO9aGQw9aBA1ADKAFoAQ0xFEUhj16UASJQBKtADscUADsEQsx4UZNAzAjZri6aaTvz9B6Uijt/g/4ZTxL4oX7Qga2g/eSA9GOflX9P0rlxdX2cNN2dmCoqpUu9kfX+gaFELNIwi4Ax0rzIUrnsTmlucB8aPhXZalpc+o6fAIdSiUsjRAAsQOh9a1pTlSlboc1aEasfM+ZLGRz5kEwCyxHBH8/wBa9aLPFmrFgjNWZjD6ZoAYQfWgBQaAA0AzPU0ASKaAJFoAlWgB9AFPWJClkVHVyFpFIy4CFgkPcjAoZR7f8AmXSrA3klheSpPLkyRIrAKOBxuz+leXi2pVN9j18DHlp3tufT/hvUrK5tGeE7vKHzVNOcbG1WMr+pk3/iiyu72Sza402CUNtS2afdK/17DPpzTmlJcyRMU0+W58bfEKxfQvivq+nuhSP7W5QY/gkG4fzrvou9NM8qvG1RoqHdnBGK3OYZjFAhDQA3IFAC7gR1oEZy0DJFNAEq9aAJVoAeKAM3XG5hT6mkUjNBOcCgo+hPhL4BuLZrXWbifz0iw6IJCFKlcFWX0B54I5ry/rfvOyR7UMH7q5m/ker/DFootX1izVj5cm07WPcDBNc8ZK7OuUPdVzo9P8C6JbX91fw2SGa7ZTJ8g6qcrz7Hv1966bycOVPTsYNRU+ayv3Pmr9rS0SD4oWMqLtkm09Gf6q7KK3wj9xrzODGwtOPocBkOqSDo6hq64nnSWojCqJGlaAGFKAG7Bnmi4GcpoKJFNIRIpoAkVqYiRWpDM3VAXvUHolIpbGep2vn3pvUa3PrL4XeI7ZPBjXM2Ejhh+Yt0HHevnr8kmj6lVFKCZa+GN4y6/5ya9YyRyRsPLWPfK+4k5BGeefSqpqV9glHmjdbHpTausF/FaWstzJdLGHlEkLIShyA5yoHJB/KtJc0LWM0lK99j5Z/ab1BtS+LPkbwwsrCND7MxZyP1Fd+FVqd31Z5ONlzVtOiOD05s2Eef4cr+HX+tda3OCfQsZFUZiGgBpoAY/FAGSOtIoetICVaYh60ATRAFgCwUHqT0FJjSuZk86tqB4IAXbk8UdC1poUZhhyB0zTQj1D4Z+NoLPR7jR70KY54/LdW6EYxkfhXl4jDuM+ZHrYXEpxUZHunwTv/EGnQpb2EqNahQIfKdU2pnIAyDiiliZXsd0qNCULyjr/AF0Oj+JPi628GaDd63rdzJNPIRsj373kboqA/wBe3NKXNVnbqY1akKcNFZI+MrvVb3X/ABNd6xfNuur2cyPjoCxwAPYDgfSvR5VGKS6Hjc7nJyfUNLm3K8JxwAR/I1XUzlqi8MirMhQaAAmgBDg0AYwNIoepoAlU0CHqaAG3cxit2ZclugpDRkRH94Hc57kmmUNkfe5bHBNFgNbwqtrJq8MN2oMMjbWP933rnxPNyXidGGtz2Z9O+CPDF1pFvDPp93cC2kUEBJcrg+mf6V475nqz2Iz5VZHD/tSyzpp+mW8juwe4ZmLNknanH867MCr1G/I4sdJuCXmeIaY+26ix2bd+NekzzojYJjHeMUONxOCfrTYl2N0EgDIppmbVg3UxCFqAANQBjqakoeDQA8GgCRTTEMugzQlVIGeufSkUjNb5CygBhyP/AK9MZGuM4NAF1F8h1KSFZABJE68HOah67lrRn1J+zp4si1vRzp09whngYLJFjHXo6+mTwR64I615VSHs5WPVpz9pG6Mj9rzSgdF0a5hG5vtTqcdgUz/StMK1CZliYuUD5z0lN12R0Kj9c16TPPitSFlVrwR7cndjH480+hPU3bW3uzpkd48Ev2YuYkmK/I7L1ANTGceZxvqOcJWUugVoYhQAUAY4qSh60APWgB60AJbwS6lqC2MJ2qPvtWdaoqUOZmtGk6krHuHw6+GWgXtiI73TorkOPmZ87j9D1H4V4DxledS6lY99YShCnbluee/Gr4cTeBdYie2kefSbsn7PI/3o2HJjf1PcHuPcV7WGxHtVZ7njYjD+yd1szhZHykIdshVI47DPSugw9T0H4PeI9M8P+MrO4eU28UyGGWR3Cx9AVLZ6fMo5965MRSlKJ14erGMvU+j/AIzaR/wlXghbnSljvfIkFwnlMHWVCpVgCOMlWP5Vwy913O+PvKx8d6on2DVJQuQ3IZSu0qR1BHavVpPmgjyqy5Jsy2cmUyZOSc5rYwOq0K71W4j07QftUz2d3dIDbCTapJYDGegJ61zVYxV521R00pS0hfRmx458NXvhXX5tMu1YoCWglK48xM9fqOhHrV4esqsL9TLEUXSnZmBmtznDNAGODUlDlNADwaAHqaANj4fRB9RlkbqZMf5/OuDMH7qR6GBWrZ9TfDUItvH07Zrx6W569R6HSfEPwdp/jHwzPpN4gCyL8kgHMT/wuPcHmuyDcJKUehyTSnFxkfDviXSL7QtfvdG1GPy7uymaGVR0yD1HsRgj2NezCSlFNHjzTjJplWWVWijXywrL1I/i+tNIlyuT2Gp6lp6Mmn6je2at95be4eMH6hSM0NJ7iUmtmVJC0hLMzMxOSWOST9aYX7jI0J4BAYepxQMsWUvlSxvLNIYRKrSojYYqDk498ZpSV1ZFRdndn1/4y8HW3jPwCsNu5kvIYUubGdzkjcudpPUg9Py9K8ajN0Zc33nr1qca0bfcfLd1FLbXEkE8bRyxsUdGGCrA4INe2mmro8SUXF2ZFupkmTUlCg0APBoAepoA3vBY8qZG/vSsf1rzcc7no4PRH0x8NZs28YyM4FeXT3PVnsetWXzQAnniu2OxySPkH9rawSz+LQukTYL7T4pG/wBplLIT+SrXoYSV4Ndmefi42kn3PIW6V0nIAoATpQAh5qgFUDOeKdgPs79mfVBrnwosTK2+5st1hIT3WM5T/wAdZa8qvTtUfmevh6l6S8jzr9pXwK9jenxXp8P7qUhb5VH3W6LJ+PQ/gavCVeV+zl8v8jHGUeZe1j8zw4mvRR5hlg0rFDhSAUU7APQ0gOl8LcmL2Yj9a8zGrVnpYPWKPf8A4azMoQZ44ryoP3j1pL3T2nRpd0IBHau+Bx1EeEftoaFBL4e0nxEuFuLS6Nq3+0kgJA/Blz+JrqwrtNx7nLi43pqXY+Xwc16B5otABjNACY700AtMD3D9lbxdPoUviSwaNp7f7Gt7HHnAEqusf5EOuf8AdrixlornO/A3lLk7numt3B/4Q+8l8Qgah57iF0QYU7x0APRQDXlyb5eeT1PaajNqnFJKz+fqfJvxC0WDw74qu9KtZpJoIwjxtIAGwyhsHHpnFe1hqjqU1Jnz+OoRw9Zwi7o//9k=');
 "
-echo "creating historical actions"
+echo "deleting company QETH27" # Its trades are skipped when loading below
 mysql -e "
-  USE derivatex;
-  INSERT INTO action
-  (derivative_id, user_id, type, timestamp)
-  SELECT id,
-    (SELECT id FROM user ORDER BY RAND () LIMIT 1),
-  'ADD', date_of_trade FROM derivative;
+    DELETE FROM external.company WHERE id = 'QETH27';
 "
 
+echo "populating derivative table"
+python3 -m backend.ingest res/temp/derivativeTrades/ --exclude QETH27 --user-id 1 --user-id 2 --user-id 3
+
 echo "introducing errors"
 python3 introduceErrors.py
 
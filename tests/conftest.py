@@ -8,8 +8,12 @@ import pytest
 
 # Local application imports
 from backend.derivatex_models import Derivative, User, ReportHead, Action, ActionType
+from backend.external_models import Currency, CompanyStock
+from backend.managers import external_management
+from backend.managers import learned_behaviour_management
 from backend.app import Application
 from backend.db import db
+from backend import utils
 
 
 @pytest.fixture(scope='session', autouse=True)
@@ -46,6 +50,10 @@ def clean_database():
     db.session.rollback()
     db.drop_all(bind=None)
     db.create_all(bind=None)
+    # Discard market data and counts cached by previous tests
+    external_management.invalidateMarketSnapshots()
+    utils.approximateCount.cache = {}
+    learned_behaviour_management.invalidateCompiledTrees()
 
 
 @pytest.fixture
@@ -83,6 +91,27 @@ def dummy_derivative():
     )
 
 
+@pytest.fixture
+def copy_dummy_derivative(dummy_derivative):
+    # Create new derivatives from the dummy derivative, with any attributes replaced
+    def copy(**attributes):
+        values = {c.name: getattr(dummy_derivative, c.name) for c in Derivative.__table__.columns if c.name != 'id'}
+        values.update(attributes)
+        return Derivative(**values)
+
+    return copy
+
+
+@pytest.fixture
+def reports_dir(tmp_path, monkeypatch):
+    # Generate reports within a temporary directory
+    path = tmp_path / 'res' / 'reports'
+    path.mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+
+    return path
+
+
 # TODO: revisit
 @pytest.fixture
 def dummy_derivative_json(dummy_derivative):
@@ -155,3 +184,26 @@ def dummy_report_head():
         version=1,
         derivative_count=0,
     )
+
+
+@pytest.fixture
+def dummy_market_data():
+    # Value the dummy derivative's stock at 10 USD per unit today
+    today = date.today()
+    rows = [
+        Currency(code='USD', valuation_date=today, usd_exchange_rate=1),
+        Currency(code='GBP', valuation_date=today, usd_exchange_rate=1.25),
+        CompanyStock(company_id='bar', valuation_date=today, stock_price=8, currency_code='GBP')
+    ]
+
+    # Commit the market data, as the external database is joined through another connection
+    db.session.add_all(rows)
+    db.session.commit()
+
+    yield rows
+
+    # Remove the market data, the external database is not cleaned between tests
+    db.session.rollback()
+    for row in reversed(rows):
+        db.session.delete(row)
+    db.session.commit()
@@ -21,3 +21,16 @@ def testGetAction(test_client, dummy_action):
     assert response.is_json
     expected_response = jsonify(action=dummy_action)
     assert response.get_json() == expected_response.get_json()
+
+
+def testGetRecentActionsByCursor(test_client, dummy_action):
+    # Add dummy action to session
+    db.session.add(dummy_action)
+    db.session.flush()
+
+    # Make request for the first page and retrieve response
+    response = test_client.get('/action-management/get-recent-actions/15?cursor=')
+
+    # Assert that the page is the only page
+    assert response.status_code == 200
+    assert response.get_json() == {'actions': [dummy_action.id], 'next_cursor': None, 'total_count': 1}
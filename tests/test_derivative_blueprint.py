@@ -6,6 +6,7 @@ from flask import jsonify
 
 # Local application imports
 from backend.derivatex_models import Derivative, Action, ActionType
+from backend.managers import derivative_management
 from backend.db import db
 
 
@@ -37,6 +38,24 @@ def testGetDerivativeRetrievesDerivative(test_client, dummy_derivative):
         assert response_json.get(key) == expected_val
 
 
+def testGetDerivativeIncludesAssociatedActions(test_client, dummy_derivative, dummy_user):
+    # Add dummy user to database session
+    db.session.add(dummy_user)
+    db.session.flush()
+
+    # Add dummy derivative with a corrosponding action
+    derivative_management.addDerivative(dummy_derivative, dummy_user.id)
+    action = Action.query.filter_by(derivative_id=dummy_derivative.id).first()
+
+    # Make request and retrieve response
+    url = f'/derivative-management/get-derivative/{dummy_derivative.id}'
+    response = test_client.get(url)
+
+    # Assert that the associated actions are serialized
+    assert response.status_code == 200
+    assert response.get_json().get('derivative').get('associated_actions') == [action.id]
+
+
 def testGetDerivativeWillReturn404(test_client, free_derivtive_id):
     # Make request and retrieve response
     url = f'/derivative-management/get-derivative/{free_derivtive_id}'
@@ -186,3 +205,129 @@ def testDeleteDerivativeRegistersAction(test_client, dummy_derivative, dummy_use
                                     type=ActionType.DELETE).first()
     # Assert that such an action exists
     assert action is not None
+
+
+def testGetDerivativesRetrievesDerivatives(test_client, dummy_derivative, free_derivtive_id):
+    # Add dummy derivative to session
+    db.session.add(dummy_derivative)
+    db.session.flush()
+
+    # Make request and retrieve response
+    url = '/derivative-management/get-derivatives'
+    response = test_client.post(url, json={'ids': [dummy_derivative.id, free_derivtive_id]})
+
+    # Assert that the response status is 200 OK
+    assert response.status_code == 200
+    assert response.is_json
+
+    # Assert that the derivative is returned and the free id is missing
+    response_json = response.get_json()
+    assert [d['id'] for d in response_json.get('derivatives')] == [dummy_derivative.id]
+    assert response_json.get('missing') == [free_derivtive_id]
+
+
+def testGetDerivativesWillReturn400ForInvalidIds(test_client):
+    # Make request and retrieve response
+    url = '/derivative-management/get-derivatives'
+    response = test_client.post(url, json={'ids': 'foo'})
+    # Assert that a 400 HTTP error is returned
+    assert response.status_code == 400
+
+    # Assert that booleans are not accepted as ids
+    response = test_client.post(url, json={'ids': [True]})
+    assert response.status_code == 400
+
+
+def testAddDerivativesStoresValidDerivatives(test_client, dummy_derivative_json, dummy_user):
+    # Add dummy user to database session
+    db.session.add(dummy_user)
+    db.session.flush()
+
+    # Form POST request body with a valid and an invalid derivative
+    body = {
+        'user_id': dummy_user.id,
+        'derivatives': [dummy_derivative_json, dict(dummy_derivative_json, quantity='foo')]
+    }
+
+    # Make request and retrieve response
+    url = '/derivative-management/add-derivatives'
+    response = test_client.post(url, json=body)
+
+    # Assert that a result is returned for each derivative
+    assert response.status_code == 200
+    valid_result, invalid_result = response.get_json().get('results')
+    assert 'error' in invalid_result
+
+    # Assert that the valid derivative and its action have been stored
+    assert Derivative.query.get(valid_result['id']) is not None
+    assert Action.query.filter_by(derivative_id=valid_result['id'], type=ActionType.ADD).first() is not None
+
+
+def testUpdateDerivativesUpdatesDerivatives(test_client, dummy_derivative, dummy_user, dummy_updates,
+                                            free_derivtive_id):
+    # Add dummy derivative and user to database session
+    db.session.add(dummy_derivative)
+    db.session.add(dummy_user)
+    db.session.flush()
+    derivative_id = dummy_derivative.id
+
+    # Form POST request body updating the dummy derivative and a free id
+    body = {
+        'user_id': dummy_user.id,
+        'updates': [{'id': derivative_id, 'updates': dummy_updates}, {'id': free_derivtive_id, 'updates': {}}]
+    }
+
+    # Make request and retrieve response
+    url = '/derivative-management/update-derivatives'
+    response = test_client.post(url, json=body)
+
+    # Assert that a result is returned for each update
+    assert response.status_code == 200
+    valid_result, invalid_result = response.get_json().get('results')
+    assert 'error' in invalid_result
+    assert len(valid_result['update_log']) == len(dummy_updates)
+
+    # Assert that an action has been registered for each update
+    actions = Action.query.filter_by(derivative_id=derivative_id, type=ActionType.UPDATE).all()
+    assert len(actions) == len(dummy_updates)
+
+
+def testUpdateDerivativesRejectsUpdatesThatChangeNothing(test_client, dummy_derivative, dummy_user):
+    # Add dummy derivative and user to database session
+    db.session.add(dummy_derivative)
+    db.session.add(dummy_user)
+    db.session.flush()
+    derivative_id = dummy_derivative.id
+
+    # Form POST request body updating the dummy derivative to its current quantity
+    body = {
+        'user_id': dummy_user.id,
+        'updates': [{'id': derivative_id, 'updates': {'quantity': dummy_derivative.quantity}}]
+    }
+
+    # Make request and retrieve response
+    url = '/derivative-management/update-derivatives'
+    response = test_client.post(url, json=body)
+
+    # Assert that the update is rejected without registering an action
+    assert response.status_code == 200
+    assert response.get_json().get('results') == [{'id': derivative_id, 'error': 'no valid updates'}]
+    assert Action.query.filter_by(derivative_id=derivative_id, type=ActionType.UPDATE).first() is None
+
+
+def testDeleteDerivativesDeletesDerivatives(test_client, dummy_derivative, dummy_user):
+    # Add dummy derivative and user to database session
+    db.session.add(dummy_derivative)
+    db.session.add(dummy_user)
+    db.session.flush()
+    derivative_id = dummy_derivative.id
+
+    # Make request and retrieve response
+    url = '/derivative-management/delete-derivatives'
+    response = test_client.delete(url, json={'user_id': dummy_user.id, 'ids': [derivative_id]})
+
+    # Assert that the derivative has been deleted and the deletion registered
+    assert response.status_code == 200
+    assert response.get_json().get('results') == [{'id': derivative_id}]
+    assert Derivative.query.get(derivative_id).deleted
+    assert Action.query.filter_by(derivative_id=derivative_id, type=ActionType.DELETE).first() is not None
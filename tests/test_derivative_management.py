@@ -1,11 +1,15 @@
+# Standard library imports
+from datetime import date
+
 # Third party imports
 import pytest
 
 # Local application imports
 from backend.derivatex_models import Derivative, Action, ActionType
+from backend.external_models import Currency, CompanyStock
 from backend.managers import derivative_management
 from backend.db import db
-from backend.utils import AbsoluteDerivativeException
+from backend.utils import AbsoluteDerivativeException, encodeCursor
 
 
 def testGetDerivativeRetrievesDerivative(dummy_derivative):
@@ -183,3 +187,160 @@ def testUpdateDerivativeHandlesAbsoluteDerivatives(dummy_abs_derivative, dummy_u
 
     # Assert that the derivative remains unchanged by comparing value dictionary
     assert dummy_abs_derivative.__dict__ == dict_copy
+
+
+def testValueDerivativesValuesDerivatives(dummy_derivative):
+    # Add market data and dummy derivative to database session
+    db.session.add(Currency(code='USD', valuation_date=date.today(), usd_exchange_rate=1))
+    db.session.add(Currency(code='GBP', valuation_date=date.today(), usd_exchange_rate=1.25))
+    db.session.add(CompanyStock(company_id='bar', valuation_date=date.today(), stock_price=8, currency_code='GBP'))
+    dummy_derivative.quantity = 10
+    db.session.add(dummy_derivative)
+    db.session.flush()
+
+    # Value the derivative from both a list and a query
+    expected_valuation = {'notional_value': 100, 'underlying_price': 8, 'underlying_curr_code': 'GBP'}
+    for derivatives in [[dummy_derivative], Derivative.query]:
+        valuations = derivative_management.valueDerivatives(derivatives)
+
+        # Assert that the valuation agrees with the derivative properties
+        assert valuations == {dummy_derivative.id: expected_valuation}
+        assert dummy_derivative.notional_value == expected_valuation['notional_value']
+
+
+def testIndexDerivativesOrdersByNotionalValue(copy_dummy_derivative, dummy_market_data):
+    # Add several copies of the dummy derivative to database session
+    derivatives = [copy_dummy_derivative(quantity=quantity) for quantity in [3, 1, 2]]
+    db.session.add_all(derivatives)
+    db.session.flush()
+
+    # Index derivatives ordered by notional value, in both directions
+    result, page_count = derivative_management.indexDerivatives(
+        15, 1, 'notional_value', False, None, None, None, None, None, None,
+        None, None, None, [], [], [], False, False)
+    reversed_result, _ = derivative_management.indexDerivatives(
+        15, 1, 'notional_value', True, None, None, None, None, None, None,
+        None, None, None, [], [], [], False, False)
+
+    # Assert that the derivatives are ordered by their notional values
+    assert page_count == 1
+    assert [d.quantity for d in result] == [1, 2, 3]
+    assert [d.quantity for d in reversed_result] == [3, 2, 1]
+    assert [d.notional_value for d in result] == [10, 20, 30]
+
+
+def testIndexDerivativesFiltersByNotionalValue(dummy_derivative):
+    # Add dummy derivative to database session
+    db.session.add(dummy_derivative)
+    db.session.flush()
+
+    # Index derivatives with a minimum notional value
+    result, _ = derivative_management.indexDerivatives(
+        15, 1, 'id', False, None, 0, None, None, None, None,
+        None, None, None, [], [], [], False, False)
+
+    # Assert that derivatives without market data are excluded
+    assert dummy_derivative not in result
+
+
+def testIndexDerivativesByCursorVisitsEveryDerivative(copy_dummy_derivative):
+    # Add several copies of the dummy derivative to database session
+    derivatives = [copy_dummy_derivative(quantity=quantity) for quantity in [5, 1, 4, 2, 3, 2, 1]]
+    db.session.add_all(derivatives)
+    db.session.flush()
+
+    # Follow the cursors through every page ordered by quantity
+    cursor = ''
+    visited = []
+    while cursor is not None:
+        page, cursor, total_count = derivative_management.indexDerivativesByCursor(
+            3, cursor, 'quantity', True, None, None, None, None, None, None,
+            None, None, None, [], [], [], False, False)
+        visited += page
+
+    # Assert that every derivative is visited once in order
+    assert total_count == len(derivatives)
+    assert visited == sorted(derivatives, key=lambda d: (d.quantity, d.id), reverse=True)
+
+
+def testIndexDerivativesByCursorRejectsInvalidCursor():
+    # Assert that a malformed cursor is rejected
+    with pytest.raises(ValueError):
+        derivative_management.indexDerivativesByCursor(
+            3, 'not a cursor', 'id', False, None, None, None, None, None, None,
+            None, None, None, [], [], [], False, False)
+
+
+def testIndexDerivativesByCursorRejectsMismatchedCursor():
+    # Assert that a cursor whose values do not match the ordering is rejected
+    for order_key, values in [('quantity', ['1', 1]), ('date_of_trade', [1, 1]), ('id', [1, True])]:
+        with pytest.raises(ValueError):
+            derivative_management.indexDerivativesByCursor(
+                3, encodeCursor(values), order_key, False, None, None, None, None, None, None,
+                None, None, None, [], [], [], False, False)
+
+
+def testGetDerivativesRetrievesDerivativesInOrder(copy_dummy_derivative, dummy_derivative, free_derivtive_id):
+    # Add two copies of the dummy derivative to database session
+    other_derivative = copy_dummy_derivative()
+    db.session.add_all([dummy_derivative, other_derivative])
+    db.session.flush()
+
+    # Retrieve the derivatives in reverse order alongside a free id
+    derivative_ids = [other_derivative.id, free_derivtive_id, dummy_derivative.id]
+    derivatives = derivative_management.getDerivatives(derivative_ids)
+
+    # Assert that the existing derivatives are returned in order
+    assert derivatives == [other_derivative, dummy_derivative]
+
+
+def testAddDerivativesRegistersActions(copy_dummy_derivative, dummy_derivative, dummy_user):
+    # Add dummy user to database session
+    db.session.add(dummy_user)
+    db.session.flush()
+
+    # Execute addDerivatives with two copies of the dummy derivative
+    other_derivative = copy_dummy_derivative()
+    derivative_management.addDerivatives([dummy_derivative, other_derivative], dummy_user.id)
+
+    # Assert that each derivative has been stored alongside an add action
+    for derivative in [dummy_derivative, other_derivative]:
+        assert Derivative.query.get(derivative.id) == derivative
+        assert Action.query.filter_by(derivative_id=derivative.id,
+                                      user_id=dummy_user.id,
+                                      type=ActionType.ADD).first() is not None
+
+
+def testUpdateDerivativesHandlesAbsoluteDerivatives(dummy_abs_derivative, copy_dummy_derivative, dummy_user,
+                                                    dummy_updates):
+    # Make a separate derivative that was traded today and so is not absolute
+    other_derivative = copy_dummy_derivative(date_of_trade=date.today())
+
+    # Add dummy derivatives and user to database session
+    db.session.add_all([dummy_abs_derivative, other_derivative, dummy_user])
+    db.session.flush()
+
+    # Make a copy of the other derivatives value dictionary
+    dict_copy = other_derivative.__dict__.copy()
+
+    # Assert that updateDerivatives raises exception if any derivative is absolute
+    with pytest.raises(AbsoluteDerivativeException):
+        derivative_management.updateDerivatives([(other_derivative, dummy_updates),
+                                                 (dummy_abs_derivative, dummy_updates)], dummy_user.id, -1)
+
+    # Assert that the other derivative remains unchanged by comparing value dictionary
+    assert other_derivative is not dummy_abs_derivative
+    assert other_derivative.__dict__ == dict_copy
+
+
+def testValidateDerivativeRejectsInvalidData(dummy_derivative_json):
+    # Assert that valid data forms a derivative
+    assert isinstance(derivative_management.validateDerivative(dummy_derivative_json), Derivative)
+
+    # Assert that unknown attributes, invalid values and missing attributes are rejected
+    for data in [dict(dummy_derivative_json, foo=1),
+                 dict(dummy_derivative_json, quantity='foo'),
+                 dict(dummy_derivative_json, date_of_trade='01/01/2020'),
+                 {k: v for k, v in dummy_derivative_json.items() if k != 'asset'}]:
+        with pytest.raises(ValueError):
+            derivative_management.validateDerivative(data)
@@ -0,0 +1,47 @@
+# Standard library imports
+from datetime import date
+import math
+
+# Local application imports
+from backend.external_models import Currency, Product
+from backend.managers import external_management
+from backend.db import db
+
+
+def testMarketSnapshotServesPrices():
+    # Add market data to database session
+    db.session.add(Currency(code='GBP', valuation_date=date.today(), usd_exchange_rate=1.25))
+    db.session.add(Product(name='Lumber', valuation_date=date.today(), market_price=9.5, currency_code='GBP'))
+    db.session.flush()
+
+    # Retrieve the snapshot for today
+    snapshot = external_management.getMarketSnapshot()
+
+    # Assert that the snapshot serves the stored prices
+    assert snapshot.getUSDExchangeRate('GBP') == 1.25
+    assert snapshot.getAssetPrice('Lumber', 'foo') == (9.5, 'GBP')
+
+
+def testMarketSnapshotDefaultsMissingPrices():
+    # Retrieve the snapshot for today
+    snapshot = external_management.getMarketSnapshot()
+
+    # Assert that missing prices are not a number
+    assert math.isnan(snapshot.getUSDExchangeRate('XXX'))
+    price, currency_code = snapshot.getAssetPrice('Stocks', 'foo')
+    assert math.isnan(price) and currency_code == '?'
+
+
+def testMarketSnapshotIsCachedUntilInvalidated():
+    # Assert that the same snapshot is served within a context
+    snapshot = external_management.getMarketSnapshot()
+    assert external_management.getMarketSnapshot() is snapshot
+    assert math.isnan(snapshot.getUSDExchangeRate('GBP'))
+
+    # Land a new price and invalidate the cached snapshots
+    db.session.add(Currency(code='GBP', valuation_date=date.today(), usd_exchange_rate=1.25))
+    db.session.flush()
+    external_management.invalidateMarketSnapshots()
+
+    # Assert that the new price is served
+    assert external_management.getUSDExchangeRate('GBP') == 1.25
@@ -0,0 +1,110 @@
+# Standard library imports
+from datetime import date
+
+# Third party imports
+import pytest
+from sqlalchemy import event
+
+# Local application imports
+from backend.derivatex_models import Derivative, Action, ActionType, IngestedFile
+from backend.managers import ingestion_management
+from backend.db import db
+
+# Header and rows of a dummy trade file
+TRADE_FILE_HEADER = 'date,tradeID,product,buyingParty,sellingParty,notionalAmount,notionalCurrency,quantity,' \
+                    'maturityDate,underlyingPrice,underlyingCurrency,strikePrice\n'
+TRADE_FILE_ROWS = [
+    '01/01/2020,ID1,Stocks,foo,barbaz,10,USD,100,01/01/2021,1,USD,20\n',
+    '01/01/2020,ID2,Stocks,foo,QETH27,10,USD,100,01/01/2021,1,USD,20\n',
+    '01/01/2020,ID3,Stocks,foo,barbaz,10,USD,not a quantity,01/01/2021,1,USD,20\n',
+    '01/01/2020,ID4,Stocks,baz,barbaz,10,GBP,100,01/01/2021,1,USD,20\n'
+]
+
+
+@pytest.fixture
+def dummy_trade_file(tmp_path):
+    path = tmp_path / '2020-01-01.csv'
+    path.write_text(TRADE_FILE_HEADER + ''.join(TRADE_FILE_ROWS))
+    return str(path)
+
+
+def testNormalizeTradeCorrectsTrade():
+    fields = TRADE_FILE_ROWS[3].strip().split(',')
+
+    # Normalize the trade with an exchange rate for its notional currency
+    trade = ingestion_management.normalizeTrade(fields, {'GBP': 1.25})
+
+    # Assert that the dates are parsed and the strike price converted
+    assert trade['date_of_trade'] == date(2020, 1, 1)
+    assert trade['maturity_date'] == date(2021, 1, 1)
+    assert trade['strike_price'] == 16
+    assert trade['quantity'] == 100
+    assert trade['code'].startswith('bar-')
+
+
+def testIngestTradeFilesLoadsTrades(dummy_trade_file):
+    # Ingest the dummy trade file in chunks of two rows
+    summaries = ingestion_management.ingestTradeFiles([dummy_trade_file], chunk_size=2, excluded_parties={'QETH27'})
+
+    # Assert that the valid trades were loaded and the rest skipped
+    assert summaries == [{'file': '2020-01-01.csv', 'loaded': 2, 'skipped': 2}]
+    derivatives = Derivative.query.order_by(Derivative.id).all()
+    assert [d.buying_party for d in derivatives] == ['foo', 'baz']
+
+    # Assert that the addition of each derivative is registered
+    for derivative in derivatives:
+        assert Action.query.filter_by(derivative_id=derivative.id, type=ActionType.ADD).first() is not None
+
+    # Assert that the file is recorded as complete
+    assert IngestedFile.query.get(ingestion_management.hashTradeFile(dummy_trade_file)).complete
+
+
+def testIngestTradeFilesResumesFromProgress(dummy_trade_file):
+    # Record that the first chunk of the dummy trade file has been ingested
+    digest = ingestion_management.hashTradeFile(dummy_trade_file)
+    db.session.add(IngestedFile(digest=digest, path=dummy_trade_file, rows_read=2, complete=False))
+    db.session.flush()
+
+    # Ingest the dummy trade file twice
+    ingestion_management.ingestTradeFiles([dummy_trade_file], chunk_size=2)
+    ingestion_management.ingestTradeFiles([dummy_trade_file], chunk_size=2)
+
+    # Assert that only the remaining valid trade has been loaded, once
+    assert [d.buying_party for d in Derivative.query.all()] == ['baz']
+
+
+def testIngestTradeFilesDistinguishesFilesOfTheSameName(dummy_trade_file, tmp_path):
+    # Write a trade file of the same name as the dummy trade file to another directory
+    other_trade_file = tmp_path / 'other' / '2020-01-01.csv'
+    other_trade_file.parent.mkdir()
+    other_trade_file.write_text(TRADE_FILE_HEADER + TRADE_FILE_ROWS[3])
+
+    # Ingest both trade files
+    summaries = ingestion_management.ingestTradeFiles([dummy_trade_file, str(other_trade_file)])
+
+    # Assert that the trades of both files have been loaded
+    assert [summary['loaded'] for summary in summaries] == [3, 1]
+    assert len(Derivative.query.all()) == 4
+
+
+def testIngestTradeFilesInsertsEachChunkAtOnce(dummy_trade_file):
+    # Record the statements inserting derivatives
+    inserts = []
+
+    def listener(conn, cursor, statement, *args):
+        if statement.startswith('INSERT INTO derivative '):
+            inserts.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        ingestion_management.ingestTradeFiles([dummy_trade_file], chunk_size=2)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    # Assert that each chunk was inserted with one statement
+    assert len(inserts) == 2
+
+    # Assert that each action registers the addition of its own derivative
+    for derivative in Derivative.query.all():
+        action = Action.query.filter_by(derivative_id=derivative.id, type=ActionType.ADD).one()
+        assert action.timestamp.date() == derivative.date_of_trade
@@ -0,0 +1,60 @@
+# Standard library imports
+from datetime import date, timedelta
+
+# Local application imports
+from backend.derivatex_models import ReportJobType, JobStatus
+from backend.managers import job_management
+from backend.managers import report_management
+from backend.db import db
+
+
+def testRunNextJobGeneratesReports(dummy_derivative, reports_dir):
+    # Add dummy derivative to database session and queue a job to generate all reports
+    db.session.add(dummy_derivative)
+    db.session.flush()
+    job = job_management.enqueueReportJob(ReportJobType.GENERATE_ALL_REPORTS)
+
+    # Run the next job
+    job = job_management.runNextJob()
+
+    # Assert that the job completed with the generated report as its result
+    assert job.status == JobStatus.COMPLETE
+    assert job.progress == job.total == 1
+    assert report_management.getReportHead(job.report_ids[0]).target_date == dummy_derivative.date_of_trade
+
+
+def testRunNextJobRecordsFailures():
+    # Queue a job to generate a report for a date without derivatives
+    job_management.enqueueReportJob(ReportJobType.GENERATE_REPORT, date(2000, 1, 1))
+
+    # Run the next job
+    job = job_management.runNextJob()
+
+    # Assert that the job failed with an error
+    assert job.status == JobStatus.FAILED
+    assert job.error is not None
+    assert job.finished is not None
+
+
+def testRunNextJobReturnsNoneIfQueueEmpty():
+    # Assert that there is no job to run
+    assert job_management.runNextJob() is None
+
+
+def testEnqueueMissedReportsQueuesReportsOfEndedDays(dummy_derivative):
+    # Add a derivative traded today, whose report is not due yet
+    db.session.add(dummy_derivative)
+    db.session.flush()
+
+    # Assert that no job is queued
+    assert job_management.enqueueMissedReports() is None
+
+    # Make the derivative one traded yesterday, whose report was missed
+    dummy_derivative.date_of_trade = date.today() - timedelta(days=1)
+    db.session.flush()
+
+    # Assert that a job to generate all reports is queued once
+    job = job_management.enqueueMissedReports()
+    assert job.type == ReportJobType.GENERATE_ALL_REPORTS
+    assert job.status == JobStatus.QUEUED
+    assert job_management.enqueueMissedReports() is None
@@ -0,0 +1,16 @@
+# Local application imports
+from backend.managers import learned_behaviour_management
+
+
+def testGrowTreesOnlyRebuildsSamplesWhenRequested(test_client, monkeypatch):
+    # Record the requests to rebuild the training samples
+    rebuilds = []
+    monkeypatch.setattr(learned_behaviour_management, 'rebuildTrainingSamples', lambda: rebuilds.append(True))
+
+    # Make requests with false and true rebuild arguments
+    for value in ['false', '0', 'true']:
+        response = test_client.get(f'/learned-behaviour/grow-trees?rebuild={value}')
+        assert response.status_code == 200
+
+    # Assert that the samples were only rebuilt when requested
+    assert rebuilds == [True]
@@ -0,0 +1,355 @@
+# pylint: disable=redefined-outer-name
+
+# Standard library imports
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import multiprocessing
+
+# Third party imports
+import numpy as np
+import pytest
+from sqlalchemy import event
+
+# Local application imports
+from backend.derivatex_models import DecisionTreeNode, Derivative, Features, Label, Action, ActionType
+from backend.managers import learned_behaviour_management
+from backend.managers import derivative_management
+from backend.db import db
+
+
+@pytest.fixture
+def dummy_tree():
+    # Flag trades bought by company A, or of gold by any other company
+    root = DecisionTreeNode(feature=Features.BUYING_PARTY, criteria='A', approved=True,
+                            true_label=Label.ERRONEOUS)
+    db.session.add(root)
+    db.session.flush()
+    child = DecisionTreeNode(parent_id=root.id, feature=Features.ASSET, criteria='Gold',
+                             true_label=Label.ERRONEOUS, false_label=Label.VALID)
+    db.session.add(child)
+    db.session.flush()
+    root.false_node_id = child.id
+    db.session.flush()
+
+    return root
+
+
+def testVerifyDerivativeFlagsErroneousDerivatives(dummy_tree):
+    derivatives = [
+        {'buying_party': 'A', 'asset': 'Oil'},
+        {'buying_party': 'B', 'asset': 'Gold'},
+        {'buying_party': 'B', 'asset': 'Oil'}
+    ]
+
+    # Verify each derivative
+    results = [learned_behaviour_management.verifyDerivative(d) for d in derivatives]
+
+    # Assert that the tree flags the first two derivatives
+    assert [[tree['id'] for tree in result] for result in results] == [[dummy_tree.id], [dummy_tree.id], []]
+
+    # Assert that the compiled tree labels the derivatives as the tree does
+    for derivative, result in zip(derivatives, results):
+        split = learned_behaviour_management.splitOnNode(dummy_tree, [{'derivative': derivative}])
+        assert bool(split[Label.ERRONEOUS]) == bool(result)
+
+
+def testVerifyDerivativeMakesNoQueries(dummy_tree):
+    # Compile the trees
+    learned_behaviour_management.verifyDerivative({'buying_party': 'A'})
+
+    # Count the queries made when verifying a derivative
+    queries = []
+
+    def listener(*args):
+        queries.append(args)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        result = learned_behaviour_management.verifyDerivative({'buying_party': 'A'})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    # Assert that the derivative is flagged without querying the database
+    assert result[0]['false_node']['criteria'] == 'Gold'
+    assert queries == []
+
+
+def testPrefetchPropertiesLoadsOnlyRequestedSubtrees(dummy_tree):
+    # Add another tree, which is not requested
+    other_tree = DecisionTreeNode(feature=Features.ASSET, criteria='Oil', true_label=Label.ERRONEOUS)
+    db.session.add(other_tree)
+    db.session.flush()
+
+    # Record the nodes loaded when prefetching the children of the dummy tree
+    loaded = []
+
+    def listener(target, context):
+        loaded.append(target.id)
+
+    event.listen(DecisionTreeNode, 'load', listener)
+    try:
+        db.session.expunge_all()
+        prefetched = DecisionTreeNode.prefetchProperties([dummy_tree])
+    finally:
+        event.remove(DecisionTreeNode, 'load', listener)
+
+    # Assert that both nodes of the dummy tree are prefetched without loading the other tree
+    child = prefetched[dummy_tree]['false_node']
+    assert prefetched[dummy_tree]['true_node'] is None
+    assert prefetched[child] == {'true_node': None, 'false_node': None}
+    assert other_tree.id not in loaded
+
+
+def testUpdateNodeInvalidatesCompiledTrees(dummy_tree):
+    # Compile the trees
+    learned_behaviour_management.verifyDerivative({'buying_party': 'A'})
+
+    # Revoke the approval of the tree
+    learned_behaviour_management.updateNode(dummy_tree, {'approved': False})
+
+    # Assert that the tree no longer flags derivatives
+    assert learned_behaviour_management.verifyDerivative({'buying_party': 'A'}) == []
+
+
+def testSplitOnTreeMatchesNodeSplits(dummy_tree, copy_dummy_derivative):
+    # Add derivatives of varied parties, assets and quantities
+    derivatives = []
+    for i in range(12):
+        derivatives.append(copy_dummy_derivative(buying_party='AB'[i % 2], asset=['Gold', 'Oil', 'Wheat'][i % 3],
+                                                 quantity=i * i))
+    db.session.add_all(derivatives)
+
+    # Flag large trades of gold or oil by other companies
+    leaf = dummy_tree.false_node
+    node = DecisionTreeNode(parent_id=leaf.id, feature=Features.QUANTITY, criteria='more_than_mean',
+                            true_label=Label.ERRONEOUS, false_label=Label.VALID)
+    db.session.add(node)
+    db.session.flush()
+    leaf.criteria, leaf.true_label = 'Wheat', Label.VALID
+    leaf.false_label, leaf.false_node_id = None, node.id
+    db.session.flush()
+
+    # Split the derivatives with the tree
+    result = learned_behaviour_management.splitOnTree(dummy_tree)
+
+    # Assert that the derivatives are labelled as splitting on each node labels them
+    data = [{'derivative': {c.name: getattr(d, c.name) for c in Derivative.__table__.columns}} for d in derivatives]
+    expected = learned_behaviour_management.splitOnNode(dummy_tree, data)
+    for label in Label:
+        assert result[label].tolist() == sorted(item['derivative']['id'] for item in expected[label])
+    assert 0 < len(result[Label.ERRONEOUS]) < len(derivatives)
+
+    # Assert that the flags are the erroneous derivatives
+    flags = learned_behaviour_management.getFlags(dummy_tree.id, limit=2)
+    assert [flag['derivative']['id'] for flag in flags] == result[Label.ERRONEOUS].tolist()[:2]
+
+
+def legacyImpurity(trueSplit, falseSplit):
+    # Weighted Gini impurity of two lists of labelled items
+    def impurity(split):
+        valid = len([x for x in split if x['label'] == Label.VALID])
+        p = valid / len(split) if 0 < valid < len(split) else 0
+        return 2 * p * (1 - p)
+
+    total = len(trueSplit) + len(falseSplit)
+    alpha = len(trueSplit) / total
+    return alpha * impurity(trueSplit) + (1 - alpha) * impurity(falseSplit)
+
+
+def testGrowNodeChoosesLeastImpureCandidate():
+    # Label trades of oil in large quantities as erroneous
+    data = [{'label': Label.ERRONEOUS if i % 4 == 0 else Label.VALID,
+             'derivative': {'id': i, 'buying_party': 'AB'[i % 2], 'selling_party': 'C',
+                            'asset': 'Oil' if i % 4 == 0 else ['Gold', 'Oil'][i % 3 % 2],
+                            'quantity': i * 10 if i % 4 else 1000, 'strike_price': float(i)}}
+            for i in range(40)]
+    candidates = [(Features.BUYING_PARTY, 'A'), (Features.SELLING_PARTY, 'C'), (Features.ASSET, 'Wheat'),
+                  (Features.ASSET, 'Oil')]
+    criteria = ['less_than_mean', 'more_than_mean', '0_to_1_std', '1_to_2_std', '2_to_3_std', '3_to_inf_std']
+    candidates += [(Features.QUANTITY, c) for c in criteria]
+
+    # Grow a node from the training data
+    training_set = learned_behaviour_management.TrainingSet(data)
+    rows = np.arange(len(data))
+    node, true_rows, false_rows = learned_behaviour_management.growNode(candidates, training_set, rows)
+
+    # Assert that the node is the first candidate with the least impurity when splitting lists
+    impurities = [legacyImpurity(*DecisionTreeNode(feature=f, criteria=c).split(data)) for f, c in candidates]
+    assert (node.feature, node.criteria) == candidates[impurities.index(min(impurities))]
+
+    # Assert that the data is split as the node splits it
+    true_split, false_split = node.split(data)
+    assert true_rows.tolist() == [x['derivative']['id'] for x in true_split]
+    assert false_rows.tolist() == [x['derivative']['id'] for x in false_split]
+
+
+def testGrowNodeInWorkersMatchesSerialSearch(tmp_path):
+    # Label trades bought by company A as erroneous
+    data = [{'label': Label.ERRONEOUS if i % 5 == 0 else Label.VALID,
+             'derivative': {'id': i, 'buying_party': 'A' if i % 5 == 0 else 'BCD'[i % 3], 'selling_party': 'C',
+                            'asset': 'Oil', 'quantity': i, 'strike_price': float(i % 7)}}
+            for i in range(50)]
+    candidates = [(Features.BUYING_PARTY, c) for c in 'BCDA'] + [(Features.STRIKE_PRICE, 'more_than_mean')]
+
+    # Save the training data for the workers to memory map
+    training_set = learned_behaviour_management.TrainingSet(data)
+    training_set.save(str(tmp_path))
+    rows = np.arange(len(data))
+
+    # Grow a node within the current process and within workers
+    serial = learned_behaviour_management.growNode(candidates, training_set, rows)
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=learned_behaviour_management.initTrainingWorker,
+                             initargs=(str(tmp_path),)) as executor:
+        parallel = learned_behaviour_management.growNode(candidates, training_set, rows, executor, 2)
+
+    # Assert that the workers find the same node and split
+    assert (parallel[0].feature, parallel[0].criteria) == (serial[0].feature, serial[0].criteria) == candidates[3]
+    assert parallel[1].tolist() == serial[1].tolist()
+    assert parallel[2].tolist() == serial[2].tolist()
+
+
+def testCalculateGiniImpurityWeighsSplits():
+    # Calculate the impurity of a pure split, an even split and an empty split
+    impurity = learned_behaviour_management.calculateGiniImpurity(
+        np.array([4, 2, 0]), np.array([0, 2, 0]), np.array([0, 2, 0]), np.array([4, 2, 0]))
+
+    # Assert that the impurities are those of the Gini index
+    assert impurity.tolist() == [0, 0.5, 0]
+
+
+def testGrowTreeBuildsTreeInMemory(monkeypatch):
+    # Label trades bought by company A of oil as erroneous
+    data = [{'label': Label.ERRONEOUS if i % 6 == 0 else Label.VALID,
+             'derivative': {'id': i, 'buying_party': 'A' if i % 2 == 0 else 'B', 'selling_party': 'C',
+                            'asset': 'Oil' if i % 3 == 0 else 'Gold', 'quantity': i, 'strike_price': 1.0},
+             'erroneous_field': 'asset', 'correction': 'Gold'}
+            for i in range(60)]
+    candidates = [(Features.BUYING_PARTY, 'A'), (Features.ASSET, 'Oil')]
+    monkeypatch.setattr(learned_behaviour_management, 'generatePotentialNodeCriteria', lambda: candidates)
+
+    # Grow a tree from the training data
+    training_set = learned_behaviour_management.TrainingSet(data)
+    root, nodes = learned_behaviour_management.growTree(training_set, np.arange(len(data)), iter(range(10, 20)))
+
+    # Assert that the tree finds the errors without being stored
+    result = learned_behaviour_management.splitRows(root, training_set.columns, nodes, training_set.valid)
+    assert result[Label.ERRONEOUS].tolist() == list(range(0, 60, 6))
+    assert root.suggested_feature == 'asset' and root.suggested_value == 'Gold'
+    assert DecisionTreeNode.query.count() == 0
+
+    # Store a node with one of the ids of the tree in memory, then store the tree
+    existing_id = root.id
+    db.session.add(DecisionTreeNode(id=existing_id, feature=Features.ASSET, criteria='Oil'))
+    db.session.flush()
+    inserts = []
+
+    def listener(conn, cursor, statement, *args):
+        if statement.startswith('INSERT INTO decision_tree_node '):
+            inserts.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        nodes = learned_behaviour_management.persistTree(nodes)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    # Assert that the tree was stored with one statement, after the existing node
+    assert len(inserts) == 1
+    assert min(nodes) > existing_id
+
+    # Assert that the stored tree matches the tree grown in memory
+    stored = {node.id: node for node in DecisionTreeNode.query.filter(DecisionTreeNode.id.in_(nodes))}
+    assert sorted(stored) == sorted(nodes)
+    for node_id, node in nodes.items():
+        assert (stored[node_id].true_node_id, stored[node_id].false_node_id) == (node.true_node_id, node.false_node_id)
+        assert (stored[node_id].true_label, stored[node_id].false_label) == (node.true_label, node.false_label)
+    assert not stored[root.id].approved
+
+
+def testGrowTreesWithoutTrainingSamplesGrowsNoTrees(dummy_derivative):
+    # Add a valid derivative to database session, without any training samples
+    db.session.add(dummy_derivative)
+    db.session.flush()
+
+    # Assert that no trees are grown
+    assert learned_behaviour_management.growTrees() == 0
+    assert DecisionTreeNode.query.count() == 0
+
+
+def testReserveNodeIdsReservesDistinctBlocks():
+    # Store a node, then reserve two blocks of ids
+    db.session.add(DecisionTreeNode(id=5, feature=Features.ASSET, criteria='Oil'))
+    db.session.flush()
+    first = learned_behaviour_management.reserveNodeIds(3)
+    second = learned_behaviour_management.reserveNodeIds(2)
+
+    # Assert that the blocks follow the stored node without overlapping
+    assert (first, second) == (6, 9)
+
+
+def testIterTrainingDataReplaysUpdates(dummy_derivative):
+    # Add a derivative whose asset and then quantity were corrected
+    dummy_derivative.asset, dummy_derivative.quantity = 'Gold', 2
+    db.session.add(dummy_derivative)
+    db.session.flush()
+    now = datetime.now()
+    db.session.add_all([
+        Action(derivative_id=dummy_derivative.id, type=ActionType.ADD, timestamp=now - timedelta(hours=3)),
+        Action(derivative_id=dummy_derivative.id, type=ActionType.UPDATE, timestamp=now - timedelta(hours=2),
+               update_log={'attribute': 'asset', 'old_value': 'Oil', 'new_value': 'Gold'}),
+        Action(derivative_id=dummy_derivative.id, type=ActionType.UPDATE, timestamp=now - timedelta(hours=1),
+               update_log={'attribute': 'quantity', 'old_value': 1, 'new_value': 2})
+    ])
+    db.session.flush()
+
+    # Count the queries made when compiling the training data
+    queries = []
+
+    def listener(*args):
+        queries.append(args)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        items = list(learned_behaviour_management.iterTrainingData())
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    # Assert that the updates are undone from the newest back
+    assert [item['label'] for item in items] == [Label.VALID, Label.ERRONEOUS, Label.ERRONEOUS]
+    states = [(item['derivative']['asset'], item['derivative']['quantity']) for item in items]
+    assert states == [('Gold', 2), ('Gold', 1), ('Oil', 1)]
+    assert [(i['erroneous_field'], i['correction']) for i in items[1:]] == [('quantity', 2), ('asset', 'Gold')]
+
+    # Assert that the actions and derivatives are read with one query each
+    assert len(queries) == 2
+
+
+def testUpdatesRecordTrainingSamples(dummy_derivative):
+    # Add a derivative and correct it with a single update and then a bulk update
+    db.session.add(dummy_derivative)
+    db.session.flush()
+    derivative_management.updateDerivative(dummy_derivative, None, None, {'asset': 'Gold'})
+    derivative_management.updateDerivatives([(dummy_derivative, {'quantity': 5, 'buying_party': 'baz'})], None, None)
+
+    # Read the stored samples and replay the action history
+    fields = ['id', *learned_behaviour_management.FEATURE_FIELDS.values()]
+
+    def erroneousStates(items):
+        return sorted((tuple(i['derivative'][f] for f in fields), i['erroneous_field'], str(i['correction']))
+                      for i in items if i['label'] == Label.ERRONEOUS)
+
+    stored = erroneousStates(learned_behaviour_management.iterStoredTrainingData())
+    replayed = erroneousStates(learned_behaviour_management.iterTrainingData())
+
+    # Assert that the stored samples are the states given by replaying the history
+    assert len(stored) == 3
+    assert stored == replayed
+
+    # Assert that rebuilding the samples from the history gives the same samples
+    assert learned_behaviour_management.rebuildTrainingSamples() == 3
+    assert erroneousStates(learned_behaviour_management.iterStoredTrainingData()) == stored
+
+    # Assert that deleting the derivative removes its samples
+    derivative_management.deleteDerivatives([dummy_derivative], None)
+    assert list(learned_behaviour_management.iterStoredTrainingData()) == []
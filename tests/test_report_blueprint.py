@@ -1,3 +1,6 @@
+# Local application imports
+from backend.managers import report_management
+from backend.db import db
 
 
 def testGetReportWillReturn404(test_client, free_report_id):
@@ -6,3 +9,64 @@ def testGetReportWillReturn404(test_client, free_report_id):
     response = test_client.get(url)
     # Assert that a 404 HTTP error is returned
     assert response.status_code == 404
+
+
+def testGetReportDataRejectsUnknownFields(test_client, dummy_report_head):
+    # Add dummy report to database session
+    db.session.add(dummy_report_head)
+    db.session.flush()
+
+    # Make request and retrieve response
+    url = f'/reporting/get-report-data/{dummy_report_head.id}?fields=code,password'
+    response = test_client.get(url)
+
+    # Assert that a 400 HTTP error is returned
+    assert response.status_code == 400
+
+
+def testDownloadReportAnswersConditionalRequests(test_client, dummy_derivative, reports_dir):
+    # Add dummy derivative to database session and generate a report
+    db.session.add(dummy_derivative)
+    db.session.flush()
+    report_id = report_management.generateReport(dummy_derivative.date_of_trade)
+
+    # Download the report PDF
+    url = f'/reporting/download-report/PDF/{report_id}'
+    response = test_client.get(url)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    # Assert that a repeat download with the ETag is not modified
+    response = test_client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+
+    # Assert that a range of the PDF can be downloaded
+    response = test_client.get(url, headers={'Range': 'bytes=0-3'})
+    assert response.status_code == 206
+    assert response.data == b'%PDF'
+
+
+def testEnqueueReportJobQueuesJob(test_client):
+    # Make request to queue a job and retrieve response
+    body = {'type': 'GENERATE_REPORT', 'target_date': '2020-01-01'}
+    response = test_client.post('/reporting/enqueue-report-job', json=body)
+
+    # Assert that the job is queued
+    assert response.status_code == 202
+    job_id = response.get_json()['job']['id']
+
+    # Poll the status of the job
+    response = test_client.get(f'/reporting/get-report-job/{job_id}')
+
+    # Assert that the job is waiting to be run
+    assert response.status_code == 200
+    assert response.get_json()['job']['status'] == 'QUEUED'
+
+
+def testEnqueueReportJobRejectsInvalidJobs(test_client):
+    # Make requests with an unknown job type and a missing target date
+    for body in [{'type': 'foo'}, {'type': 'GENERATE_REPORT'}]:
+        response = test_client.post('/reporting/enqueue-report-job', json=body)
+
+        # Assert that a 400 HTTP error is returned
+        assert response.status_code == 400
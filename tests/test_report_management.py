@@ -1,5 +1,14 @@
+# Standard library imports
+from datetime import timedelta
+import os
+import time
+
+# Third party imports
+import pytest
+
 # Local application imports
 from backend.managers import report_management
+from backend.managers import derivative_management
 from backend.db import db
 
 
@@ -20,3 +29,232 @@ def testGetReportHeadReturnsNoneIfNotFound(free_report_id):
 def testGetReportDataReturnsNoneIfNotFound(free_report_id):
     # Assert that None is returned for the free id
     assert report_management.getReportData(free_report_id) is None
+
+
+def testGenerateAllReportsNumbersVersions(test_client, dummy_derivative, dummy_report_head, reports_dir):
+    # Add dummy derivative and an existing report for its date of trade to database session
+    db.session.add(dummy_derivative)
+    db.session.add(dummy_report_head)
+    db.session.flush()
+
+    # Execute generateAllReports
+    report_ids = report_management.generateAllReports()
+
+    # Assert that a report was generated with the next version number
+    assert len(report_ids) == 1
+    report = report_management.getReportHead(report_ids[0])
+    assert report.target_date == dummy_derivative.date_of_trade
+    assert report.version == dummy_report_head.version + 1
+    assert report_management.getPendingReportDates() == []
+
+
+def testGenerateAllReportsInWorkerProcesses(copy_dummy_derivative, dummy_derivative, dummy_report_head, reports_dir):
+    # Add derivatives traded on two dates and an existing report for the later date
+    earlier_date = dummy_derivative.date_of_trade - timedelta(days=1)
+    db.session.add_all([dummy_derivative, copy_dummy_derivative(date_of_trade=earlier_date), dummy_report_head])
+    # Commit the derivatives so they are visible to the worker processes
+    db.session.commit()
+
+    # Execute generateAllReports in a pool of two worker processes
+    report_ids = report_management.generateAllReports(max_workers=2)
+
+    # Assert that a report was generated for each date with the reserved version number
+    assert len(report_ids) == 2
+    reports = {r.target_date: r for r in map(report_management.getReportHead, report_ids)}
+    assert reports[dummy_derivative.date_of_trade].version == dummy_report_head.version + 1
+    assert reports[earlier_date].version == 1
+    assert all(r.derivative_count == 1 for r in reports.values())
+    assert all((reports_dir / f'{report_id}.cols').is_dir() for report_id in report_ids)
+    assert report_management.getPendingReportDates() == []
+
+
+def testGetNextReportVersionsDefaultsToFirstVersion(dummy_report_head):
+    # Add dummy report to database session
+    db.session.add(dummy_report_head)
+    db.session.flush()
+
+    # Determine the next versions for the report date and the following date
+    next_date = dummy_report_head.target_date + timedelta(days=1)
+    versions = report_management.getNextReportVersions([dummy_report_head.target_date, next_date])
+
+    # Assert that the versions follow on from the existing reports
+    assert versions == {dummy_report_head.target_date: 2, next_date: 1}
+
+
+def testIterReportRowsReadsChunks(copy_dummy_derivative, dummy_derivative):
+    # Add several copies of the dummy derivative, one of which is deleted, to database session
+    derivatives = [copy_dummy_derivative() for _ in range(5)]
+    derivatives[2].deleted = True
+    db.session.add_all(derivatives)
+    db.session.flush()
+
+    # Read the report rows in chunks of two
+    chunks = list(report_management.iterReportRows(dummy_derivative.date_of_trade, chunk_size=2))
+
+    # Assert that every none-deleted derivative is read once, in chunks of at most two
+    assert [len(rows) for rows in chunks] == [2, 2]
+    assert [row['id'] for rows in chunks for row in rows] == [d.id for d in derivatives if not d.deleted]
+    assert all(set(report_management.REPORT_FIELDS) <= set(row) for rows in chunks for row in rows)
+
+
+def testGenerateDeltaReportPatchesPreviousReport(copy_dummy_derivative, dummy_derivative, dummy_user, reports_dir):
+    # Add dummy user and several copies of the dummy derivative to database session
+    derivatives = [copy_dummy_derivative() for _ in range(3)]
+    db.session.add(dummy_user)
+    db.session.add_all(derivatives)
+    db.session.flush()
+
+    # Generate a report, then update, delete and add derivatives traded on its date
+    target_date = dummy_derivative.date_of_trade
+    report_management.generateReport(target_date)
+    derivative_management.updateDerivative(derivatives[0], dummy_user.id, -1, {'quantity': 7})
+    derivative_management.deleteDerivative(derivatives[1], dummy_user.id)
+    derivative_management.addDerivative(dummy_derivative, dummy_user.id)
+
+    # Generate a delta report followed by a full report
+    delta_id = report_management.generateDeltaReport(target_date)
+    full_id = report_management.generateReport(target_date)
+
+    # Assert that the delta report matches the full report
+    assert report_management.getReportHead(delta_id).version == 2
+    assert report_management.getReportHead(delta_id).derivative_count == 3
+    assert report_management.getReportData(delta_id) == report_management.getReportData(full_id)
+
+
+def testGenerateDeltaReportFindsBackdatedAndMovedDerivatives(copy_dummy_derivative, dummy_derivative, reports_dir):
+    # Add several copies of the dummy derivative to database session and generate a report
+    derivatives = [copy_dummy_derivative() for _ in range(3)]
+    db.session.add_all(derivatives)
+    db.session.flush()
+    target_date = dummy_derivative.date_of_trade
+    report_management.generateReport(target_date)
+
+    # Ingest a trade without a recent action, and move a derivative to the previous day
+    db.session.add(copy_dummy_derivative(quantity=7))
+    derivatives[1].date_of_trade -= timedelta(days=1)
+    derivatives[1].reported = False
+    db.session.flush()
+
+    # Generate a delta report followed by a full report
+    delta_id = report_management.generateDeltaReport(target_date)
+    full_id = report_management.generateReport(target_date)
+
+    # Assert that the delta report matches the full report
+    assert report_management.getReportHead(delta_id).derivative_count == 3
+    assert report_management.getReportData(delta_id) == report_management.getReportData(full_id)
+
+
+def testGetReportDataReadsColumns(copy_dummy_derivative, dummy_derivative, reports_dir, tmp_path):
+    # Add several copies of the dummy derivative to database session
+    derivatives = [copy_dummy_derivative() for _ in range(5)]
+    for quantity, derivative in enumerate(derivatives):
+        derivative.quantity = quantity
+        derivative.asset = f'Ässet {quantity}'
+    db.session.add_all(derivatives)
+    db.session.flush()
+
+    # Generate a report with columnar storage
+    report_id = report_management.generateReport(dummy_derivative.date_of_trade)
+    assert (reports_dir / f'{report_id}.cols').is_dir()
+
+    # Read a page of projected rows from the columns
+    fields = ['asset', 'quantity', 'notional_value', 'maturity_date']
+    page = report_management.getReportData(report_id, offset=1, limit=2, fields=fields)
+
+    # Assert that the page matches the same rows of the report CSV
+    rows = report_management.getReportData(report_id)
+    (reports_dir / f'{report_id}.cols').rename(tmp_path / 'other')
+    assert page == [{f: row[f] for f in fields} for row in rows[1:3]]
+    assert report_management.getReportData(report_id) == rows
+    assert page[0]['quantity'] == '1'
+
+
+def testGetReportDataRejectsUnknownFields(dummy_report_head):
+    # Assert that fields outside of the report are rejected
+    with pytest.raises(ValueError):
+        report_management.getReportData(dummy_report_head.id, fields=['password'])
+
+
+def testGetReportDataFiltersRows(copy_dummy_derivative, dummy_derivative, reports_dir, tmp_path):
+    # Add copies of the dummy derivative with a mix of parties and assets to database session
+    derivatives = [copy_dummy_derivative() for _ in range(8)]
+    for i, derivative in enumerate(derivatives):
+        derivative.quantity = i
+        derivative.buying_party = ['foo', 'baz'][i % 2]
+        derivative.asset = ['Stocks', 'Bonds', 'Gold'][i % 3]
+    db.session.add_all(derivatives)
+    db.session.flush()
+    report_id = report_management.generateReport(dummy_derivative.date_of_trade)
+
+    # Determine the expected quantities of the rows of buyer foo with either asset
+    filters = {'buying_party': ['foo'], 'asset': ['Stocks', 'Gold'], 'selling_party': []}
+    expected = [str(d.quantity) for d in derivatives if d.buying_party == 'foo' and d.asset != 'Bonds']
+
+    # Assert that the indexes find the rows
+    rows = report_management.getReportData(report_id, offset=1, fields=['quantity'], filters=filters)
+    assert [row['quantity'] for row in rows] == expected[1:]
+    assert report_management.countReportData(report_id, filters) == len(expected)
+
+    # Assert that repeated values find each row once
+    repeated_filters = dict(filters, asset=['Stocks', 'Gold', 'Gold'])
+    assert report_management.getReportData(report_id, offset=1, fields=['quantity'], filters=repeated_filters) == rows
+    assert report_management.countReportData(report_id, repeated_filters) == len(expected)
+
+    # Assert that the report CSV finds the same rows
+    (reports_dir / f'{report_id}.cols').rename(tmp_path / 'other')
+    assert report_management.getReportData(report_id, offset=1, fields=['quantity'], filters=filters) == rows
+    assert report_management.countReportData(report_id, filters) == len(expected)
+
+
+def testCreatePDFDrawsEveryPage(copy_dummy_derivative, dummy_derivative, reports_dir):
+    # Generate PDFs within the temporary directory of the reports
+    (reports_dir.parent / 'temp').mkdir()
+
+    # Add enough copies of the dummy derivative to fill several pages to database session
+    derivatives = [copy_dummy_derivative() for _ in range(150)]
+    db.session.add_all(derivatives)
+    db.session.flush()
+    report_id = report_management.generateReport(dummy_derivative.date_of_trade)
+
+    # Create the report PDF
+    path = report_management.createPDF(report_id)
+
+    # Assert that a PDF with multiple pages was created
+    with open(path, 'rb') as file:
+        content = file.read()
+    assert content.startswith(b'%PDF')
+    assert content.count(b'/Type /Page\n') > 1
+
+
+def testGetReportPDFRendersOnce(dummy_derivative, reports_dir, monkeypatch):
+    # Add dummy derivative to database session and generate a report
+    db.session.add(dummy_derivative)
+    db.session.flush()
+    report_id = report_management.generateReport(dummy_derivative.date_of_trade)
+
+    # Retrieve the report PDF, then retrieve it again without being able to render it
+    path = report_management.getReportPDF(report_id)
+    monkeypatch.setattr(report_management, 'createPDF', None)
+
+    # Assert that the cached PDF is reused
+    assert report_management.getReportPDF(report_id) == path
+    assert os.path.isfile(path)
+
+
+def testEvictReportArtifactsRemovesLeastRecentlyAccessed(tmp_path, monkeypatch):
+    # Create artifacts within a temporary directory, accessed in turn an hour apart
+    artifact_dir = tmp_path / 'res' / 'artifacts'
+    artifact_dir.mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    now = time.time()
+    for i, name in enumerate(['1-v1.pdf', '2-v1.pdf', '3-v1.pdf']):
+        (artifact_dir / name).write_bytes(b'0' * 100)
+        os.utime(artifact_dir / name, (now - 3600 * (3 - i), now))
+
+    # Assert that the oldest artifacts are removed to fit the size limit
+    removed = report_management.evictReportArtifacts(max_size=250)
+    assert [os.path.basename(path) for path in removed] == ['1-v1.pdf']
+
+    # Assert that artifacts are removed once they exceed the age limit
+    removed = report_management.evictReportArtifacts(max_age=3600 * 1.5)
+    assert [os.path.basename(path) for path in removed] == ['2-v1.pdf']
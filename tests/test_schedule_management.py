@@ -0,0 +1,76 @@
+# Standard library imports
+from datetime import timedelta
+
+# Local application imports
+from backend.managers import schedule_management
+
+
+def testAcquireLeadershipGrantsSingleLeader():
+    # Acquire the lease from two processes
+    first = schedule_management.acquireLeadership(holder='host:1')
+    second = schedule_management.acquireLeadership(holder='host:2')
+
+    # Assert that only the first process is the leader
+    assert first
+    assert not second
+
+    # Assert that the leader can renew its lease
+    assert schedule_management.acquireLeadership(holder='host:1')
+
+
+def testAcquireLeadershipTakesExpiredLease():
+    # Acquire a lease that has already expired
+    schedule_management.acquireLeadership(holder='host:1', duration=timedelta(seconds=-1))
+
+    # Assert that another process takes over the lease
+    assert schedule_management.acquireLeadership(holder='host:2')
+    assert not schedule_management.acquireLeadership(holder='host:1')
+
+
+def testReleaseLeadershipFreesLease():
+    # Acquire and release the lease
+    schedule_management.acquireLeadership(holder='host:1')
+    released = schedule_management.releaseLeadership(holder='host:1')
+
+    # Assert that another process can acquire the lease immediately
+    assert released
+    assert schedule_management.acquireLeadership(holder='host:2')
+
+
+def testLeaderOnlySkipsJobWithoutLease(test_app):
+    calls = []
+    job = schedule_management.leaderOnly(test_app, lambda: calls.append(True))
+
+    # Run the job while another process holds the lease
+    schedule_management.acquireLeadership(holder='elsewhere:1')
+    job()
+
+    # Assert that the job did not run
+    assert calls == []
+
+    # Run the job once the lease is released
+    schedule_management.releaseLeadership(holder='elsewhere:1')
+    job()
+
+    # Assert that the job ran
+    assert calls == [True]
+
+
+def testLeaderOnlyCatchesUpOnTakeover(test_app):
+    takeovers = []
+    job = schedule_management.leaderOnly(test_app, lambda: None, on_takeover=lambda: takeovers.append(True))
+
+    # Run the job while another process holds the lease
+    schedule_management.acquireLeadership(holder='elsewhere:1')
+    job()
+
+    # Assert that the process did not catch up
+    assert takeovers == []
+
+    # Run the job twice once the other process has released the lease
+    schedule_management.releaseLeadership(holder='elsewhere:1')
+    job()
+    job()
+
+    # Assert that the process caught up once when it took over the lease
+    assert takeovers == [True]
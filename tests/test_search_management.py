@@ -0,0 +1,92 @@
+# Third party imports
+from sqlalchemy import event
+
+# Local application imports
+from backend.derivatex_models import SearchTermType
+from backend.external_models import Company
+from backend.managers import external_management
+from backend.managers import search_management
+from backend.managers import derivative_management
+from backend.db import db
+
+
+def testSearchTermsFindsIndexedTerms():
+    # Build the search index and index some derivative codes
+    search_management.rebuildSearchIndex()
+    search_management.indexSearchTerms(SearchTermType.CODE, [('ABC-123', 'ABC-123'), ('XYZ-456', 'XYZ-456')])
+    db.session.flush()
+
+    # Assert that terms are found by any part of their text
+    assert search_management.searchTerms('c-12')[SearchTermType.CODE] == {'ABC-123'}
+    assert search_management.searchTerms('6')[SearchTermType.CODE] == {'XYZ-456'}
+    assert search_management.searchTerms('-')[SearchTermType.CODE] == {'ABC-123', 'XYZ-456'}
+    assert search_management.searchTerms('C-4')[SearchTermType.CODE] == set()
+
+
+def testIndexSearchTermsSkipsIndexedTerms():
+    # Build the search index and index the same company twice
+    search_management.rebuildSearchIndex()
+    search_management.indexSearchTerms(SearchTermType.COMPANY, [('ABCD12', 'Zqxj Holdings')])
+    search_management.indexSearchTerms(SearchTermType.COMPANY, [('ABCD12', 'Zqxj Holdings')])
+    db.session.flush()
+
+    # Assert that the company is found by its name
+    assert search_management.searchTerms('qxj h')[SearchTermType.COMPANY] == {'ABCD12'}
+
+
+def testUpdateSearchIndexAddsNewAssetsAndCompanies(monkeypatch):
+    # Build the search index, then add a product and a company to the external database
+    search_management.rebuildSearchIndex()
+    assets = external_management.indexAssets() + ['Zqxj Bonds']
+    companies = external_management.indexCompanies() + [Company(id='ABCD12', name='Zqxj Holdings')]
+    monkeypatch.setattr(external_management, 'indexAssets', lambda: assets)
+    monkeypatch.setattr(external_management, 'indexCompanies', lambda: companies)
+
+    # Execute updateSearchIndex
+    search_management.updateSearchIndex()
+
+    # Assert that the new product and company are found
+    assert search_management.searchTerms('qxj b')[SearchTermType.ASSET] == {'Zqxj Bonds'}
+    assert search_management.searchTerms('qxj h')[SearchTermType.COMPANY] == {'ABCD12'}
+
+
+def testAddDerivativeMakesCodeSearchable(dummy_derivative, dummy_user):
+    # Add dummy user to database session
+    db.session.add(dummy_user)
+    db.session.flush()
+
+    # Execute addDerivative
+    derivative_management.addDerivative(dummy_derivative, dummy_user.id)
+
+    # Index the derivatives matching part of the derivative code
+    derivatives, _ = derivative_management.indexDerivatives(
+        15, 1, 'id', False, dummy_derivative.code[1:], None, None, None, None,
+        None, None, None, None, [], [], [], False, False)
+
+    # Assert that the derivative is found
+    assert derivatives == [dummy_derivative]
+
+
+def testFilterDerivativesSearchesWithinTheDatabase(dummy_derivative, dummy_user):
+    # Add dummy user to database session and add the dummy derivative
+    db.session.add(dummy_user)
+    db.session.flush()
+    derivative_management.addDerivative(dummy_derivative, dummy_user.id)
+
+    # Record the statements made when searching the derivatives
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        query, _ = derivative_management.filterDerivatives(
+            'id', dummy_derivative.code[1:], None, None, None, None, None, None, None, None, [], [], [], False, False)
+        derivatives = query.all()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+    # Assert that the matching terms are searched within the derivative query
+    assert derivatives == [dummy_derivative]
+    assert len(statements) == 1 and 'FROM search_gram' in statements[0]
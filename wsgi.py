@@ -1,3 +1,3 @@
 from backend.app import Application
 
-app = Application.getProductionApp()
+app = Application.getWebApp()